@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from array import array
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence
+
+Record = Dict[str, str]
+
+CACHE_DIR = os.environ.get("APOCRYPHA_CACHE_DIR", ".cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("APOCRYPHA_ANSWER_CACHE_MB", "64")) * 1024 * 1024
+# Cosine similarity above which two prompts over the same documents count as the same question
+DEFAULT_SIMILARITY = float(os.environ.get("APOCRYPHA_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    embedding BLOB,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope);
+CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial rewordings share a key."""
+    text = re.sub(r"\s+", " ", (prompt or "").lower()).strip()
+    return text.rstrip("?!. ")
+
+
+def docs_fingerprint(docs: Sequence[Record]) -> str:
+    """Hash the ids and versions of the documents an answer was grounded on."""
+    h = hashlib.sha256()
+    for path, version in sorted((d.get("path", ""), str(d.get("version", ""))) for d in docs):
+        h.update(path.encode("utf-8", "ignore"))
+        h.update(b"\0")
+        h.update(version.encode("utf-8", "ignore"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def conversation_fingerprint(history: Sequence[Dict[str, str]], summary: str = "") -> str:
+    """Hash the earlier messages and summary sent to the model with a prompt; the same question can mean
+    something else later in a conversation. ``history`` excludes the prompt itself."""
+    body = json.dumps({"history": [[m["role"], m["content"]] for m in history], "summary": summary})
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    if len(a) != len(b) or not a:
+        return 0.0
+    dot = sum(x * y for x, y in zip(a, b))
+    na = sum(x * x for x in a) ** 0.5
+    nb = sum(y * y for y in b) ** 0.5
+    if not na or not nb:
+        return 0.0
+    return dot / (na * nb)
+
+
+class AnswerCache:
+    """Disk-backed cache of model answers keyed by (model, conversation, normalized prompt, document set).
+
+    Entries live in a SQLite file so several app processes can share them. The
+    total stored size is bounded; least-recently-used entries are evicted first.
+    When an embedding is supplied, a miss on the exact key falls back to the
+    closest earlier prompt over the same model and documents.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        similarity: float = DEFAULT_SIMILARITY,
+    ) -> None:
+        self.path = path or os.path.join(CACHE_DIR, "answers.sqlite3")
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # The connection's own context manager only commits; callers wrap it in closing() as well
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    @staticmethod
+    def _scope(model: str, docs: Sequence[Record], conversation: str = "") -> str:
+        return hashlib.sha256(f"{model}\n{conversation}\n{docs_fingerprint(docs)}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _key(scope: str, prompt: str) -> str:
+        return hashlib.sha256(f"{scope}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        model: str,
+        prompt: str,
+        docs: Sequence[Record],
+        embedding: Optional[Sequence[float]] = None,
+        conversation: str = "",
+    ) -> Optional[str]:
+        """Return a cached answer, or None on a miss.
+
+        ``conversation`` (``conversation_fingerprint``) scopes the entry to the
+        history sent with the prompt; semantic matches are scoped the same way.
+        """
+        scope = self._scope(model, docs, conversation)
+        key = self._key(scope, prompt)
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+                if row is None and embedding is not None:
+                    key, answer = self._nearest(conn, scope, embedding)
+                    row = (answer,) if key else None
+                if row is None:
+                    return None
+                conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (time.time(), key))
+                return row[0]
+        except sqlite3.Error:
+            return None
+
+    def _nearest(self, conn: sqlite3.Connection, scope: str, embedding: Sequence[float]):
+        best_key, best_answer, best_sim = None, None, self.similarity
+        rows = conn.execute(
+            "SELECT key, answer, embedding FROM answers WHERE scope = ? AND embedding IS NOT NULL",
+            (scope,),
+        )
+        for key, answer, blob in rows:
+            vec = array("f")
+            vec.frombytes(blob)
+            sim = _cosine(embedding, vec)
+            if sim >= best_sim:
+                best_key, best_answer, best_sim = key, answer, sim
+        return best_key, best_answer
+
+    def put(
+        self,
+        model: str,
+        prompt: str,
+        docs: Sequence[Record],
+        answer: str,
+        embedding: Optional[Sequence[float]] = None,
+        conversation: str = "",
+    ) -> None:
+        scope = self._scope(model, docs, conversation)
+        key = self._key(scope, prompt)
+        blob = array("f", embedding).tobytes() if embedding is not None else None
+        size = len(answer.encode("utf-8")) + len(prompt.encode("utf-8")) + (len(blob) if blob else 0)
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO answers (key, scope, prompt, answer, embedding, size, created, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, scope, prompt, answer, blob, size, now, now),
+                )
+                self._evict(conn)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims: List[str] = []
+        for key, size in conn.execute("SELECT key, size FROM answers ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append(key)
+            total -= size
+        conn.executemany("DELETE FROM answers WHERE key = ?", [(k,) for k in victims])
+
+    def clear(self) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM answers")
+
+
+_default_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide cache instance rooted at APOCRYPHA_CACHE_DIR."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnswerCache()
+    return _default_cache
+
+
+def semantic_cache_enabled() -> bool:
+    return os.environ.get("APOCRYPHA_SEMANTIC_CACHE", "").lower() in {"1", "true", "yes"}
@@ -1,27 +1,57 @@
+from __future__ import annotations
+
+import time
+# Start of this script run, before any imports; time to first paint is measured from here
+_run_started = time.perf_counter()
+import concurrent.futures
 import json
 import os
+import re
 import streamlit as st
-import openai
-from openai import OpenAI
-import httpx
 from streamlit_miro_component import miro_board
-from document_search import scan_dummy_data, search_files, icon_for_ext, extract_node_ids_from_paths
+from index_worker import IndexShards
+import index_artifact
+from search_server import SEARCH_URL, SearchClient
+from answer_cache import get_answer_cache, semantic_cache_enabled
+from chat_history import ChatHistory, doc_refs, session_nbytes
+from working_set import WorkingSet
+from chat_pipeline import ChatRequest, StubChatClient, format_timings, get_runner, run_chat_pipeline
+import perf
 import traceback
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 st.set_page_config(page_title="Apocrypha Board", layout="wide", page_icon="🤖")
 
 # --- OpenAI Setup ---
-def get_client() -> OpenAI:
+@st.cache_resource(show_spinner=False)
+def _openai_client(api_key: str) -> AsyncOpenAI:
+    """One client per API key for the process, so every chat turn reuses its connection pool.
+
+    All turns run on the pipeline runner's single event loop, which the pooled
+    connections are bound to.
+    """
+    # openai takes over half a second to import; only pay for it once a question is asked
+    import httpx
+    from openai import AsyncOpenAI
+
+    # WORKAROUND: Initialize httpx.AsyncClient manually to avoid implicit proxy issues
+    return AsyncOpenAI(api_key=api_key, http_client=httpx.AsyncClient())
+
+
+def get_client() -> AsyncOpenAI:
+    # Offline stub for local testing without an API key
+    if os.environ.get("APOCRYPHA_LLM_STUB"):
+        return StubChatClient()
     api_key = st.secrets.get("OPENAI_API_KEY") or os.environ.get("OPENAI_API_KEY")
     if not api_key:
         st.error("OpenAI API key not found. Set OPENAI_API_KEY.")
         st.stop()
     
-    # WORKAROUND: Initialize httpx.Client manually to avoid implicit proxy issues
     try:
-        # Force clean http client
-        http_client = httpx.Client()
-        return OpenAI(api_key=api_key, http_client=http_client)
+        return _openai_client(api_key)
     except Exception as e:
         st.error(f"Critical Error initializing OpenAI: {e}")
         st.code(traceback.format_exc())
@@ -31,15 +61,13 @@ if "openai_model" not in st.session_state:
     st.session_state["openai_model"] = "gpt-3.5-turbo"
 
 # --- State Initialization ---
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {
-            "role": "system",
-            "content": """You are Apocrypha, a document intelligence agent. You have access to the company's file system.
-When asked, you can retrieve files, summarize them, and answer questions based on the 'Relevant Documents' provided in the context.
-Always be confident and helpful.""",
-        }
-    ]
+# Bounded chat history; the system prompt itself lives in chat_pipeline
+if not isinstance(st.session_state.get("messages"), ChatHistory):
+    st.session_state.messages = ChatHistory()
+
+# Passages retrieved in this conversation, reused by follow-up questions
+if "working_set" not in st.session_state:
+    st.session_state.working_set = WorkingSet()
 
 if "context_nodes" not in st.session_state:
     st.session_state.context_nodes = []
@@ -47,6 +75,10 @@ if "context_nodes" not in st.session_state:
 if "highlight_nodes" not in st.session_state:
     st.session_state.highlight_nodes = []
 
+# Hit counts per board node from the last search, shown as badges
+if "node_facets" not in st.session_state:
+    st.session_state.node_facets = {}
+
 # Flag to ignore component re-adding nodes after we explicitly cleared
 if "ignore_context_updates" not in st.session_state:
     st.session_state.ignore_context_updates = False
@@ -67,14 +99,47 @@ if "is_processing" not in st.session_state:
 if "pending_prompt" not in st.session_state:
     st.session_state.pending_prompt = None
 
-# Scan local data once
-if "records" not in st.session_state:
-    st.session_state.records = scan_dummy_data(root="sample_data")
-
 # --- Industry Selection ---
 if "selected_industry" not in st.session_state:
     st.session_state.selected_industry = "fnb"  # Default to F&B
 
+# Each industry is its own tenant shard under sample_data/
+INDUSTRY_SHARDS = {
+    "fnb": "Restaurant_Franchise",
+    "legal": "Legal_Firm",
+    "finance": "Finance_Firm",
+}
+
+def active_shard() -> str:
+    return INDUSTRY_SHARDS.get(st.session_state.selected_industry, "Restaurant_Franchise")
+
+@st.cache_resource(show_spinner="Loading prebuilt index...")
+def load_prebuilt_index():
+    """(IndexShards, None) from APOCRYPHA_INDEX_DIR after checking its manifest, or (None, reason)."""
+    try:
+        return index_artifact.load_shards(index_artifact.INDEX_DIR, root="sample_data", full=index_artifact.VERIFY_FULL), None
+    except (OSError, index_artifact.ArtifactError) as e:
+        return None, str(e)
+
+# With APOCRYPHA_SEARCH_URL set, search goes to a shared search_server.py and this session holds no index
+if SEARCH_URL:
+    if "search_client" not in st.session_state:
+        st.session_state.search_client = SearchClient(SEARCH_URL)
+    st.session_state.records = []
+else:
+    if "index_shards" not in st.session_state:
+        # Fast path: a prebuilt index (python cli.py build-index), shared by every session of this process
+        prebuilt, error = load_prebuilt_index() if index_artifact.INDEX_DIR else (None, None)
+        if error:
+            st.warning(f"Prebuilt index not used ({error}); indexing in the background instead.")
+        # Otherwise index local data on background threads, one shard per tenant. They are started at the
+        # end of the script, once the board and chat shell are on screen, so the scan does not slow the first render
+        st.session_state.index_shards = prebuilt or IndexShards(root="sample_data")
+
+    # One consistent snapshot of the active shard per script run, so a request never sees a half-built index
+    shards = st.session_state.index_shards
+    st.session_state.records = shards.snapshot(active_shard()) if shards.started(active_shard()) else []
+
 # --- Node Structure Definition (Dynamic based on industry) ---
 def get_fnb_nodes():
     """Generate Restaurant Franchise node structure."""
@@ -444,165 +509,169 @@ def convert_finance_nodes_and_edges():
 
     return nodes, edges
 
-def map_node_to_files(node_id):
-    """Map a node ID to files in sample_data based on current industry."""
-    base = "sample_data"
-    
-    if st.session_state.selected_industry == "fnb":
-        return map_fnb_node_to_files(node_id, base)
-    elif st.session_state.selected_industry == "legal":
-        return map_legal_node_to_files(node_id, base)
-    else:
-        return map_finance_node_to_files(node_id, base)
-
-def map_fnb_node_to_files(node_id, base):
-    """Map F&B node ID to files."""
-    if node_id == 'restaurant_franchise':
-        return []
-        
-    parts = node_id.split('_')
-    if len(parts) < 2: return []
-    
-    group = parts[0].capitalize() + "_Group"
-    path = os.path.join(base, "Restaurant_Franchise", group)
-    
-    if parts[1] == 'group':
-        pass
-    else:
-        sub = parts[1].capitalize()
-        path = os.path.join(path, sub)
-        
-    if os.path.exists(path):
-        try:
-            return [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-        except:
-            return []
-    return []
-
-def map_legal_node_to_files(node_id, base):
-    """Map Legal Firm node ID to files."""
-    if node_id == 'legal_firm':
-        return []
-    
-    # Practice area IDs: corporate_law, litigation, etc.
-    practice_areas = ['corporate_law', 'litigation', 'real_estate', 'intellectual_property', 'employment_law']
-    
-    # Check if it's a practice area (no matter suffix)
-    if node_id in practice_areas:
-        return []  # Practice areas don't have files directly
-    
-    # It's a matter - parse the ID
-    # Format: {practice_area}_{matter_id}
-    # e.g., corporate_law_techcorp_acquisition
-    
-    # Map node IDs to folder names
-    matter_folder_map = {
-        'corporate_law_techcorp_acquisition': 'Corporate_Law/TechCorp_Acquisition',
-        'corporate_law_globalretail_ipo': 'Corporate_Law/GlobalRetail_IPO',
-        'litigation_smith_v_megacorp': 'Litigation/Smith_v_MegaCorp',
-        'litigation_contractdispute_abcvxyz': 'Litigation/ContractDispute_ABCvXYZ',
-        'real_estate_downtown_tower_development': 'Real_Estate/Downtown_Tower_Development',
-        'real_estate_office_lease_negotiation': 'Real_Estate/Office_Lease_Negotiation',
-        'intellectual_property_patent_portfolio_biotech': 'Intellectual_Property/Patent_Portfolio_BioTech',
-        'intellectual_property_trademark_dispute_fashion': 'Intellectual_Property/Trademark_Dispute_Fashion',
-        'employment_law_executive_compensation_review': 'Employment_Law/Executive_Compensation_Review',
-        'employment_law_workplace_investigation': 'Employment_Law/Workplace_Investigation',
-    }
-    
-    if node_id in matter_folder_map:
-        path = os.path.join(base, "Legal_Firm", matter_folder_map[node_id])
-        if os.path.exists(path):
-            try:
-                return [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-            except:
-                return []
-    
-    return []
+# Board node id -> folder under sample_data, for the nodes that aren't derived from their id
+LEGAL_FOLDERS = {
+    'corporate_law': 'Legal_Firm/Corporate_Law',
+    'litigation': 'Legal_Firm/Litigation',
+    'real_estate': 'Legal_Firm/Real_Estate',
+    'intellectual_property': 'Legal_Firm/Intellectual_Property',
+    'employment_law': 'Legal_Firm/Employment_Law',
+    'corporate_law_techcorp_acquisition': 'Legal_Firm/Corporate_Law/TechCorp_Acquisition',
+    'corporate_law_globalretail_ipo': 'Legal_Firm/Corporate_Law/GlobalRetail_IPO',
+    'litigation_smith_v_megacorp': 'Legal_Firm/Litigation/Smith_v_MegaCorp',
+    'litigation_contractdispute_abcvxyz': 'Legal_Firm/Litigation/ContractDispute_ABCvXYZ',
+    'real_estate_downtown_tower_development': 'Legal_Firm/Real_Estate/Downtown_Tower_Development',
+    'real_estate_office_lease_negotiation': 'Legal_Firm/Real_Estate/Office_Lease_Negotiation',
+    'intellectual_property_patent_portfolio_biotech': 'Legal_Firm/Intellectual_Property/Patent_Portfolio_BioTech',
+    'intellectual_property_trademark_dispute_fashion': 'Legal_Firm/Intellectual_Property/Trademark_Dispute_Fashion',
+    'employment_law_executive_compensation_review': 'Legal_Firm/Employment_Law/Executive_Compensation_Review',
+    'employment_law_workplace_investigation': 'Legal_Firm/Employment_Law/Workplace_Investigation',
+}
+
+FINANCE_FOLDERS = {
+    'equity_research': 'Finance_Firm/Equity_Research',
+    'fixed_income': 'Finance_Firm/Fixed_Income',
+    'portfolio_management': 'Finance_Firm/Portfolio_Management',
+    'risk_management': 'Finance_Firm/Risk_Management',
+    'trading': 'Finance_Firm/Trading',
+    'equity_research_tech_sector_analysis': 'Finance_Firm/Equity_Research/Tech_Sector_Analysis',
+    'equity_research_healthcare_sector_analysis': 'Finance_Firm/Equity_Research/Healthcare_Sector_Analysis',
+    'fixed_income_investment_grade': 'Finance_Firm/Fixed_Income/Investment_Grade',
+    'fixed_income_high_yield': 'Finance_Firm/Fixed_Income/High_Yield',
+    'portfolio_management_growth_fund': 'Finance_Firm/Portfolio_Management/Growth_Fund',
+    'portfolio_management_value_fund': 'Finance_Firm/Portfolio_Management/Value_Fund',
+    'risk_management_market_risk': 'Finance_Firm/Risk_Management/Market_Risk',
+    'risk_management_credit_risk': 'Finance_Firm/Risk_Management/Credit_Risk',
+    'trading_execution_analytics': 'Finance_Firm/Trading/Execution_Analytics',
+    'trading_market_making': 'Finance_Firm/Trading/Market_Making',
+}
+
+def list_indexed_files(folder, recursive=False):
+    """Files under a folder (relative to it) from the indexer's directory snapshot; no filesystem calls."""
+    if SEARCH_URL:
+        return st.session_state.search_client.files(folder, shard=active_shard(), recursive=recursive)
+    return st.session_state.index_shards.directory(active_shard()).files(folder, recursive=recursive)
 
-def map_finance_node_to_files(node_id, base):
-    """Map Finance Firm node ID to files."""
-    if node_id == 'finance_firm':
-        return []
-    
-    # Department IDs
-    departments = ['equity_research', 'fixed_income', 'portfolio_management', 'risk_management', 'trading']
-    
-    # Check if it's a department (no area suffix)
-    if node_id in departments:
+def map_node_to_files(node_id):
+    """Map a node ID to the files in its folder and all folders below it.
+
+    Group, practice-area and department nodes include the files of every nested
+    folder, paths relative to the node's folder (e.g. ``Smith_v_MegaCorp/Complaint_Filed.pdf``).
+    Industry roots map to no files.
+    """
+    segment = get_expected_path_segment(node_id)
+    if segment is None:
         return []
-    
-    # Map node IDs to folder names
-    area_folder_map = {
-        'equity_research_tech_sector_analysis': 'Equity_Research/Tech_Sector_Analysis',
-        'equity_research_healthcare_sector_analysis': 'Equity_Research/Healthcare_Sector_Analysis',
-        'fixed_income_investment_grade': 'Fixed_Income/Investment_Grade',
-        'fixed_income_high_yield': 'Fixed_Income/High_Yield',
-        'portfolio_management_growth_fund': 'Portfolio_Management/Growth_Fund',
-        'portfolio_management_value_fund': 'Portfolio_Management/Value_Fund',
-        'risk_management_market_risk': 'Risk_Management/Market_Risk',
-        'risk_management_credit_risk': 'Risk_Management/Credit_Risk',
-        'trading_execution_analytics': 'Trading/Execution_Analytics',
-        'trading_market_making': 'Trading/Market_Making',
-    }
-    
-    if node_id in area_folder_map:
-        path = os.path.join(base, "Finance_Firm", area_folder_map[node_id])
-        if os.path.exists(path):
-            try:
-                return [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-            except:
-                return []
-    
-    return []
+    return list_indexed_files(os.path.join("sample_data", segment), recursive=True)
 
 def get_expected_path_segment(node_id):
-    """Get the expected path segment for a node ID based on current industry."""
+    """Get the folder of a node ID under sample_data based on current industry."""
     if st.session_state.selected_industry == "fnb":
-        # F&B: west_expenses -> Restaurant_Franchise/West_Group/Expenses
+        # F&B: west_expenses -> Restaurant_Franchise/West_Group/Expenses, west_group -> Restaurant_Franchise/West_Group
         parts = node_id.split('_')
-        if len(parts) >= 2 and parts[1] != 'group':
-            group_name = parts[0].capitalize() + "_Group"
-            folder_name = parts[1].capitalize()
-            return f"Restaurant_Franchise{os.sep}{group_name}{os.sep}{folder_name}"
-        return None
-    elif st.session_state.selected_industry == "legal":
-        # Legal: Use the matter_folder_map
-        matter_folder_map = {
-            'corporate_law_techcorp_acquisition': 'Legal_Firm/Corporate_Law/TechCorp_Acquisition',
-            'corporate_law_globalretail_ipo': 'Legal_Firm/Corporate_Law/GlobalRetail_IPO',
-            'litigation_smith_v_megacorp': 'Legal_Firm/Litigation/Smith_v_MegaCorp',
-            'litigation_contractdispute_abcvxyz': 'Legal_Firm/Litigation/ContractDispute_ABCvXYZ',
-            'real_estate_downtown_tower_development': 'Legal_Firm/Real_Estate/Downtown_Tower_Development',
-            'real_estate_office_lease_negotiation': 'Legal_Firm/Real_Estate/Office_Lease_Negotiation',
-            'intellectual_property_patent_portfolio_biotech': 'Legal_Firm/Intellectual_Property/Patent_Portfolio_BioTech',
-            'intellectual_property_trademark_dispute_fashion': 'Legal_Firm/Intellectual_Property/Trademark_Dispute_Fashion',
-            'employment_law_executive_compensation_review': 'Legal_Firm/Employment_Law/Executive_Compensation_Review',
-            'employment_law_workplace_investigation': 'Legal_Firm/Employment_Law/Workplace_Investigation',
-        }
-        if node_id in matter_folder_map:
-            return matter_folder_map[node_id].replace("/", os.sep)
-        return None
-    else:
-        # Finance: Use the area_folder_map
-        area_folder_map = {
-            'equity_research_tech_sector_analysis': 'Finance_Firm/Equity_Research/Tech_Sector_Analysis',
-            'equity_research_healthcare_sector_analysis': 'Finance_Firm/Equity_Research/Healthcare_Sector_Analysis',
-            'fixed_income_investment_grade': 'Finance_Firm/Fixed_Income/Investment_Grade',
-            'fixed_income_high_yield': 'Finance_Firm/Fixed_Income/High_Yield',
-            'portfolio_management_growth_fund': 'Finance_Firm/Portfolio_Management/Growth_Fund',
-            'portfolio_management_value_fund': 'Finance_Firm/Portfolio_Management/Value_Fund',
-            'risk_management_market_risk': 'Finance_Firm/Risk_Management/Market_Risk',
-            'risk_management_credit_risk': 'Finance_Firm/Risk_Management/Credit_Risk',
-            'trading_execution_analytics': 'Finance_Firm/Trading/Execution_Analytics',
-            'trading_market_making': 'Finance_Firm/Trading/Market_Making',
-        }
-        if node_id in area_folder_map:
-            return area_folder_map[node_id].replace("/", os.sep)
-        return None
+        if len(parts) != 2 or node_id == 'restaurant_franchise':
+            return None
+        group_name = parts[0].capitalize() + "_Group"
+        if parts[1] == 'group':
+            return f"Restaurant_Franchise{os.sep}{group_name}"
+        return f"Restaurant_Franchise{os.sep}{group_name}{os.sep}{parts[1].capitalize()}"
+    folders = LEGAL_FOLDERS if st.session_state.selected_industry == "legal" else FINANCE_FOLDERS
+    if node_id in folders:
+        return folders[node_id].replace("/", os.sep)
+    return None
+
+def highlight_markdown(snippet: dict) -> str:
+    """Snippet text as markdown with its highlighted terms in bold."""
+    def escape(text: str) -> str:
+        # Keep '$' amounts from being rendered as LaTeX and stray '*'/'_' from toggling emphasis
+        text = re.sub(r"\s+", " ", text)
+        for ch in "\\`*_$#[]<>":
+            text = text.replace(ch, "\\" + ch)
+        return text
+    text = snippet["text"]
+    parts, pos = [], 0
+    for start, end in snippet["highlights"]:
+        parts.append(escape(text[pos:start]))
+        parts.append(f"**{escape(text[start:end])}**")
+        pos = end
+    parts.append(escape(text[pos:]))
+    return "…" + "".join(parts) + "…"
 
 # --- UI Layout ---
 st.caption("Apocrypha Prototype: React Flow Integration (v2)")
 
+@st.fragment(run_every=1.0)
+def indexing_status():
+    """Show scan progress while the active shard is indexing; rerun the app once it finishes."""
+    if SEARCH_URL:
+        return
+    if not st.session_state.index_shards.started(active_shard()):
+        st.progress(0.0, text="Indexing documents: starting…")
+        return
+    progress = st.session_state.index_shards.progress(active_shard())
+    if not progress.done:
+        rate = progress.bytes_per_sec / 1024
+        st.progress(
+            progress.fraction,
+            text=f"Indexing documents: {progress.files_done}/{progress.files_total} files · {rate:,.0f} KB/s",
+        )
+    elif len(st.session_state.records) < progress.files_done:
+        # This run started on a partial snapshot; pick up the full index
+        st.rerun(scope="app")
+    elif progress.error:
+        st.warning(f"Indexing stopped early: {progress.error}")
+
+indexing_status()
+
+# Stages of the last chat turns, from the perf ring buffer
+PERF_PANEL = os.environ.get("APOCRYPHA_PERF_PANEL") == "1"
+PERF_TURNS = 10
+PERF_STAGES = ["retrieve", "correct_query", "search_facets", "resolve_context_docs", "extract_node_ids_from_paths",
+               "build_system_prompt", "cache", "llm", "render_board", "turn"]
+
+def performance_panel():
+    st.header("Performance")
+    if "first_paint_ms" in st.session_state:
+        st.metric("First paint", f"{st.session_state.first_paint_ms:,.0f} ms", help="From the start of this session's first script run (imports included) until the board and chat shell were sent")
+    records = st.session_state.records
+    if hasattr(records, "store"):
+        store = records.store
+        st.metric("Index memory", f"{store.nbytes() / 1e6:,.1f} MB", help="Columns and token index; the memory-mapped text file is not counted")
+        st.caption(f"{len(records):,} files · {store.texts.total_bytes() / 1e6:,.2f} MB of text on disk")
+    sizes = session_nbytes(st.session_state)
+    history = st.session_state.messages
+    st.metric("Session memory", f"{sum(sizes.values()) / 1e3:,.1f} KB", help="Approximate size of this session's state; the shared index is not counted")
+    st.caption(
+        f"Chat history: {len(history)} messages, {history.evicted} summarized · largest: "
+        + ", ".join(f"{key} {size / 1e3:,.1f} KB" for key, size in list(sizes.items())[:3])
+    )
+    working_set = st.session_state.working_set
+    st.caption(
+        f"Working set: {len(working_set)} passages, ~{working_set.tokens():,} tokens · "
+        f"{working_set.reused} follow-ups reused it, {working_set.searched} searched"
+    )
+    rows = perf.recent_turns(PERF_TURNS)
+    if rows:
+        table = [
+            {"prompt": row["label"][:40], **{stage: round(row["stages"][stage], 1) for stage in PERF_STAGES if stage in row["stages"]}}
+            for row in rows
+        ]
+        st.caption(f"Last {len(rows)} turns, milliseconds per stage (`turn` is wall time; stages overlap)")
+        st.dataframe(table, hide_index=True, use_container_width=True)
+    else:
+        st.caption("No chat turns yet.")
+    st.download_button(
+        "Export trace (Chrome JSON)",
+        data=json.dumps(perf.chrome_trace()),
+        file_name="apocrypha_trace.json",
+        mime="application/json",
+        help="Open in chrome://tracing or ui.perfetto.dev",
+    )
+
+if PERF_PANEL:
+    with st.sidebar:
+        performance_panel()
+
 # Industry selector callbacks
 def select_fnb():
     if st.session_state.selected_industry != "fnb":
@@ -611,6 +680,7 @@ def select_fnb():
         # Clear context when switching industries
         st.session_state.context_nodes = []
         st.session_state.highlight_nodes = []
+        st.session_state.node_facets = {}
 
 def select_legal():
     if st.session_state.selected_industry != "legal":
@@ -619,6 +689,7 @@ def select_legal():
         # Clear context when switching industries
         st.session_state.context_nodes = []
         st.session_state.highlight_nodes = []
+        st.session_state.node_facets = {}
 
 def select_finance():
     if st.session_state.selected_industry != "finance":
@@ -627,6 +698,7 @@ def select_finance():
         # Clear context when switching industries
         st.session_state.context_nodes = []
         st.session_state.highlight_nodes = []
+        st.session_state.node_facets = {}
 
 col_board, col_chat = st.columns([3, 2])
 
@@ -661,15 +733,22 @@ with col_board:
             use_container_width=True
         )
     
-    # Prepare data for React Flow
-    rf_nodes, rf_edges = convert_to_react_flow_nodes_and_edges()
-    
-    # Pass highlights
-    highlights = st.session_state.highlight_nodes
-    
-    # Render Component with unique key per industry to force re-render
-    component_key = f"main_board_{st.session_state.selected_industry}"
-    component_state = miro_board(nodes=rf_nodes, edges=rf_edges, highlight_nodes=highlights, key=component_key)
+    # The first render after a chat turn is counted towards that turn
+    with perf.span("render_board", turn=st.session_state.pop("render_turn", None)):
+        # Prepare data for React Flow
+        rf_nodes, rf_edges = convert_to_react_flow_nodes_and_edges()
+        # Badge nodes with the last search's hit counts (folders below a node included)
+        for node in rf_nodes:
+            hits = st.session_state.node_facets.get(node['id'])
+            if hits:
+                node['data'] = {**node['data'], 'label': f"{node['data']['label']} · {hits} {'hit' if hits == 1 else 'hits'}"}
+        
+        # Pass highlights
+        highlights = st.session_state.highlight_nodes
+        
+        # Render Component with unique key per industry to force re-render
+        component_key = f"main_board_{st.session_state.selected_industry}"
+        component_state = miro_board(nodes=rf_nodes, edges=rf_edges, highlight_nodes=highlights, key=component_key)
     
     # Handle Component Events
     if component_state:
@@ -800,146 +879,125 @@ with col_chat:
     # Create a scrollable container for the chat area
     with st.container(height=620):
         # Chat Interface - Messages display
+        if st.session_state.messages.evicted:
+            st.caption(f"🗂️ {st.session_state.messages.evicted} earlier messages summarized")
         for msg in st.session_state.messages:
             if msg["role"] == "system":
                 # Skipped rendering system messages
                 pass
             else:
                 with st.chat_message(msg["role"]):
-                    if "relevant_docs" in msg:
+                    if msg.get("cached"):
+                        st.caption("⚡ Cached answer")
+                    if msg.get("reused"):
+                        st.caption("♻️ Answered from passages already retrieved in this conversation")
+                    if msg.get("corrections"):
+                        searched = ", ".join(f"{fixed} (typed {typed})" for typed, fixed in msg["corrections"].items())
+                        st.caption(f"🔤 Searched for {searched}")
+                    if "refs" in msg:
                         st.write("**References:**")
                         # Scrollable container for references
                         with st.container(height=150):
-                            for doc in msg["relevant_docs"]:
-                                st.caption(f"📄 {doc.get('name')} ({doc.get('path')})")
+                            for ref in msg["refs"]:
+                                st.caption(f"📄 {ref.name} ({ref.path})")
+                                # Show why the file matched: its best snippet with query terms in bold
+                                if ref.snippet:
+                                    st.caption(f"> {highlight_markdown(ref.snippet)}")
                     st.write(msg["content"])
+                    if msg.get("timings"):
+                        st.caption(f"⏱️ {format_timings(msg['timings'])}")
         
         # Show processing indicator inside the scrollable container
+        processing_status = None
         if st.session_state.is_processing:
             with st.chat_message("assistant"):
-                st.write("🔄 Analyzing...")
+                processing_status = st.empty()
+                processing_status.write("🔄 Analyzing...")
 
     # Chat input stays outside the scrollable container (fixed at bottom)
     if prompt := st.chat_input("Ask about the files..."):
+        # A newer prompt supersedes any turn still in flight
+        in_flight = st.session_state.get("chat_future")
+        if in_flight is not None and not in_flight.done():
+            in_flight.cancel()
+        
         # Save user message and set processing flag, then rerun to show the message
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.session_state.is_processing = True
         st.session_state.pending_prompt = prompt  # Store for processing after rerun
         st.rerun()
     
+    # The board and chat shell have been sent to the browser
+    if "first_paint_ms" not in st.session_state:
+        st.session_state.first_paint_ms = (perf.mark("first_paint", _run_started) - _run_started) * 1000
+    if not SEARCH_URL and not st.session_state.index_shards.started(active_shard()):
+        st.session_state.index_shards.start(first=active_shard())
+    
     # Process pending prompt (after rerun, so user message is visible)
     if st.session_state.is_processing and st.session_state.pending_prompt:
         prompt = st.session_state.pending_prompt
         st.session_state.pending_prompt = None  # Clear to avoid reprocessing
         
-        # RAG / Search Logic
-        relevant_docs = []
-        
         # Strategy:
         # 1. If user explicitly selected context nodes, use ONLY files from those nodes.
-        # 2. If NO context selected, fallback to keyword search across the entire board.
-        
-        if st.session_state.context_nodes:
-            # Direct lookup from context nodes (no search required)
-            all_context_files = []
-            for node in st.session_state.context_nodes:
-                node_id = node['id']
-                
-                # Get expected path segment based on industry
-                expected_path_segment = get_expected_path_segment(node_id)
-                
-                if 'files' in node:
-                    for f in node['files']:
-                        # Find the full record for this file that matches BOTH filename AND path
-                        for r in st.session_state.records:
-                            if r['name'] == f:
-                                # Verify this record belongs to the correct folder
-                                if expected_path_segment and expected_path_segment in r['path']:
-                                    all_context_files.append(r)
-                                    break
-                                elif not expected_path_segment:
-                                    # Fallback if we couldn't parse node_id
-                                    all_context_files.append(r)
-                                    break
-            
-            # Deduplicate based on path
-            seen_paths = set()
-            unique_docs = []
-            for d in all_context_files:
-                if d['path'] not in seen_paths:
-                    seen_paths.add(d['path'])
-                    # Assign a high artificial score since user explicitly selected it
-                    d_copy = d.copy()
-                    d_copy['score'] = 100.0 
-                    unique_docs.append(d_copy)
-            
-            relevant_docs = unique_docs
-            
-        else:
-            # Search within the selected industry only
-            industry_map = {
-                "fnb": "Restaurant_Franchise",
-                "legal": "Legal_Firm",
-                "finance": "Finance_Firm"
-            }
-            industry_filter = industry_map.get(st.session_state.selected_industry, "Restaurant_Franchise")
-            relevant_docs = search_files(prompt, st.session_state.records, k=50, industry_filter=industry_filter)
-
-        # Highlight logic
-        high_relevance_docs = []
-        if st.session_state.context_nodes:
-            # If context is selected, ALL files in context are "high relevance" by definition
-            high_relevance_docs = relevant_docs
-            
-            # ONLY highlight the explicitly selected context nodes
-            # Do NOT derive from file paths - that can cause wrong groups to highlight
-            active_context_ids = [n['id'] for n in st.session_state.context_nodes]
-            st.session_state.highlight_nodes = active_context_ids
-            
-        elif relevant_docs:
-            # No context selected - use search results
-            # Only highlight nodes for documents with score > 25.0
-            # This prevents low-relevance "noise" from lighting up the entire board
-            high_relevance_docs = [d for d in relevant_docs if d.get('score', 0) > 25.0]
-            new_highlights = extract_node_ids_from_paths(
-                [d['path'] for d in high_relevance_docs], 
-                industry=st.session_state.selected_industry
-            )
-            st.session_state.highlight_nodes = new_highlights
-        else:
-            st.session_state.highlight_nodes = []
+        # 2. If NO context selected, fallback to keyword search across the active industry shard.
+        # Everything the pipeline needs from session state is captured here; it runs off the script thread.
+        request = ChatRequest(
+            prompt=prompt,
+            model=st.session_state["openai_model"],
+            records=st.session_state.records,
+            history=st.session_state.messages.for_model(),
+            industry=st.session_state.selected_industry,
+            context=[(get_expected_path_segment(n['id']), n.get('files', [])) for n in st.session_state.context_nodes],
+            context_node_ids=[n['id'] for n in st.session_state.context_nodes],
+            tables=getattr(st.session_state.records, "tables", {}),
+            search_client=st.session_state.get("search_client"),
+            shard=active_shard(),
+            summary=st.session_state.messages.summary,
+            working_set=st.session_state.working_set,
+        )
 
         # AI Response - process and save, then rerun to display inside container
         try:
-            client = get_client()
-            
-            # Build conversation history
-            history = [{"role": m["role"], "content": m["content"]} for m in st.session_state.messages if m["role"] != "system"]
+            future = get_runner().submit(run_chat_pipeline(
+                request,
+                client=get_client(),
+                cache=get_answer_cache(),
+                semantic=semantic_cache_enabled(),
+            ))
+            st.session_state.chat_future = future
             
-            # System prompt with context
-            sys_prompt = "You are a Apocrypha, a document intelligence agent. You have access to the company's file system. Answer based on the user context and documents."
-            if high_relevance_docs:
-                doc_context = "\n".join([f"File: {d['path']}\nContent:\n{d.get('text', '')}\n---" for d in high_relevance_docs])
-                sys_prompt += f"\n\nRelevant Document Excerpts:\n{doc_context}"
+            # Poll instead of blocking so a new prompt can interrupt this run (and cancel the future)
+            waited = time.perf_counter()
+            while True:
+                try:
+                    result = future.result(timeout=0.25)
+                    break
+                except concurrent.futures.TimeoutError:
+                    if processing_status is not None:
+                        processing_status.write(f"🔄 Analyzing... {time.perf_counter() - waited:.1f}s")
             
-            response = client.chat.completions.create(
-                model=st.session_state["openai_model"],
-                messages=[{"role": "system", "content": sys_prompt}] + history[-5:],
-                stream=False
-            )
-            answer = response.choices[0].message.content
+            st.session_state.highlight_nodes = result.highlights
+            st.session_state.node_facets = result.facets
+            st.session_state.render_turn = result.turn
             
             # Save response to session state and clear processing flag
             st.session_state.messages.append({
                 "role": "assistant", 
-                "content": answer,
-                "relevant_docs": high_relevance_docs
+                "content": result.answer,
+                "refs": doc_refs(result.relevant_docs),
+                "cached": result.cached,
+                "reused": result.reused,
+                "timings": result.timings,
+                "corrections": result.corrections
             })
             st.session_state.is_processing = False
             
             # Rerun to display messages inside the scrollable container
             st.rerun()
             
+        except concurrent.futures.CancelledError:
+            pass
         except Exception as e:
             st.session_state.is_processing = False
             st.error(f"Error: {e}")
@@ -0,0 +1,156 @@
+"""Synthetic corpus generator: scales the ``sample_data`` layout to any number of documents.
+
+Files are written to ``<out>/sample_data`` with a ``corpus.json`` manifest
+beside it. Every leaf folder of the template tree (e.g. ``Legal_Firm/Litigation/Smith_v_MegaCorp``)
+gets ``Batch_NNNN`` subfolders holding variants of its template files, so board
+node ids, folder keywords and file types keep the shape of the real data while
+the document count grows. Text is the template's text with its numbers
+re-drawn and a few sentences of corpus vocabulary added; PDFs are rendered with
+reportlab. Output is deterministic for a given seed.
+
+    python -m benchmarks.corpus --docs 10000 --out /tmp/corpus_10k
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+from document_search import iter_document_text, list_files
+from token_index import TOKEN_RE
+
+MANIFEST = "corpus.json"
+# Template text lines per rendered PDF page
+PDF_LINES_PER_PAGE = 48
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+class Template(NamedTuple):
+    folder: str
+    stem: str
+    ext: str
+    text: str
+
+
+def load_templates(template_root: str) -> List[Template]:
+    templates = []
+    for path in list_files(template_root):
+        folder, fname = os.path.split(os.path.relpath(path, template_root))
+        stem, ext = os.path.splitext(fname)
+        text = "".join(iter_document_text(path, ext.lower().strip(".")))
+        templates.append(Template(folder, stem, ext.lower(), text))
+    return templates
+
+
+def _vary(text: str, rng: random.Random, vocabulary: List[str], ext: str) -> str:
+    def renumber(m: "re.Match") -> str:
+        value = m.group()
+        if "." in value:
+            return f"{float(value) * rng.uniform(0.5, 1.5):.2f}"
+        return str(max(0, int(int(value) * rng.uniform(0.5, 1.5))))
+
+    text = _NUMBER_RE.sub(renumber, text)
+    if ext == ".csv":
+        # Keep tables parseable: new rows only
+        return text
+    extra = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(20, 60)))
+    return f"{text}\n\nNotes: {extra}.\n"
+
+
+def write_pdf(path: str, text: str) -> None:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(path, pagesize=letter)
+    lines = [line[:110] for line in text.splitlines()] or [""]
+    for start in range(0, len(lines), PDF_LINES_PER_PAGE):
+        y = 750
+        for line in lines[start:start + PDF_LINES_PER_PAGE]:
+            pdf.drawString(40, y, line)
+            y -= 15
+        pdf.showPage()
+    pdf.save()
+
+
+def generate(
+    out: str,
+    docs: int,
+    template_root: str = "sample_data",
+    seed: int = 0,
+    pdf_fraction: Optional[float] = None,
+) -> Dict:
+    """Write a corpus of ``docs`` files under ``<out>/sample_data`` and return its manifest.
+
+    ``pdf_fraction`` is the share of PDF templates rendered as PDFs (1.0 by
+    default); the rest are written as .txt with the same text, which is much
+    faster to generate at 1M documents. An existing corpus with the same
+    parameters is reused.
+    """
+    params = {"docs": docs, "template_root": template_root, "seed": seed, "pdf_fraction": pdf_fraction}
+    manifest_path = os.path.join(out, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("params") == params:
+            return manifest
+
+    root = os.path.join(out, "sample_data")
+    rng = random.Random(seed)
+    templates = load_templates(template_root)
+    if not templates:
+        raise ValueError(f"no template files under {template_root}")
+    vocabulary = sorted({t.lower() for tpl in templates for t in TOKEN_RE.findall(tpl.text) if len(t) > 3})
+    by_folder: Dict[str, List[Template]] = {}
+    for tpl in templates:
+        by_folder.setdefault(tpl.folder, []).append(tpl)
+    folders = sorted(by_folder)
+
+    counts = {"pdf": 0, "other": 0}
+    written = 0
+    batch = 0
+    while written < docs:
+        for folder in folders:
+            target = os.path.join(root, folder, f"Batch_{batch:04d}")
+            os.makedirs(target, exist_ok=True)
+            for tpl in by_folder[folder]:
+                if written >= docs:
+                    break
+                text = _vary(tpl.text, rng, vocabulary, tpl.ext)
+                as_pdf = tpl.ext == ".pdf" and rng.random() < (1.0 if pdf_fraction is None else pdf_fraction)
+                ext = tpl.ext if tpl.ext != ".pdf" or as_pdf else ".txt"
+                path = os.path.join(target, f"{tpl.stem}_{batch:04d}{ext}")
+                if as_pdf:
+                    write_pdf(path, text)
+                    counts["pdf"] += 1
+                else:
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(text)
+                    counts["other"] += 1
+                written += 1
+            if written >= docs:
+                break
+        batch += 1
+
+    manifest = {"params": params, "root": root, "files": written, "batches": batch, "pdfs": counts["pdf"]}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10_000, help="number of files to generate")
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--templates", default="sample_data", help="folder whose layout and files are scaled up")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf-fraction", type=float, help="share of PDF templates rendered as PDFs (default all)")
+    args = parser.parse_args(argv)
+    manifest = generate(args.out, args.docs, args.templates, args.seed, args.pdf_fraction)
+    print(json.dumps(manifest))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
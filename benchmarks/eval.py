@@ -0,0 +1,170 @@
+"""Offline retrieval evaluation: relevance and cost of each ranking mode on a labelled query set.
+
+    python -m benchmarks.eval
+    python -m benchmarks.eval --modes legacy,hybrid -k 5 --output eval.json
+
+For every query in ``benchmarks/queries.json`` (query -> relevant paths and
+board nodes, searched within the query's tenant shard as the app does) each
+mode's ranking is scored with recall@k, MRR and nDCG@k over paths and recall@k
+over board nodes, next to query latency and the estimated prompt tokens the
+chat pipeline would send for the top documents. Prints a table to stderr and
+the full report as JSON.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from chat_pipeline import PROMPT_SNIPPETS, doc_prompt_block
+from document_search import extract_node_ids_from_paths, make_snippets, scan_dummy_data, search_files
+from ranking import BM25Ranker, HybridRanker, VectorRanker
+
+QUERY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries.json")
+MODES = ("legacy", "bm25", "vector", "hybrid")
+# Documents the prompt is built from when estimating tokens
+PROMPT_DOCS = 5
+# Rough tokens-per-character ratio for English text with the OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def recall_at(ranked: Sequence[str], relevant: Sequence[str], k: int) -> float:
+    return len(set(ranked[:k]) & set(relevant)) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(ranked: Sequence[str], relevant: Sequence[str]) -> float:
+    for rank, item in enumerate(ranked, start=1):
+        if item in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at(ranked: Sequence[str], relevant: Sequence[str], k: int) -> float:
+    """Binary-gain nDCG: each relevant document found counts 1, discounted by log2 of its rank."""
+    dcg = sum(1.0 / math.log2(rank + 1) for rank, item in enumerate(ranked[:k], start=1) if item in relevant)
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+def prompt_tokens(hits: List[Dict], query: str) -> int:
+    """Estimated tokens of the document section the chat pipeline would build from ``hits``."""
+    blocks = []
+    for hit in hits[:PROMPT_DOCS]:
+        hit = hit.copy()
+        hit["snippets"] = make_snippets(hit, query, count=PROMPT_SNIPPETS)
+        blocks.append(doc_prompt_block(hit, query, {}, numeric=False))
+    return len("\n".join(blocks)) // CHARS_PER_TOKEN
+
+
+def build_searchers(records: Sequence[Dict], modes: Sequence[str]) -> Dict[str, Any]:
+    """(searcher, seconds spent preparing it) per mode for one shard's records.
+
+    BM25 and vector rankers are built once and shared; hybrid is charged for both.
+    """
+    built: Dict[str, Any] = {}
+
+    def component(name: str, cls):
+        if name not in built:
+            started = time.perf_counter()
+            built[name] = (cls(records), time.perf_counter() - started)
+        return built[name]
+
+    searchers: Dict[str, Any] = {}
+    for mode in modes:
+        if mode == "legacy":
+            searchers[mode] = (lambda q, k: search_files(q, records, k=k), 0.0)
+        elif mode == "bm25":
+            ranker, seconds = component("bm25", BM25Ranker)
+            searchers[mode] = (ranker.search, seconds)
+        elif mode == "vector":
+            ranker, seconds = component("vector", VectorRanker)
+            searchers[mode] = (ranker.search, seconds)
+        elif mode == "hybrid":
+            (bm25, bm25_seconds), (vectors, vector_seconds) = component("bm25", BM25Ranker), component("vector", VectorRanker)
+            searchers[mode] = (HybridRanker(records, bm25, vectors).search, bm25_seconds + vector_seconds)
+        else:
+            raise ValueError(f"unknown mode: {mode} (choose from {', '.join(MODES)})")
+    return searchers
+
+
+def evaluate(query_file: str, modes: Sequence[str], k: int, rounds: int) -> Dict[str, Any]:
+    with open(query_file, encoding="utf-8") as f:
+        labelled = json.load(f)
+    root = labelled.get("root", "sample_data")
+    records = scan_dummy_data(root=root)
+    shards = sorted({q["shard"] for q in labelled["queries"]})
+    shard_records = {s: [r for r in records if f"{os.sep}{s}{os.sep}" in r["path"]] for s in shards}
+    prepared = {s: build_searchers(shard_records[s], modes) for s in shards}
+
+    report: Dict[str, Any] = {}
+    for mode in modes:
+        metrics: Dict[str, List[float]] = {
+            "recall@1": [], f"recall@{k}": [], "mrr": [], f"ndcg@{k}": [], f"node_recall@{k}": [], "prompt_tokens": [],
+        }
+        latencies: List[float] = []
+        per_query = []
+        for q in labelled["queries"]:
+            searcher, _ = prepared[q["shard"]][mode]
+            for _ in range(rounds):
+                started = time.perf_counter()
+                hits = searcher(q["query"], 50)
+                latencies.append(time.perf_counter() - started)
+            ranked = [os.path.relpath(h["path"], root) for h in hits]
+            relevant = q["relevant"]
+            nodes = extract_node_ids_from_paths([h["path"] for h in hits[:k]])
+            row = {
+                "recall@1": recall_at(ranked, relevant, 1),
+                f"recall@{k}": recall_at(ranked, relevant, k),
+                "mrr": reciprocal_rank(ranked, relevant),
+                f"ndcg@{k}": ndcg_at(ranked, relevant, k),
+                f"node_recall@{k}": len(set(nodes) & set(q["nodes"])) / len(q["nodes"]),
+                "prompt_tokens": prompt_tokens(hits, q["query"]),
+            }
+            for name, value in row.items():
+                metrics[name].append(value)
+            per_query.append({"query": q["query"], "top": ranked[:3], **{n: round(v, 3) for n, v in row.items()}})
+        ms = np.asarray(latencies) * 1000
+        report[mode] = {
+            **{name: round(float(np.mean(values)), 4) for name, values in metrics.items()},
+            "latency_p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "latency_p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "prepare_ms": round(sum(prepared[s][mode][1] for s in shards) * 1000, 1),
+            "queries": per_query,
+        }
+    return {"query_file": query_file, "root": root, "docs": len(records), "k": k, "modes": report}
+
+
+def print_table(result: Dict[str, Any], out=sys.stderr) -> None:
+    k = result["k"]
+    columns = ["recall@1", f"recall@{k}", "mrr", f"ndcg@{k}", f"node_recall@{k}", "prompt_tokens", "latency_p50_ms", "latency_p95_ms", "prepare_ms"]
+    print(f"{'mode':<8}" + "".join(f"{c:>16}" for c in columns), file=out)
+    for mode, row in result["modes"].items():
+        print(f"{mode:<8}" + "".join(f"{row[c]:>16}" for c in columns), file=out)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=QUERY_FILE, help="labelled query file")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {', '.join(MODES)}")
+    parser.add_argument("-k", type=int, default=5, help="cutoff for recall, nDCG and node recall")
+    parser.add_argument("--rounds", type=int, default=3, help="timed runs per query")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    result = evaluate(args.queries, args.modes.split(","), args.k, args.rounds)
+    print_table(result)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Benchmark index build, search and context resolution on synthetic corpora.
+
+    python -m benchmarks.run --sizes 10k,100k --output results.json
+    python -m benchmarks.run --sizes 1M --pdf-fraction 0.1
+
+Each size gets a generated corpus (see ``benchmarks.corpus``, reused between
+runs). The cold build starts from an empty extraction cache and the warm build
+reuses it; each runs in a fresh process so peak RSS is per build. The warm
+process then measures query latency, ``extract_node_ids_from_paths``
+throughput and context resolution against the index it built. Results are
+printed (or written) as one JSON document so runs can be diffed.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.corpus import generate
+
+# Representative chat prompts: folder intents, free text, time indicators and query operators
+QUERIES = [
+    "west expenses",
+    "central group accounting",
+    "east permits renewal",
+    "legal documents for the west group",
+    "show me travel expenses q1",
+    "litigation smith v megacorp",
+    "techcorp acquisition due diligence",
+    "patent portfolio biotech filings",
+    "trademark dispute fashion",
+    "office lease negotiation terms",
+    "executive compensation review",
+    "workplace investigation findings",
+    "equity research tech sector analysis",
+    "high yield bonds",
+    "growth fund performance 2024",
+    "market risk var limits",
+    "credit risk exposure",
+    "execution analytics slippage",
+    "what is the total marketing spend",
+    "revenue growth last quarter",
+    "quarterly report 2025",
+    "\"summary judgment\"",
+    "settlement NEAR/5 proposal",
+    "name:invoice",
+    "path:expenses utilities",
+]
+# Cap on files resolved per context node; resolution cost grows with files x records
+CONTEXT_FILES = 200
+NODE_ID_BATCH = 50
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * scale)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def _build(root: str, cache_dir: str):
+    from document_search import scan_dummy_data
+    from extraction_cache import ExtractionCache
+
+    # Sized so nothing is evicted between the cold and warm builds
+    cache = ExtractionCache(cache_dir, max_bytes=1 << 40)
+    started = time.perf_counter()
+    records = scan_dummy_data(root=root, cache=cache)
+    seconds = time.perf_counter() - started
+    stats = {
+        "seconds": round(seconds, 3),
+        "docs": len(records),
+        "docs_per_sec": round(len(records) / seconds, 1) if seconds else None,
+        "text_mb": round(records.texts.total_bytes() / 1e6, 2),
+        "heap_mb": round(records.nbytes() / 1e6, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    return records, stats
+
+
+def cold_build(root: str, cache_dir: str) -> Dict[str, Any]:
+    _, stats = _build(root, cache_dir)
+    return stats
+
+
+def bench_search(records, rounds: int) -> Dict[str, Any]:
+    from document_search import search_files, search_many
+
+    latencies: List[float] = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            started = time.perf_counter()
+            search_files(query, records, k=50)
+            latencies.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    search_many(QUERIES, records, k=50)
+    batch = time.perf_counter() - started
+    return {
+        "queries": len(latencies),
+        **percentiles(latencies),
+        "search_many_ms_per_query": round(batch * 1000 / len(QUERIES), 3),
+    }
+
+
+def bench_node_ids(records) -> Dict[str, Any]:
+    from document_search import extract_node_ids_from_paths
+
+    paths = [r["path"] for r in records]
+    started = time.perf_counter()
+    # In hit-list sized batches, as the chat pipeline calls it
+    for i in range(0, len(paths), NODE_ID_BATCH):
+        extract_node_ids_from_paths(paths[i:i + NODE_ID_BATCH])
+    seconds = time.perf_counter() - started
+    return {"paths": len(paths), "seconds": round(seconds, 3), "paths_per_sec": round(len(paths) / seconds, 1) if seconds else None}
+
+
+def bench_context(records, root: str) -> Dict[str, Any]:
+    from chat_pipeline import resolve_context_docs
+    from folder_index import DirectorySnapshot
+
+    started = time.perf_counter()
+    directory = DirectorySnapshot(r["path"] for r in records)
+    snapshot_seconds = time.perf_counter() - started
+    nodes = {
+        "leaf": "Legal_Firm/Litigation/Smith_v_MegaCorp",
+        "department": "Finance_Firm/Trading",
+        "group": "Restaurant_Franchise/West_Group",
+    }
+    results: Dict[str, Any] = {"snapshot_ms": round(snapshot_seconds * 1000, 3)}
+    for kind, segment in nodes.items():
+        started = time.perf_counter()
+        files = directory.files(os.path.join(root, segment), recursive=True)
+        listed = time.perf_counter() - started
+        files = files[:CONTEXT_FILES]
+        started = time.perf_counter()
+        docs = resolve_context_docs(records, [(segment, files)])
+        resolved = time.perf_counter() - started
+        results[kind] = {
+            "files": len(files),
+            "resolved": len(docs),
+            "list_ms": round(listed * 1000, 3),
+            "resolve_ms": round(resolved * 1000, 3),
+        }
+    return results
+
+
+def warm_build_and_query(root: str, cache_dir: str, rounds: int) -> Dict[str, Any]:
+    records, stats = _build(root, cache_dir)
+    return {
+        "index": stats,
+        "search": bench_search(records, rounds),
+        "node_ids": bench_node_ids(records),
+        "context": bench_context(records, root),
+    }
+
+
+def _in_fresh_process(fn, *args):
+    # A new process per phase, so ru_maxrss is that phase's peak
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def run_size(docs: int, work_dir: str, rounds: int, pdf_fraction: Optional[float], seed: int) -> Dict[str, Any]:
+    out = os.path.join(work_dir, f"corpus_{docs}")
+    started = time.perf_counter()
+    manifest = generate(out, docs, seed=seed, pdf_fraction=pdf_fraction)
+    corpus_seconds = time.perf_counter() - started
+    with tempfile.TemporaryDirectory(prefix="bench-cache-") as cache_dir:
+        cold = _in_fresh_process(cold_build, manifest["root"], cache_dir)
+        warm = _in_fresh_process(warm_build_and_query, manifest["root"], cache_dir, rounds)
+    return {
+        "docs": docs,
+        "corpus": {**manifest, "seconds": round(corpus_seconds, 3)},
+        "index_cold": cold,
+        "index_warm": warm.pop("index"),
+        **warm,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k", help="comma-separated corpus sizes, e.g. 10k,100k,1M")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "apocrypha_bench"),
+                        help="where corpora are generated and kept between runs")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the query set")
+    parser.add_argument("--pdf-fraction", type=float, help="share of PDF templates rendered as PDFs (default all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rounds": args.rounds,
+            "pdf_fraction": args.pdf_fraction,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for size in args.sizes.split(","):
+        docs = parse_size(size)
+        print(f"benchmarking {docs} documents...", file=sys.stderr)
+        report["results"].append(run_size(docs, args.work_dir, args.rounds, args.pdf_fraction, args.seed))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Time to first paint of the Streamlit app, in fresh processes.
+
+    python -m benchmarks.startup --rounds 5
+    python -m benchmarks.startup --index-dir .index --output startup.json
+
+Each round starts a new Python process (so every import is cold) that runs
+``app.py`` once through Streamlit's ``AppTest`` with the offline LLM stub and
+reports the session's ``first_paint_ms``: from the first line of the script
+to the board and chat shell being sent. The run also records how long the
+whole first script run took and which heavy modules it imported; openai and
+pypdf should not appear until a question is asked or a PDF has to be
+extracted. Prints percentiles as JSON.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+# Modules whose import is deferred until needed
+HEAVY_MODULES = ("openai", "httpx", "pypdf")
+
+
+def _child() -> None:
+    from streamlit.testing.v1 import AppTest
+
+    started = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    run_ms = (time.perf_counter() - started) * 1000
+    print(json.dumps({
+        "first_paint_ms": at.session_state["first_paint_ms"],
+        "first_run_ms": run_ms,
+        "records": len(at.session_state["records"]),
+        "exceptions": [e.value for e in at.exception],
+        "imported": [m for m in HEAVY_MODULES if m in sys.modules],
+    }))
+
+
+def measure(rounds: int, index_dir: str = None) -> Dict[str, Any]:
+    env = {**os.environ, "APOCRYPHA_LLM_STUB": "1"}
+    if index_dir:
+        env["APOCRYPHA_INDEX_DIR"] = index_dir
+    samples: List[Dict[str, Any]] = []
+    for _ in range(rounds):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child"],
+            capture_output=True, text=True, check=True, env=env, cwd=os.path.dirname(APP),
+        ).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    result: Dict[str, Any] = {"rounds": rounds, "index_dir": index_dir}
+    for key in ("first_paint_ms", "first_run_ms"):
+        values = np.array([s[key] for s in samples])
+        result[key] = {
+            "p50": round(float(np.percentile(values, 50)), 1),
+            "p95": round(float(np.percentile(values, 95)), 1),
+            "min": round(float(values.min()), 1),
+        }
+    result["records_at_first_paint"] = samples[-1]["records"]
+    result["heavy_modules_imported"] = sorted({m for s in samples for m in s["imported"]})
+    result["exceptions"] = sorted({e for s in samples for e in s["exceptions"]})
+    return result
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="fresh processes to time")
+    parser.add_argument("--index-dir", help="measure with this prebuilt index (APOCRYPHA_INDEX_DIR)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child()
+        return 0
+
+    text = json.dumps(measure(args.rounds, args.index_dir), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
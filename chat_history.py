@@ -0,0 +1,131 @@
+"""Chat messages kept in session state: bounded, with document references instead of records.
+
+An answer's documents are stored as ``DocRef``s (record id, path, name, score
+and the best snippet), never as record copies, so a message costs a few hundred
+bytes however large its documents are. ``ChatHistory`` keeps the last
+``APOCRYPHA_HISTORY_MESSAGES`` messages; older ones are folded into a short
+extractive summary (the start of each evicted question and answer), which the
+chat pipeline adds to the system prompt so the model still knows what was
+discussed. ``nbytes`` and ``session_nbytes`` estimate what a session holds.
+"""
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence
+
+from working_set import WorkingSet
+
+# Messages kept before the oldest are summarized and dropped
+MAX_MESSAGES = int(os.environ.get("APOCRYPHA_HISTORY_MESSAGES", "40"))
+# Document references kept per answer
+MAX_REFS = int(os.environ.get("APOCRYPHA_HISTORY_REFS", "20"))
+# Characters kept from each evicted question or answer
+SUMMARY_CHARS = 160
+# The summary drops its oldest lines beyond this
+MAX_SUMMARY_CHARS = 2000
+
+
+class DocRef(NamedTuple):
+    # Record id in the shard's RecordStore; None for plain dict records
+    id: Optional[int]
+    path: str
+    name: str
+    score: float
+    # Best matching window, {"text", "highlights"}; None for explicitly selected documents
+    snippet: Optional[Dict[str, Any]]
+
+
+def doc_refs(docs: Sequence[Mapping[str, Any]], n: int = MAX_REFS) -> List[DocRef]:
+    """References to the first ``n`` of ``docs``, dropping their text, tables and extra snippets."""
+    refs = []
+    for doc in docs[:n]:
+        snippets = doc.get("snippets") or []
+        snippet = {"text": snippets[0]["text"], "highlights": snippets[0]["highlights"]} if snippets else None
+        doc_id = getattr(doc, "id", None)
+        refs.append(DocRef(
+            None if doc_id is None else int(doc_id), doc.get("path", ""), doc.get("name", ""), float(doc.get("score", 0.0)), snippet,
+        ))
+    return refs
+
+
+def _clip(text: str, n: int = SUMMARY_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= n else text[:n - 1] + "…"
+
+
+class ChatHistory:
+    """The chat messages of one session, oldest first, capped at ``max_messages``.
+
+    Messages are dicts with ``role`` and ``content``; answers carry ``refs``
+    (``DocRef``s) and their turn's ``cached``/``timings``/``corrections``.
+    """
+
+    def __init__(self, max_messages: int = MAX_MESSAGES) -> None:
+        self.max_messages = max_messages
+        self.messages: List[Dict[str, Any]] = []
+        # One line per evicted question or answer, oldest first
+        self.summary_lines: List[str] = []
+        self.evicted = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        self.messages.append(message)
+        overflow = len(self.messages) - self.max_messages
+        if overflow > 0:
+            for old in self.messages[:overflow]:
+                self._summarize(old)
+            del self.messages[:overflow]
+            self.evicted += overflow
+
+    def _summarize(self, message: Dict[str, Any]) -> None:
+        # System notices ("Added X to context") are not worth keeping
+        if message["role"] == "user":
+            self.summary_lines.append(f"User asked: {_clip(message['content'])}")
+        elif message["role"] == "assistant":
+            files = ", ".join(ref.name for ref in message.get("refs", [])[:3])
+            self.summary_lines.append(f"You answered: {_clip(message['content'])}" + (f" (from {files})" if files else ""))
+        while self.summary_lines and sum(len(line) + 1 for line in self.summary_lines) > MAX_SUMMARY_CHARS:
+            self.summary_lines.pop(0)
+
+    @property
+    def summary(self) -> str:
+        """What was said in the evicted messages, for the system prompt; empty until something is evicted."""
+        return "\n".join(self.summary_lines)
+
+    def for_model(self) -> List[Dict[str, str]]:
+        """User and assistant messages as ``{"role", "content"}`` for the chat completion request."""
+        return [{"role": m["role"], "content": m["content"]} for m in self.messages if m["role"] != "system"]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the messages and the summary."""
+        return deep_sizeof(self.messages) + deep_sizeof(self.summary_lines)
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """``sys.getsizeof`` of ``obj`` plus everything reachable through builtin containers.
+
+    Other objects (record stores, futures, shards) count only their own shallow
+    size, since they are shared between sessions or owned elsewhere.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, (ChatHistory, WorkingSet)):
+        size += obj.nbytes()
+    return size
+
+
+def session_nbytes(state: Mapping[str, Any]) -> Dict[str, int]:
+    """Approximate bytes per session-state key, largest first."""
+    sizes = {key: deep_sizeof(value) for key, value in state.items()}
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
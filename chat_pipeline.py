@@ -0,0 +1,343 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import perf
+from answer_cache import AnswerCache, conversation_fingerprint
+from document_search import correct_query, extract_node_ids_from_paths, facets_by_node, search_facets
+from tables import is_numeric_question, summarize_for_question
+
+Record = Mapping[str, Any]
+
+SYSTEM_PROMPT = "You are a Apocrypha, a document intelligence agent. You have access to the company's file system. Answer based on the user context and documents."
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Search hits above this score are sent to the model and highlighted on the board
+HIGH_RELEVANCE_SCORE = 25.0
+# Matching windows sent to the model per search hit, instead of the whole document
+PROMPT_SNIPPETS = 3
+# Latest chat messages sent with each prompt
+HISTORY_MESSAGES = 5
+
+
+@dataclass
+class ChatRequest:
+    """Everything one chat turn needs, captured on the script thread before the pipeline starts."""
+    prompt: str
+    model: str
+    records: Sequence[Record]
+    # Chat messages for the model, ending with this turn's prompt
+    history: List[Dict[str, str]]
+    industry: str
+    industry_filter: Optional[str] = None
+    # One (expected path segment, file names) pair per selected context node
+    context: List[Tuple[Optional[str], List[str]]] = field(default_factory=list)
+    context_node_ids: List[str] = field(default_factory=list)
+    tables: Mapping[int, list] = field(default_factory=dict)
+    # When set (a search_server.SearchClient), retrieval goes to the shared search server
+    # for ``shard`` instead of scanning ``records`` in this process
+    search_client: Optional[Any] = None
+    shard: Optional[str] = None
+    # Summary of the messages evicted from the session's chat history
+    summary: str = ""
+    # The conversation's working set (a working_set.WorkingSet); follow-ups are answered from it when it covers them
+    working_set: Optional[Any] = None
+
+
+@dataclass
+class ChatResult:
+    answer: str
+    relevant_docs: List[Record]
+    highlights: List[str]
+    cached: bool
+    # Milliseconds per stage; stages that ran concurrently overlap
+    timings: Dict[str, float]
+    # Misspelled prompt words and the index terms searched for instead
+    corrections: Dict[str, str] = field(default_factory=dict)
+    # Board node id -> number of high-relevance hits under it
+    facets: Dict[str, int] = field(default_factory=dict)
+    # perf turn id whose spans cover this result
+    turn: Optional[int] = None
+    # Documents came from the conversation's working set, not a search
+    reused: bool = False
+
+
+@perf.traced()
+def resolve_context_docs(records: Sequence[Record], context: List[Tuple[Optional[str], List[str]]]) -> List[Record]:
+    """Look up the records for files of explicitly selected board nodes, scored 100.
+
+    File entries are paths relative to the node's folder, so nested files of a
+    group or department node resolve to the right record.
+    """
+    all_context_files = []
+    for expected_path_segment, files in context:
+        for f in files:
+            # Find the full record whose path ends with the node's folder plus this file
+            suffix = os.sep + (os.path.join(expected_path_segment, f) if expected_path_segment else f)
+            for r in records:
+                if r["path"].endswith(suffix):
+                    all_context_files.append(r)
+                    break
+
+    # Deduplicate based on path
+    seen_paths = set()
+    unique_docs = []
+    for d in all_context_files:
+        if d["path"] not in seen_paths:
+            seen_paths.add(d["path"])
+            # Assign a high artificial score since user explicitly selected it
+            d_copy = d.copy()
+            d_copy["score"] = 100.0
+            unique_docs.append(d_copy)
+    return unique_docs
+
+
+class Retrieval(NamedTuple):
+    docs: List[Record]
+    corrections: Dict[str, str]
+    facets: Dict[str, int]
+    reused: bool = False
+
+
+def retrieve(request: ChatRequest) -> Retrieval:
+    """Context files when nodes are selected, otherwise the high-relevance search hits.
+
+    Search prompts are spell-corrected against the index first. A follow-up
+    that the conversation's working set covers is answered from its passages
+    without searching; numeric questions about shards with tables always
+    search, since reused passages carry no table data. The same search pass
+    counts high-relevance hits per board node for the badges.
+    """
+    if request.context:
+        if request.search_client is not None:
+            return Retrieval(request.search_client.resolve(request.context, shard=request.shard), {}, {})
+        return Retrieval(resolve_context_docs(request.records, request.context), {}, {})
+    if request.search_client is not None:
+        query, corrections = request.search_client.correct(request.prompt, shard=request.shard)
+    else:
+        query, corrections = correct_query(request.prompt, request.records)
+
+    working_set = request.working_set
+    if working_set is not None and not (request.tables and is_numeric_question(request.prompt)):
+        with perf.span("working_set"):
+            docs = working_set.match(query, request.records, request.shard, PROMPT_SNIPPETS)
+        if docs is not None:
+            return Retrieval(docs, corrections, dict(working_set.facets), reused=True)
+
+    if request.search_client is not None:
+        docs, folders = request.search_client.search_facets(
+            query, shard=request.shard, k=50, with_text=True, snippets=PROMPT_SNIPPETS, min_score=HIGH_RELEVANCE_SCORE,
+        )
+    else:
+        docs, folders = search_facets(
+            [query], request.records, k=50, industry_filter=request.industry_filter, snippets=PROMPT_SNIPPETS,
+            min_score=HIGH_RELEVANCE_SCORE,
+        )[0]
+    docs = [d for d in docs if d.get("score", 0) > HIGH_RELEVANCE_SCORE]
+    facets = facets_by_node(folders)
+    if working_set is not None:
+        working_set.add(docs, facets, request.shard, len(request.records))
+    return Retrieval(docs, corrections, facets)
+
+
+def highlight_nodes(request: ChatRequest, docs: List[Record]) -> List[str]:
+    # With context selected, only the chosen nodes light up; deriving from paths can hit wrong groups
+    if request.context:
+        return list(request.context_node_ids)
+    return extract_node_ids_from_paths([d["path"] for d in docs], industry=request.industry)
+
+
+def doc_prompt_block(doc: Record, prompt: str, tables: Mapping[int, list], numeric: bool) -> str:
+    """Render one document for the system prompt.
+
+    Tables get computed aggregates instead of raw rows, and search hits send only
+    their matching snippets; explicitly selected documents are sent whole.
+    """
+    doc_tables = tables.get(doc.id) if numeric and hasattr(doc, "id") else None
+    if doc_tables:
+        computed = "\n".join(summarize_for_question(t, prompt) for t in doc_tables)
+        return f"File: {doc['path']}\nComputed from table:\n{computed}\n---"
+    snippets = doc.get("snippets")
+    if snippets:
+        excerpts = "\n[...]\n".join(s["text"] for s in snippets)
+        return f"File: {doc['path']}\nExcerpts:\n{excerpts}\n---"
+    return f"File: {doc['path']}\nContent:\n{doc.get('text', '')}\n---"
+
+
+@perf.traced()
+def build_system_prompt(request: ChatRequest, docs: List[Record]) -> str:
+    sys_prompt = SYSTEM_PROMPT
+    if request.summary:
+        sys_prompt += f"\n\nEarlier in this conversation:\n{request.summary}"
+    if docs:
+        numeric = is_numeric_question(request.prompt)
+        doc_context = "\n".join(doc_prompt_block(d, request.prompt, request.tables, numeric) for d in docs)
+        sys_prompt += f"\n\nRelevant Document Excerpts:\n{doc_context}"
+    return sys_prompt
+
+
+async def run_chat_pipeline(
+    request: ChatRequest,
+    client: Any,
+    cache: Optional[AnswerCache] = None,
+    semantic: bool = False,
+) -> ChatResult:
+    """Run one chat turn, overlapping stages that do not depend on each other.
+
+    The prompt embedding (for the semantic cache) is fetched while retrieval runs;
+    once documents are known, board highlights, the answer-cache lookup and prompt
+    assembly run together, and the model is only called on a cache miss.
+    ``client`` is an ``AsyncOpenAI``-compatible object. Cancelling the task
+    cancels whichever awaits are in flight, including the model request.
+    Every stage is recorded as a ``perf`` span under one turn.
+    """
+    with perf.turn(request.prompt) as turn_id:
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        async def timed(name: str, awaitable: Awaitable):
+            t0 = time.perf_counter()
+            try:
+                with perf.span(name):
+                    return await awaitable
+            finally:
+                timings[name] = (time.perf_counter() - t0) * 1000
+
+        def in_thread(fn: Callable, *args) -> Awaitable:
+            return asyncio.to_thread(fn, *args)
+
+        tasks: List[asyncio.Task] = []
+        embed_task = None
+        if semantic and cache is not None:
+            embed_task = asyncio.create_task(timed("embed", _embed(client, request.prompt)))
+            tasks.append(embed_task)
+
+        try:
+            docs, corrections, facets, reused = await timed("retrieve", in_thread(retrieve, request))
+
+            highlight_task = asyncio.create_task(timed("highlights", in_thread(highlight_nodes, request, docs)))
+            prompt_task = asyncio.create_task(timed("prompt", in_thread(build_system_prompt, request, docs)))
+            tasks += [highlight_task, prompt_task]
+            history = request.history[-HISTORY_MESSAGES:]
+            # Cached answers are only reused for the same earlier messages and summary. The last
+            # message is this prompt, which the cache key normalizes and the semantic lookup compares.
+            conversation = conversation_fingerprint(history[:-1], request.summary)
+            answer = None
+            if cache is not None:
+                answer = await timed("cache", in_thread(cache.get, request.model, request.prompt, docs, None, conversation))
+                if answer is None and embed_task is not None:
+                    embedding = await embed_task
+                    if embedding is not None:
+                        answer = await in_thread(cache.get, request.model, request.prompt, docs, embedding, conversation)
+            cached = answer is not None
+
+            if not cached:
+                sys_prompt = await prompt_task
+                response = await timed("llm", client.chat.completions.create(
+                    model=request.model,
+                    messages=[{"role": "system", "content": sys_prompt}] + history,
+                    stream=False,
+                ))
+                answer = response.choices[0].message.content
+                if answer and cache is not None:
+                    embedding = embed_task.result() if embed_task is not None and embed_task.done() else None
+                    await in_thread(cache.put, request.model, request.prompt, docs, answer, embedding, conversation)
+            else:
+                prompt_task.cancel()
+                # An exact hit does not need the embedding; stop the request instead of leaving it running
+                if embed_task is not None:
+                    embed_task.cancel()
+
+            highlights = await highlight_task
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        timings["total"] = (time.perf_counter() - started) * 1000
+        return ChatResult(
+            answer=answer or "", relevant_docs=docs, highlights=highlights, cached=cached, timings=timings,
+            corrections=corrections, facets=facets, turn=turn_id, reused=reused,
+        )
+
+
+async def _embed(client: Any, text: str) -> Optional[List[float]]:
+    try:
+        response = await client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+    except Exception:
+        return None
+
+
+class PipelineRunner:
+    """Owns an asyncio event loop on a daemon thread and runs pipelines on it.
+
+    ``submit`` returns a ``concurrent.futures.Future`` the Streamlit script can
+    wait on; calling ``cancel()`` on it cancels the underlying task.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="chat-pipeline", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_runner: Optional[PipelineRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> PipelineRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = PipelineRunner()
+        return _runner
+
+
+def format_timings(timings: Mapping[str, float]) -> str:
+    order = ["retrieve", "embed", "highlights", "cache", "prompt", "llm", "total"]
+    parts = [f"{name} {timings[name]:.0f} ms" for name in order if name in timings]
+    return " · ".join(parts)
+
+
+class _StubResponse:
+    def __init__(self, **kwargs: Any) -> None:
+        self.__dict__.update(kwargs)
+
+
+class StubChatClient:
+    """Offline stand-in for ``AsyncOpenAI`` used when APOCRYPHA_LLM_STUB is set.
+
+    Echoes what it was given after a configurable delay, so the pipeline, caching
+    and cancellation can be exercised without an API key or network access.
+    """
+
+    def __init__(self, delay: float = 0.2) -> None:
+        self.delay = delay
+        self.chat = _StubResponse(completions=_StubResponse(create=self._complete))
+        self.embeddings = _StubResponse(create=self._embed)
+
+    async def _complete(self, model: str, messages: List[Dict[str, str]], **_: Any):
+        await asyncio.sleep(self.delay)
+        question = messages[-1]["content"] if messages else ""
+        content = (
+            f"[stub {model}] {question!r} answered with a {len(messages[0]['content'])}-character "
+            f"system prompt and {len(messages) - 1} history messages."
+        )
+        message = _StubResponse(role="assistant", content=content)
+        return _StubResponse(choices=[_StubResponse(message=message)])
+
+    async def _embed(self, model: str, input: str, **_: Any):
+        await asyncio.sleep(self.delay / 4)
+        # Bag-of-letters vector: enough for near-duplicate prompts to land close together
+        vec = [0.0] * 26
+        for ch in input.lower():
+            if "a" <= ch <= "z":
+                vec[ord(ch) - 97] += 1.0
+        return _StubResponse(data=[_StubResponse(embedding=vec)])
@@ -0,0 +1,164 @@
+"""Command-line tools for the document index.
+
+    python cli.py search "west expenses" "patent filings"
+    python cli.py search --file queries.txt -k 10 --industry Legal_Firm > results.jsonl
+    python cli.py search --fuzzy "megacrop aquisition"
+    python cli.py search --file queries.txt --trace trace.json
+    python cli.py profile --root sample_data/Legal_Firm --cold --cprofile --tracemalloc "smith settlement"
+    python cli.py build-index --root sample_data --out .index
+    python cli.py verify-index .index --full --source
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from typing import List
+
+import index_artifact
+import perf
+import profiling
+from document_search import correct_query, scan_dummy_data, search_files, search_many
+from extraction_cache import ExtractionCache
+
+
+def _read_queries(args: argparse.Namespace) -> List[str]:
+    queries = list(args.queries)
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")) as f:
+            queries += [line.rstrip("\n") for line in f if line.strip()]
+    return queries
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    queries = _read_queries(args)
+    if not queries:
+        print("no queries given", file=sys.stderr)
+        return 2
+    started = time.perf_counter()
+    records = scan_dummy_data(root=args.root)
+    indexed = time.perf_counter()
+    corrections = [{}] * len(queries)
+    if args.fuzzy:
+        queries, corrections = map(list, zip(*(correct_query(q, records) for q in queries)))
+    results = search_many(queries, records, k=args.k, industry_filter=args.industry)
+    searched = time.perf_counter()
+    for query, fixed, hits in zip(queries, corrections, results):
+        row = {"query": query, "results": [{"path": h["path"], "score": h["score"]} for h in hits]}
+        if fixed:
+            row["corrections"] = fixed
+        print(json.dumps(row))
+    print(
+        f"{len(queries)} queries over {len(records)} files: index {indexed - started:.2f}s, "
+        f"search {searched - indexed:.2f}s",
+        file=sys.stderr,
+    )
+    if args.trace:
+        count = perf.export_chrome_trace(args.trace)
+        print(f"wrote {count} spans to {args.trace}", file=sys.stderr)
+    return 0
+
+
+def cmd_profile(args: argparse.Namespace) -> int:
+    queries = _read_queries(args)
+    with tempfile.TemporaryDirectory(prefix="apocrypha-profile-") as cold_cache:
+        # A throwaway extraction cache makes every file extract, so its real cost shows
+        cache = ExtractionCache(cold_cache) if args.cold else None
+        index = profiling.IndexProfile()
+        stages = {}
+        with profiling.Profiler(cpu=args.cprofile, memory=args.tracemalloc) as profiler:
+            records = scan_dummy_data(root=args.root, cache=cache, profile=index)
+            for query in queries:
+                started = time.perf_counter()
+                search_files(query, records, k=args.k, industry_filter=args.industry)
+                stages[query] = profiling.query_stages([s for s in perf.spans() if s.start >= started])
+    if args.prof_output:
+        profiler.dump(args.prof_output)
+    result = profiling.report(index, stages if queries else None, profiler, n=args.top)
+    print(profiling.format_report(result, n=args.top), file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result))
+    return 0
+
+
+def cmd_build_index(args: argparse.Namespace) -> int:
+    manifest = index_artifact.build(
+        args.root, args.out, workers=args.workers, vectors=args.vectors, keep=args.keep,
+    )
+    docs = sum(shard["docs"] for shard in manifest["shards"].values())
+    size = sum(f["bytes"] for f in manifest["files"].values())
+    print(
+        f"built {manifest['build']}: {docs} files in {len(manifest['shards'])} shards, "
+        f"{size / 1e6:.1f} MB, {manifest['build_seconds']:.2f}s",
+        file=sys.stderr,
+    )
+    print(json.dumps({key: manifest[key] for key in ("build", "root", "source", "shards", "checksum")}))
+    return 0
+
+
+def cmd_verify_index(args: argparse.Namespace) -> int:
+    build_dir = index_artifact.resolve(args.path)
+    try:
+        manifest = index_artifact.verify_build(build_dir, full=args.full)
+    except index_artifact.ArtifactError as e:
+        print(f"invalid: {e}", file=sys.stderr)
+        return 1
+    print(f"ok: {build_dir} ({manifest['built_at']}, checksum {manifest['checksum'][:12]})", file=sys.stderr)
+    if args.source and index_artifact.source_changed(manifest):
+        print(f"stale: files under {manifest['root']} changed since the build", file=sys.stderr)
+        return 3
+    return 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    search = sub.add_parser("search", help="run a batch of queries and print one JSON line per query")
+    search.add_argument("queries", nargs="*", help="queries to run")
+    search.add_argument("--file", help="read one query per line from this file ('-' for stdin)")
+    search.add_argument("--root", default="sample_data", help="folder to index")
+    search.add_argument("-k", type=int, default=50, help="results per query")
+    search.add_argument("--industry", help="only search paths containing this folder, e.g. Legal_Firm")
+    search.add_argument("--fuzzy", action="store_true", help="spell-correct queries against the index first")
+    search.add_argument("--trace", help="write timing spans as a Chrome trace (chrome://tracing, Perfetto) to this file")
+    search.set_defaults(func=cmd_search)
+
+    profile = sub.add_parser("profile", help="index a folder (and run queries), reporting the slowest files and stages")
+    profile.add_argument("queries", nargs="*", help="queries to run after indexing")
+    profile.add_argument("--file", help="read one query per line from this file ('-' for stdin)")
+    profile.add_argument("--root", default="sample_data", help="folder to index")
+    profile.add_argument("-k", type=int, default=50, help="results per query")
+    profile.add_argument("--industry", help="only search paths containing this folder, e.g. Legal_Firm")
+    profile.add_argument("--cold", action="store_true", help="extract every file, bypassing the extraction cache")
+    profile.add_argument("--cprofile", action="store_true", help="run under cProfile and list functions by own time")
+    profile.add_argument("--tracemalloc", action="store_true",
+                         help="trace allocations and list the biggest sites (slows extraction several times)")
+    profile.add_argument("--prof-output", help="also write raw cProfile data here (snakeviz, pstats)")
+    profile.add_argument("--top", type=int, default=profiling.TOP_N, help="rows per report section")
+    profile.add_argument("--output", help="write the JSON report here instead of stdout")
+    profile.set_defaults(func=cmd_profile)
+
+    build = sub.add_parser("build-index", help="build every shard's index into a versioned artifact for the app to load")
+    build.add_argument("--root", default="sample_data", help="folder to index; each subfolder is a shard")
+    build.add_argument("--out", default=".index", help="artifact directory (builds are kept side by side)")
+    build.add_argument("--workers", type=int, help="extraction processes (default: all CPUs)")
+    build.add_argument("--vectors", action="store_true", help="also store hashed TF-IDF vectors for the vector ranker")
+    build.add_argument("--keep", type=int, default=index_artifact.KEEP_BUILDS, help="builds to keep, newest first")
+    build.set_defaults(func=cmd_build_index)
+
+    verify = sub.add_parser("verify-index", help="check an index artifact against its manifest")
+    verify.add_argument("path", nargs="?", default=".index", help="artifact directory or one build inside it")
+    verify.add_argument("--full", action="store_true", help="re-hash every file instead of checking sizes")
+    verify.add_argument("--source", action="store_true", help="also report whether the source files changed (walks the tree)")
+    verify.set_defaults(func=cmd_verify_index)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
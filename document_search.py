@@ -1,202 +1,425 @@
+import codecs
+import itertools
 import os
-from typing import List, Dict, Tuple
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from typing import Iterator, List, Dict, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
 
-import streamlit as st
-from pypdf import PdfReader
+import numpy as np
 
-Record = Dict[str, str]
+import perf
+from extraction_cache import ExtractionCache, file_digest, get_extraction_cache
+from extractors import get_extractor, register_extractor, split_sheets
+from folder_index import FolderIndex
+from profiling import IndexProfile
+from record_store import RecordSnapshot, RecordStore, RecordView
+from spelling import MIN_WORD_LENGTH, SpellIndex, max_distance_for
+from tables import OPERATIONS, Table, describe_tables
+from text_store import TextStore
+from token_index import TokenIndex, query_terms, tokenize
 
+Record = Mapping[str, str]
 
-def scan_dummy_data(root: str = "sample_data") -> List[Record]:
+# Formats whose parsing costs more than hashing the file; these go through the extraction cache
+CACHED_EXTS = {"pdf", "docx", "xlsx", "pptx"}
+
+# Per-file extraction caps; text beyond these is dropped from the index
+MAX_PDF_PAGES = int(os.environ.get("APOCRYPHA_MAX_PDF_PAGES", "500"))
+MAX_EXTRACT_BYTES = int(os.environ.get("APOCRYPHA_MAX_EXTRACT_MB", "8")) * 1024 * 1024
+# Part of every extraction cache key: text cut off under one cap must not be served under another
+EXTRACT_LIMITS = f"p{MAX_PDF_PAGES}-b{MAX_EXTRACT_BYTES}"
+_READ_CHUNK = 64 * 1024
+# Files handed to an extraction worker process at a time
+EXTRACT_CHUNK = 16
+# Chunks in flight per worker process; bounds the extracted text waiting to be appended
+EXTRACT_WINDOW = 2
+
+
+@perf.traced()
+def scan_dummy_data(
+    root: str = "sample_data",
+    cache: Optional[ExtractionCache] = None,
+    text_path: Optional[str] = None,
+    profile: Optional[IndexProfile] = None,
+    workers: int = 1,
+) -> RecordStore:
     """Scan a folder of sample files and build a simple in-memory index.
 
-    Each record contains: path, name, ext, text (best-effort content or filename).
+    Each record contains: path, name, ext, version (size and mtime, used to
+    invalidate cached answers), text (best-effort content or filename).
+    CSV and XLSX files are also parsed into typed tables (``records.tables``, a list
+    per record id) for numeric questions.
+    Records are held column-wise in a RecordStore and read through dict-like views;
+    text goes to a memory-mapped TextStore, written to ``text_path`` when given so
+    other processes can map the same file, otherwise to an anonymous temp file.
+    Pass a ``profiling.IndexProfile`` as ``profile`` to record per-file costs, and
+    ``workers`` > 1 to extract files in that many processes.
     """
-    records: List[Record] = []
+    records = RecordStore(TextStore(text_path))
     if not os.path.isdir(root):
         return records
-    for dirpath, _, filenames in os.walk(root):
-        for fname in filenames:
-            path = os.path.join(dirpath, fname)
-            ext = os.path.splitext(fname)[1].lower().strip(".")
-            text = _read_best_effort(path, ext)
-            records.append({
-                "path": path,
-                "name": fname,
-                "ext": ext,
-                "text": text or fname,
-            })
+    if cache is None:
+        cache = get_extraction_cache()
+    for _ in index_files(records, list_files(root), cache, profile, workers):
+        pass
+    records.texts.seal()
+    cache.evict()
     return records
 
 
-def _read_best_effort(path: str, ext: str) -> str:
+def list_files(root: str) -> List[str]:
+    """All file paths under ``root``, in walk order."""
+    return [os.path.join(dirpath, fname) for dirpath, _, filenames in os.walk(root) for fname in filenames]
+
+
+class Extracted(NamedTuple):
+    """One file's index input, as produced by ``extract_file``."""
+    path: str
+    name: str
+    ext: str
+    size: int
+    version: str
+    text: str
+    tables: List[Table]
+    # Pieces the extractor produced; None when the extraction cache served the text
+    pages: Optional[int]
+    cached: bool
+    seconds: float
+
+
+def extract_file(path: str, cache: ExtractionCache) -> Extracted:
+    """Read one file's text, version and tables. Touches nothing shared, so it can run in a worker process."""
+    started = time.perf_counter()
+    fname = os.path.basename(path)
+    ext = os.path.splitext(fname)[1].lower().strip(".")
+    stats: Dict = {}
+    text = _read_cached(path, ext, cache, stats)
+    try:
+        stat = os.stat(path)
+        size = stat.st_size
+        version = f"{stat.st_size}-{int(stat.st_mtime)}"
+    except OSError:
+        size, version = 0, ""
+    tables = _parse_tables(text, ext, fname)
+    if ext == "xlsx":
+        # Spreadsheet rows live in the tables; the record text only describes them
+        text = describe_tables(tables)
+    return Extracted(
+        path, fname, ext, size, version, text or fname, tables,
+        stats.get("pages"), stats.get("cached", False), time.perf_counter() - started,
+    )
+
+
+def extract_chunk(paths: Sequence[str], cache: ExtractionCache) -> List[Extracted]:
+    return [extract_file(path, cache) for path in paths]
+
+
+def _extract_in_pool(pool: ProcessPoolExecutor, paths: Sequence[str], cache: ExtractionCache, workers: int) -> Iterator[Extracted]:
+    """``extract_file`` over ``paths`` in ``pool``, in order, with at most ``EXTRACT_WINDOW`` chunks per worker in flight."""
+    chunks = (paths[i:i + EXTRACT_CHUNK] for i in range(0, len(paths), EXTRACT_CHUNK))
+    pending = deque(pool.submit(extract_chunk, chunk, cache) for chunk in itertools.islice(chunks, EXTRACT_WINDOW * workers))
+    while pending:
+        done = pending.popleft().result()
+        for chunk in itertools.islice(chunks, 1):
+            pending.append(pool.submit(extract_chunk, chunk, cache))
+        yield from done
+
+
+def index_files(
+    records: RecordStore,
+    paths: Sequence[str],
+    cache: ExtractionCache,
+    profile: Optional[IndexProfile] = None,
+    workers: int = 1,
+) -> Iterator[Tuple[str, int]]:
+    """Extract and append each file to ``records``, yielding (path, size in bytes) after each one.
+
+    With ``workers`` > 1, files are extracted in that many processes while this
+    thread appends the results in ``paths`` order, so the index is identical to
+    a serial build. Only a few chunks per worker are extracted ahead of the
+    appends, so memory stays flat on large corpora. With a
+    ``profiling.IndexProfile``, each file's extraction and indexing time, pages
+    and bytes are added to it.
+    """
+    pool = None
+    if workers > 1 and len(paths) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        docs = _extract_in_pool(pool, paths, cache, workers)
+    else:
+        docs = (extract_file(path, cache) for path in paths)
+    try:
+        for doc in docs:
+            started = time.perf_counter()
+            record_id = records.append(doc.path, doc.name, doc.ext, doc.version, doc.text)
+            if doc.tables:
+                records.tables[record_id] = doc.tables
+            if profile is not None:
+                profile.add(
+                    doc.path, doc.ext, doc.size, doc.pages, len(doc.text), doc.seconds,
+                    time.perf_counter() - started, doc.cached,
+                )
+            yield doc.path, doc.size
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def _parse_tables(text: str, ext: str, name: str) -> List[Table]:
+    if not text:
+        return []
+    if ext == "csv":
+        tables = [Table.from_csv(text, name=name)]
+    elif ext == "xlsx":
+        tables = [Table.from_csv(body, name=f"{name}:{sheet}") for sheet, body in split_sheets(text)]
+    else:
+        return []
+    return [t for t in tables if t is not None]
+
+
+def _read_cached(path: str, ext: str, cache: ExtractionCache, stats: Optional[Dict] = None) -> str:
+    """Extract text once per distinct file content; identical copies elsewhere hit the cache.
+
+    ``stats``, when given, gets ``cached`` and (for extracted files) ``pages``.
+    """
+    if ext not in CACHED_EXTS:
+        return _read_best_effort(path, ext, stats) or ""
     try:
-        if ext in {"txt", "md", "csv"}:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
-        elif ext == "pdf":
-            try:
-                reader = PdfReader(path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
-            except Exception:
-                return ""
-        # Binary or complex formats: just return empty; we will search on filename
+        digest = file_digest(path)
+    except OSError:
         return ""
+    text = cache.get(digest, ext, EXTRACT_LIMITS)
+    if text is None:
+        text = _read_best_effort(path, ext, stats)
+        if text is None:
+            # Not cached, so a transient failure is retried on the next scan instead of sticking as ""
+            return ""
+        cache.put(digest, ext, text, EXTRACT_LIMITS)
+    elif stats is not None:
+        stats["cached"] = True
+    return text
+
+
+def _read_best_effort(path: str, ext: str, stats: Optional[Dict] = None) -> Optional[str]:
+    """The file's extracted text, or None if the extractor raised (unreadable, corrupt, locked)."""
+    try:
+        parts = list(iter_document_text(path, ext))
+        if stats is not None:
+            # PDF pages; slides, sheets or paragraphs for Office files; 64 KB chunks for text
+            stats["pages"] = len(parts)
+        text = "".join(parts)
+        return text.strip() if ext == "pdf" else text
     except Exception:
-        return ""
+        return None
 
 
-def search_files(
-    query: str,
-    records: List[Record],
-    k: int = 50,
-    context_folders: List[str] = None,
-    industry_filter: str = None,
-) -> List[Record]:
-    """Improved keyword search with context filtering and better scoring.
-    
-    Args:
-        query: Search query string
-        records: List of document records
-        k: Maximum number of results
-        context_folders: Optional list of folders to restrict search to
-        industry_filter: Optional industry folder to filter by (e.g., "Restaurant_Franchise" or "Legal_Firm")
+def iter_document_text(
+    path: str,
+    ext: str,
+    max_pages: int = MAX_PDF_PAGES,
+    max_bytes: int = MAX_EXTRACT_BYTES,
+) -> Iterator[str]:
+    """Yield a document's text incrementally through the extractor registered for ``ext``.
+
+    PDFs come one page at a time, plain text in fixed-size chunks, Office files per
+    paragraph, slide or sheet. Output stops once max_pages pages or max_bytes bytes
+    of text have been produced, so a single oversized file cannot dominate memory.
     """
-    if not query:
-        return []
-    
+    extractor = get_extractor(ext)
+    # Binary or unknown formats: yield nothing; we will search on filename
+    if extractor is not None:
+        yield from extractor(path, max_pages, max_bytes)
+
+
+@register_extractor("txt", "md", "csv")
+def iter_plain_text(path: str, max_pages: int = MAX_PDF_PAGES, max_bytes: int = MAX_EXTRACT_BYTES) -> Iterator[str]:
+    """Yield a text file in 64 KB chunks, decoding UTF-8 incrementally."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    remaining = max_bytes
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(_READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield decoder.decode(chunk)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+@register_extractor("pdf")
+def iter_pdf_pages(path: str, max_pages: int = MAX_PDF_PAGES, max_bytes: int = MAX_EXTRACT_BYTES) -> Iterator[str]:
+    """Yield the text of each PDF page (newline-terminated) without building the whole document.
+
+    Pages that fail to extract are skipped rather than discarding the document.
+    """
+    # Imported on first use: a warm extraction cache or a prebuilt index never needs pypdf
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    emitted = 0
+    for page_no, page in enumerate(reader.pages):
+        if page_no >= max_pages:
+            break
+        try:
+            text = (page.extract_text() or "") + "\n"
+        except Exception:
+            continue
+        size = len(text.encode("utf-8"))
+        if emitted + size > max_bytes:
+            # Keep the part of the page that still fits, then stop
+            text = text.encode("utf-8")[: max_bytes - emitted].decode("utf-8", errors="ignore")
+            if text:
+                yield text
+            break
+        emitted += size
+        yield text
+
+
+# Query intent keywords; matching queries boost files under the corresponding folders
+LOCATIONS = {"west": "west", "central": "central", "east": "east"}
+FNB_CATEGORIES = {
+    "accounting": "accounting",
+    "expense": "expenses",
+    "expenses": "expenses",
+    "legal": "legal",
+    "permit": "permits",
+    "permits": "permits",
+    "financial": "accounting",
+    "finance": "accounting",
+    "payroll": "accounting",
+    "tax": "accounting",
+}
+
+# Legal firm keywords
+LEGAL_PRACTICE_AREAS = {
+    "corporate": "corporate_law",
+    "m&a": "corporate_law",
+    "merger": "corporate_law",
+    "acquisition": "corporate_law",
+    "ipo": "corporate_law",
+    "litigation": "litigation",
+    "lawsuit": "litigation",
+    "dispute": "litigation",
+    "court": "litigation",
+    "real estate": "real_estate",
+    "property": "real_estate",
+    "lease": "real_estate",
+    "zoning": "real_estate",
+    "ip": "intellectual_property",
+    "intellectual property": "intellectual_property",
+    "patent": "intellectual_property",
+    "trademark": "intellectual_property",
+    "copyright": "intellectual_property",
+    "employment": "employment_law",
+    "compensation": "employment_law",
+    "workplace": "employment_law",
+    "hr": "employment_law",
+    "investigation": "employment_law",
+}
+
+# Legal matter keywords
+LEGAL_MATTERS = {
+    "techcorp": "techcorp_acquisition",
+    "globalretail": "globalretail_ipo",
+    "smith": "smith_v_megacorp",
+    "megacorp": "smith_v_megacorp",
+    "abc": "contractdispute",
+    "xyz": "contractdispute",
+    "contract dispute": "contractdispute",
+    "tower": "downtown_tower",
+    "downtown": "downtown_tower",
+    "office lease": "office_lease",
+    "biotech": "patent_portfolio_biotech",
+    "patent portfolio": "patent_portfolio",
+    "trademark dispute": "trademark_dispute",
+    "fashion": "trademark_dispute_fashion",
+    "executive": "executive_compensation",
+    "compensation review": "executive_compensation",
+    "workplace investigation": "workplace_investigation",
+}
+
+# Finance firm keywords
+FINANCE_DEPARTMENTS = {
+    "equity": "equity_research",
+    "research": "equity_research",
+    "stock": "equity_research",
+    "analyst": "equity_research",
+    "fixed income": "fixed_income",
+    "bond": "fixed_income",
+    "bonds": "fixed_income",
+    "credit": "fixed_income",
+    "yield": "fixed_income",
+    "portfolio": "portfolio_management",
+    "fund": "portfolio_management",
+    "asset": "portfolio_management",
+    "risk": "risk_management",
+    "var": "risk_management",
+    "stress test": "risk_management",
+    "trading": "trading",
+    "execution": "trading",
+    "market making": "trading",
+}
+
+FINANCE_AREAS = {
+    "tech sector": "tech_sector_analysis",
+    "technology": "tech_sector_analysis",
+    "apple": "tech_sector_analysis",
+    "microsoft": "tech_sector_analysis",
+    "nvidia": "tech_sector_analysis",
+    "healthcare": "healthcare_sector_analysis",
+    "pharma": "healthcare_sector_analysis",
+    "biotech": "healthcare_sector_analysis",
+    "glp": "healthcare_sector_analysis",
+    "investment grade": "investment_grade",
+    "ig": "investment_grade",
+    "corporate bond": "investment_grade",
+    "high yield": "high_yield",
+    "hy": "high_yield",
+    "junk": "high_yield",
+    "distressed": "high_yield",
+    "growth fund": "growth_fund",
+    "growth": "growth_fund",
+    "value fund": "value_fund",
+    "value": "value_fund",
+    "dividend": "value_fund",
+    "market risk": "market_risk",
+    "stress": "market_risk",
+    "factor": "market_risk",
+    "credit risk": "credit_risk",
+    "counterparty": "credit_risk",
+    "default": "credit_risk",
+    "execution": "execution_analytics",
+    "tca": "execution_analytics",
+    "broker": "execution_analytics",
+    "market making": "market_making",
+    "options": "market_making",
+    "volatility": "market_making",
+    "greeks": "market_making",
+}
+
+TIME_INDICATORS = ["q1", "q2", "q3", "q4", "march", "april", "may", "2023", "2024", "2025"]
+
+
+class QueryIntent(NamedTuple):
+    """A lowercased query, its words and the folder each keyword map points it at (if any)."""
+    q: str
+    words: Set[str]
+    location: Optional[str]
+    category: Optional[str]
+    practice_area: Optional[str]
+    matter: Optional[str]
+    finance_dept: Optional[str]
+    finance_area: Optional[str]
+
+
+def parse_query(query: str) -> QueryIntent:
     q = query.lower()
     query_words = set(q.split())
     
-    # First, filter by industry if specified
-    if industry_filter:
-        records = [r for r in records if industry_filter in r.get("path", "")]
-    
-    # Extract location and category from query (for F&B)
-    locations = {"west": "west", "central": "central", "east": "east"}
-    fnb_categories = {
-        "accounting": "accounting",
-        "expense": "expenses",
-        "expenses": "expenses",
-        "legal": "legal",
-        "permit": "permits",
-        "permits": "permits",
-        "financial": "accounting",
-        "finance": "accounting",
-        "payroll": "accounting",
-        "tax": "accounting",
-    }
-    
-    # Legal firm keywords
-    legal_practice_areas = {
-        "corporate": "corporate_law",
-        "m&a": "corporate_law",
-        "merger": "corporate_law",
-        "acquisition": "corporate_law",
-        "ipo": "corporate_law",
-        "litigation": "litigation",
-        "lawsuit": "litigation",
-        "dispute": "litigation",
-        "court": "litigation",
-        "real estate": "real_estate",
-        "property": "real_estate",
-        "lease": "real_estate",
-        "zoning": "real_estate",
-        "ip": "intellectual_property",
-        "intellectual property": "intellectual_property",
-        "patent": "intellectual_property",
-        "trademark": "intellectual_property",
-        "copyright": "intellectual_property",
-        "employment": "employment_law",
-        "compensation": "employment_law",
-        "workplace": "employment_law",
-        "hr": "employment_law",
-        "investigation": "employment_law",
-    }
-    
-    # Legal matter keywords
-    legal_matters = {
-        "techcorp": "techcorp_acquisition",
-        "globalretail": "globalretail_ipo",
-        "smith": "smith_v_megacorp",
-        "megacorp": "smith_v_megacorp",
-        "abc": "contractdispute",
-        "xyz": "contractdispute",
-        "contract dispute": "contractdispute",
-        "tower": "downtown_tower",
-        "downtown": "downtown_tower",
-        "office lease": "office_lease",
-        "biotech": "patent_portfolio_biotech",
-        "patent portfolio": "patent_portfolio",
-        "trademark dispute": "trademark_dispute",
-        "fashion": "trademark_dispute_fashion",
-        "executive": "executive_compensation",
-        "compensation review": "executive_compensation",
-        "workplace investigation": "workplace_investigation",
-    }
-    
-    # Finance firm keywords
-    finance_departments = {
-        "equity": "equity_research",
-        "research": "equity_research",
-        "stock": "equity_research",
-        "analyst": "equity_research",
-        "fixed income": "fixed_income",
-        "bond": "fixed_income",
-        "bonds": "fixed_income",
-        "credit": "fixed_income",
-        "yield": "fixed_income",
-        "portfolio": "portfolio_management",
-        "fund": "portfolio_management",
-        "asset": "portfolio_management",
-        "risk": "risk_management",
-        "var": "risk_management",
-        "stress test": "risk_management",
-        "trading": "trading",
-        "execution": "trading",
-        "market making": "trading",
-    }
-    
-    finance_areas = {
-        "tech sector": "tech_sector_analysis",
-        "technology": "tech_sector_analysis",
-        "apple": "tech_sector_analysis",
-        "microsoft": "tech_sector_analysis",
-        "nvidia": "tech_sector_analysis",
-        "healthcare": "healthcare_sector_analysis",
-        "pharma": "healthcare_sector_analysis",
-        "biotech": "healthcare_sector_analysis",
-        "glp": "healthcare_sector_analysis",
-        "investment grade": "investment_grade",
-        "ig": "investment_grade",
-        "corporate bond": "investment_grade",
-        "high yield": "high_yield",
-        "hy": "high_yield",
-        "junk": "high_yield",
-        "distressed": "high_yield",
-        "growth fund": "growth_fund",
-        "growth": "growth_fund",
-        "value fund": "value_fund",
-        "value": "value_fund",
-        "dividend": "value_fund",
-        "market risk": "market_risk",
-        "stress": "market_risk",
-        "factor": "market_risk",
-        "credit risk": "credit_risk",
-        "counterparty": "credit_risk",
-        "default": "credit_risk",
-        "execution": "execution_analytics",
-        "tca": "execution_analytics",
-        "broker": "execution_analytics",
-        "market making": "market_making",
-        "options": "market_making",
-        "volatility": "market_making",
-        "greeks": "market_making",
-    }
-    
     query_location = None
     query_category = None
     query_practice_area = None
@@ -206,70 +429,269 @@ def search_files(
     
     # Check for F&B keywords
     for word in query_words:
-        for loc_key, loc_val in locations.items():
+        for loc_key, loc_val in LOCATIONS.items():
             if loc_key in word:
                 query_location = loc_val
                 break
-        for cat_key, cat_val in fnb_categories.items():
+        for cat_key, cat_val in FNB_CATEGORIES.items():
             if cat_key in word:
                 query_category = cat_val
                 break
     
     # Check for Legal keywords (check full query for multi-word matches)
-    for key, val in legal_practice_areas.items():
+    for key, val in LEGAL_PRACTICE_AREAS.items():
         if key in q:
             query_practice_area = val
             break
     
-    for key, val in legal_matters.items():
+    for key, val in LEGAL_MATTERS.items():
         if key in q:
             query_matter = val
             break
     
     # Check for Finance keywords
-    for key, val in finance_departments.items():
+    for key, val in FINANCE_DEPARTMENTS.items():
         if key in q:
             query_finance_dept = val
             break
     
-    for key, val in finance_areas.items():
+    for key, val in FINANCE_AREAS.items():
         if key in q:
             query_finance_area = val
             break
     
+    return QueryIntent(
+        q, query_words, query_location, query_category, query_practice_area,
+        query_matter, query_finance_dept, query_finance_area,
+    )
+
+
+# Query operators: "quoted phrases", a NEAR/k b proximity, and name:/path: field scopes
+_FIELD_RE = re.compile(r'\b(name|path):("[^"]*"|\S+)', re.IGNORECASE)
+_NEAR_RE = re.compile(r'("[^"]+"|[^\s"]+)\s+NEAR/(\d+)\s+("[^"]+"|[^\s"]+)')
+_PHRASE_RE = re.compile(r'"([^"]+)"')
+
+# Score added for each satisfied operator (a phrase counts like an exact query match)
+PHRASE_BOOST = 10.0
+NEAR_BOOST = 5.0
+FIELD_BOOST = 5.0
+
+
+class QueryOperators(NamedTuple):
+    phrases: List[List[str]]
+    near: List[Tuple[List[str], List[str], int]]
+    fields: List[Tuple[str, str]]
+
+
+def split_operators(query: str) -> Tuple[str, QueryOperators]:
+    """Pull phrase, NEAR/k and field operators out of a query.
+
+    Returns the remaining free text (phrase and NEAR words stay in it, so folder
+    intents and word scores still apply) and the operators, which every hit must
+    satisfy. Queries without operators are returned unchanged.
+    """
+    fields = [(f.lower(), v.strip('"').lower()) for f, v in _FIELD_RE.findall(query)]
+    rest = _FIELD_RE.sub(" ", query)
+    near = [(tokenize(a.strip('"')), tokenize(b.strip('"')), int(k)) for a, k, b in _NEAR_RE.findall(rest)]
+    rest = _NEAR_RE.sub(lambda m: " ".join(g.strip('"') for g in (m.group(1), m.group(3))), rest)
+    phrases = [terms for terms in (tokenize(p) for p in _PHRASE_RE.findall(rest)) if terms]
+    operators = QueryOperators(phrases, [n for n in near if n[0] and n[1]], fields)
+    if not (fields or near or '"' in query):
+        return query, operators
+    return " ".join(rest.replace('"', " ").split()), operators
+
+
+def _phrase_regex(terms: Sequence[str]) -> "re.Pattern":
+    # Same token rules as the index: words separated by anything that is not a letter or digit
+    return re.compile(r"(?<![^\W_])" + r"[\W_]+".join(map(re.escape, terms)) + r"(?![^\W_])")
+
+
+class _RecordMatcher:
+    """Boolean match arrays over a list of records, one entry per record.
+
+    When every record comes from one RecordStore, text matches use its indexes
+    (one pass over the mapped text per substring, merged position lists per
+    phrase); plain dict records fall back to checking each record's text.
+    """
+
+    def __init__(self, records: Sequence[Record]) -> None:
+        self.records = records
+        self.n = len(records)
+        self.store: Optional[RecordStore] = None
+        self.ids: Optional[np.ndarray] = None
+        if isinstance(records, (RecordStore, RecordSnapshot)):
+            # A whole store or snapshot: record i is document i, no need to visit each view
+            self.store = records if isinstance(records, RecordStore) else records.store
+            self.ids = np.arange(self.n, dtype=np.int64)
+        elif all(isinstance(r, RecordView) for r in records):
+            stores = {r.store for r in records}
+            if len(stores) == 1:
+                self.store = stores.pop()
+                self.ids = np.fromiter((r.id for r in records), dtype=np.int64, count=self.n)
+        # The store may still be growing; documents past this batch's records are ignored
+        self.id_limit = int(self.ids.max()) + 1 if self.ids is not None and self.n else 0
+
+    @cached_property
+    def names(self) -> List[str]:
+        if self.store is not None:
+            return [self.store.name_lower(i) for i in self.ids.tolist()]
+        return [_lower_field(r, "name") for r in self.records]
+
+    @cached_property
+    def paths(self) -> List[str]:
+        if self.store is not None:
+            return [self.store.path_lower(i) for i in self.ids.tolist()]
+        return [_lower_field(r, "path") for r in self.records]
+
+    def docs_mask(self, docs) -> np.ndarray:
+        """Per-record flags from a collection of store document ids."""
+        in_docs = np.zeros(self.id_limit, dtype=bool)
+        in_docs[[d for d in docs if d < self.id_limit]] = True
+        return in_docs[self.ids]
+
+    def _text_lower(self, i: int) -> str:
+        return self.records[i].get("text", "").lower()
+
+    def phrase(self, terms: Sequence[str]) -> np.ndarray:
+        """Records whose name or text contains the tokens ``terms`` consecutively."""
+        pattern = None
+
+        def contains(text: str) -> bool:
+            nonlocal pattern
+            # Cheap substring checks rule out most texts before a regex is compiled and run
+            if not all(t in text for t in terms):
+                return False
+            if pattern is None:
+                pattern = _phrase_regex(terms)
+            return pattern.search(text) is not None
+
+        in_name = np.fromiter((contains(name) for name in self.names), dtype=bool, count=self.n)
+        if self.store is not None:
+            return in_name | self.docs_mask(self.store.tokens.phrase_docs(terms).tolist())
+        in_text = np.fromiter((contains(self._text_lower(i)) for i in range(self.n)), dtype=bool, count=self.n)
+        return in_name | in_text
+
+    def near(self, left: Sequence[str], right: Sequence[str], k: int) -> np.ndarray:
+        if self.store is not None:
+            return self.docs_mask(self.store.tokens.near_docs(left, right, k).tolist())
+        found = np.zeros(self.n, dtype=bool)
+        for i in range(self.n):
+            tokens = TokenIndex()
+            tokens.add(self.records[i].get("text", ""))
+            found[i] = len(tokens.near_docs(left, right, k)) > 0
+        return found
+
+    def field(self, name: str, value: str) -> np.ndarray:
+        values = self.names if name == "name" else self.paths
+        alt = value.replace(" ", "_")
+        return np.fromiter((value in v or alt in v for v in values), dtype=bool, count=self.n)
+
+    def operators(self, ops: QueryOperators) -> Tuple[np.ndarray, np.ndarray]:
+        """(records satisfying every operator, score boost per record)."""
+        allowed = np.ones(self.n, dtype=bool)
+        boost = np.zeros(self.n, dtype=np.float64)
+        checks = (
+            [(self.phrase(terms), PHRASE_BOOST) for terms in ops.phrases]
+            + [(self.near(a, b, k), NEAR_BOOST) for a, b, k in ops.near]
+            + [(self.field(f, v), FIELD_BOOST) for f, v in ops.fields]
+        )
+        for mask, weight in checks:
+            allowed &= mask
+            boost += weight * mask
+        return allowed, boost
+
+
+def _filter_context(records: Sequence[Record], context_folders: Optional[List[str]]) -> Sequence[Record]:
+    """Records under any of ``context_folders``; all records if none match."""
+    if not context_folders:
+        return records
+    filtered_records = []
+    for r in records:
+        path = r.get("path", "").lower()
+        for folder in context_folders:
+            folder_lower = folder.lower()
+            if folder_lower.replace("_", "") in path.replace("_", "").replace("/", ""):
+                filtered_records.append(r)
+                break
+    return filtered_records or records
+
+
+@perf.traced()
+def search_files(
+    query: str,
+    records: Sequence[Record],
+    k: int = 50,
+    context_folders: List[str] = None,
+    industry_filter: str = None,
+    snippets: int = 0,
+) -> List[Record]:
+    """Improved keyword search with context filtering and better scoring.
+    
+    Args:
+        query: Search query string
+        records: List of document records
+        k: Maximum number of results
+        context_folders: Optional list of folders to restrict search to
+        industry_filter: Optional industry folder to filter by (e.g., "Restaurant_Franchise" or "Legal_Firm")
+        snippets: Number of best-matching snippets to attach to each hit as ``hit["snippets"]``
+    """
+    if not query:
+        return []
+    
+    # Stage costs go to the perf ring buffer (see profiling.py)
+    t = time.perf_counter()
+    free_text, operators = split_operators(query)
+    (q, query_words, query_location, query_category, query_practice_area,
+     query_matter, query_finance_dept, query_finance_area) = parse_query(free_text)
+    t = perf.mark("search_files.parse", t)
+    
+    # First, filter by industry if specified
+    if industry_filter:
+        records = [r for r in records if industry_filter in r.get("path", "")]
+    
     # Filter records by context folders if provided
-    filtered_records = records
-    if context_folders:
-        filtered_records = []
-        for r in records:
-            path = r.get("path", "").lower()
-            for folder in context_folders:
-                folder_lower = folder.lower()
-                if folder_lower.replace("_", "") in path.replace("_", "").replace("/", ""):
-                    filtered_records.append(r)
-                    break
-        if not filtered_records:
-            filtered_records = records
+    filtered_records = _filter_context(records, context_folders)
+    t = perf.mark("search_files.filter", t)
+    
+    # Operators, and the exact match of a multi-word query, are answered for all records up
+    # front from the positional index; a phrase then also matches across line breaks
+    matcher = _RecordMatcher(filtered_records)
+    allowed, boost = matcher.operators(operators)
+    q_terms = tokenize(q)
+    exact = matcher.phrase(q_terms) if len(q_terms) > 1 else None
+    t = perf.mark("search_files.operators", t)
     
     scored: List[Tuple[float, Record]] = []
-    for r in filtered_records:
-        path = r.get("path", "").lower()
-        name = r.get("name", "").lower()
-        text = r.get("text", "").lower()
-        hay = f"{name}\n{text}"
+    for i, r in enumerate(filtered_records):
+        if not allowed[i]:
+            continue
+        if isinstance(r, RecordView) and "\n" not in q:
+            # Lowercased path/name come from the store's columns; substring checks
+            # run against the memory-mapped text in place
+            store, idx = r.store, r.id
+            path = store.path_lower(idx)
+            name = store.name_lower(idx)
+
+            def in_hay(s: str, store=store, idx=idx, name=name) -> bool:
+                return s in name or store.text_contains(idx, s)
+        else:
+            path = r.get("path", "").lower()
+            name = r.get("name", "").lower()
+            hay = f"{name}\n{r.get('text', '').lower()}"
+            in_hay = hay.__contains__
         
         score = 0.0
         
         # Exact query match (highest weight)
-        if q in hay:
+        if q and (exact[i] if exact is not None else in_hay(q)):
             score += 10.0
-        if q in name:
+        if q and q in name:
             score += 5.0
         
         # Word matching
         for word in query_words:
             if len(word) > 2:  # Skip very short words
-                if word in hay:
+                if in_hay(word):
                     score += 2.0
                 if word in name:
                     score += 3.0
@@ -309,17 +731,17 @@ def search_files(
             path_score += 25.0
         
         score += path_score
+        score += float(boost[i])
         
         # Category name matching in filename
         if query_category:
-            for cat_key, cat_val in fnb_categories.items():
+            for cat_key, cat_val in FNB_CATEGORIES.items():
                 if cat_key in name and cat_val == query_category:
                     score += 5.0
         
         # Time period matching
-        time_indicators = ["q1", "q2", "q3", "q4", "march", "april", "may", "2023", "2024", "2025"]
-        for indicator in time_indicators:
-            if indicator in query_words and indicator in hay:
+        for indicator in TIME_INDICATORS:
+            if indicator in query_words and in_hay(indicator):
                 score += 3.0
         
         # Only add if score is positive
@@ -327,9 +749,209 @@ def search_files(
             r_with_score = r.copy()
             r_with_score["score"] = score
             scored.append((score, r_with_score))
+    t = perf.mark("search_files.score", t)
     
     scored.sort(key=lambda x: x[0], reverse=True)
-    return [r for _, r in scored[:k]]
+    hits = [r for _, r in scored[:k]]
+    t = perf.mark("search_files.rank", t)
+    if snippets:
+        for hit in hits:
+            hit["snippets"] = make_snippets(hit, free_text, count=snippets)
+        perf.mark("search_files.snippets", t)
+    return hits
+
+
+class _BatchScorer:
+    """Scores queries against a fixed set of records, sharing term matches across queries.
+
+    Every distinct term (a whole query, a word, a folder keyword) is matched
+    against the records once into a boolean array, and each query's score is a
+    weighted sum of those arrays.
+    """
+
+    def __init__(self, records: Sequence[Record], context_folders: List[str] = None, industry_filter: str = None) -> None:
+        if industry_filter:
+            records = [r for r in records if industry_filter in r.get("path", "")]
+        self.records = records = _filter_context(records, context_folders)
+        self.n = len(records)
+        self.matcher = _RecordMatcher(records)
+        self.paths_flat = [p.replace("_", "") for p in self.matcher.paths]
+        self._hay: Dict[str, np.ndarray] = {}
+        self._name: Dict[str, np.ndarray] = {}
+        self._path: Dict[str, np.ndarray] = {}
+        self._flat: Dict[str, np.ndarray] = {}
+        self._phrase: Dict[Tuple[str, ...], np.ndarray] = {}
+        self._folders: Optional[FolderIndex] = None
+
+    def in_hay(self, term: str) -> np.ndarray:
+        if term not in self._hay:
+            store = self.matcher.store
+            if store is not None and "\n" not in term:
+                # One pass over the store's mapped text per term instead of one check per record
+                self._hay[term] = self.in_name(term) | self.matcher.docs_mask(store.texts.docs_containing_lower(term))
+            else:
+                self._hay[term] = np.fromiter(
+                    (_hay_contains(r, name, term) for r, name in zip(self.records, self.matcher.names)),
+                    dtype=bool, count=self.n,
+                )
+        return self._hay[term]
+
+    def in_phrase(self, terms: List[str]) -> np.ndarray:
+        key = tuple(terms)
+        if key not in self._phrase:
+            self._phrase[key] = self.matcher.phrase(terms)
+        return self._phrase[key]
+
+    def in_name(self, term: str) -> np.ndarray:
+        if term not in self._name:
+            self._name[term] = np.fromiter((term in name for name in self.matcher.names), dtype=bool, count=self.n)
+        return self._name[term]
+
+    def in_path(self, term: str) -> np.ndarray:
+        if term not in self._path:
+            self._path[term] = np.fromiter((term in p for p in self.matcher.paths), dtype=bool, count=self.n)
+        return self._path[term]
+
+    def in_path_flat(self, term: str) -> np.ndarray:
+        # Folder keywords match with underscores ignored on both sides
+        term = term.replace("_", "")
+        if term not in self._flat:
+            self._flat[term] = np.fromiter((term in p for p in self.paths_flat), dtype=bool, count=self.n)
+        return self._flat[term]
+
+    def score(self, query: str) -> Tuple[str, np.ndarray]:
+        """(free text of the query, score per record); records failing an operator score 0."""
+        free_text, operators = split_operators(query)
+        allowed, score = self.matcher.operators(operators)
+        intent = parse_query(free_text)
+        q = intent.q
+        q_terms = tokenize(q)
+        if q:
+            score = score + 10.0 * (self.in_phrase(q_terms) if len(q_terms) > 1 else self.in_hay(q)) + 5.0 * self.in_name(q)
+        for word in intent.words:
+            if len(word) > 2:
+                score += 2.0 * self.in_hay(word) + 3.0 * self.in_name(word)
+
+        loc, cat = intent.location, intent.category
+        if loc:
+            score += 10.0 * self.in_path(loc)
+        if cat:
+            score += 10.0 * self.in_path(cat)
+        if loc and cat:
+            both = self.in_path(loc) & self.in_path(cat)
+            score += np.where(both, 15.0, -5.0)
+        elif cat:
+            score += 15.0 * self.in_path(cat)
+        for folder, weight in (
+            (intent.practice_area, 20.0),
+            (intent.matter, 25.0),
+            (intent.finance_dept, 20.0),
+            (intent.finance_area, 25.0),
+        ):
+            if folder:
+                score += weight * self.in_path_flat(folder)
+
+        if cat:
+            for cat_key, cat_val in FNB_CATEGORIES.items():
+                if cat_val == cat:
+                    score += 5.0 * self.in_name(cat_key)
+        for indicator in TIME_INDICATORS:
+            if indicator in intent.words:
+                score += 3.0 * self.in_hay(indicator)
+        return free_text, np.where(allowed, score, 0.0)
+
+    def top(self, free_text: str, score: np.ndarray, k: int, snippets: int = 0) -> List[Record]:
+        # A stable sort keeps corpus order among equal scores, as search_files does
+        order = np.argsort(-score, kind="stable")
+        hits = []
+        for i in order[:k]:
+            if score[i] <= 0:
+                break
+            hit = self.records[i].copy()
+            hit["score"] = float(score[i])
+            if snippets:
+                hit["snippets"] = make_snippets(hit, free_text, count=snippets)
+            hits.append(hit)
+        return hits
+
+    def folder_counts(self, score: np.ndarray, min_score: float = 0.0) -> Dict[str, int]:
+        """Records scoring above ``min_score`` under each folder, rolled up the tree."""
+        matched = np.flatnonzero(score > min_score)
+        if self.matcher.store is not None:
+            return self.matcher.store.folders.counts(self.matcher.ids[matched].tolist())
+        if self._folders is None:
+            self._folders = FolderIndex()
+            for r in self.records:
+                self._folders.add(os.path.dirname(r.get("path", "")), len(r.get("text", "")))
+        return self._folders.counts(matched.tolist())
+
+
+@perf.traced()
+def search_many(
+    queries: Sequence[str],
+    records: Sequence[Record],
+    k: int = 50,
+    context_folders: List[str] = None,
+    industry_filter: str = None,
+    snippets: int = 0,
+) -> List[List[Record]]:
+    """Run many queries at once; returns one ``search_files`` result list per query, in input order.
+
+    All queries are parsed up front, and every distinct term (a whole query, a
+    word, a folder keyword) is matched against the corpus once per batch into a
+    boolean array. Each query's score is then a weighted sum of those arrays,
+    so thousands of queries that share vocabulary cost about one scan per term.
+    Scores and ordering are identical to calling ``search_files`` per query.
+    """
+    scorer = _BatchScorer(records, context_folders, industry_filter)
+    results: List[List[Record]] = []
+    for query in queries:
+        if not query:
+            results.append([])
+            continue
+        free_text, score = scorer.score(query)
+        results.append(scorer.top(free_text, score, k, snippets))
+    return results
+
+
+@perf.traced()
+def search_facets(
+    queries: Sequence[str],
+    records: Sequence[Record],
+    k: int = 50,
+    context_folders: List[str] = None,
+    industry_filter: str = None,
+    snippets: int = 0,
+    min_score: float = 0.0,
+) -> List[Tuple[List[Record], Dict[str, int]]]:
+    """Like ``search_many``, plus per-folder hit counts for each query.
+
+    The counts come from the same score pass as the hits and cover every
+    record scoring above ``min_score``, not just the top ``k``; each folder's
+    count includes its subfolders. ``facets_by_node`` maps them onto the board.
+    """
+    scorer = _BatchScorer(records, context_folders, industry_filter)
+    results: List[Tuple[List[Record], Dict[str, int]]] = []
+    for query in queries:
+        if not query:
+            results.append(([], {}))
+            continue
+        free_text, score = scorer.score(query)
+        results.append((scorer.top(free_text, score, k, snippets), scorer.folder_counts(score, min_score)))
+    return results
+
+
+def _lower_field(r: Record, key: str) -> str:
+    if isinstance(r, RecordView):
+        return r.store.path_lower(r.id) if key == "path" else r.store.name_lower(r.id)
+    return r.get(key, "").lower()
+
+
+def _hay_contains(r: Record, name: str, term: str) -> bool:
+    """Whether ``term`` occurs in the lowercased name or text, as matched by search_files."""
+    if isinstance(r, RecordView) and "\n" not in term:
+        return term in name or r.text_contains(term)
+    return term in f"{name}\n{r.get('text', '').lower()}"
 
 
 def icon_for_ext(ext: str) -> str:
@@ -360,7 +982,107 @@ def looks_like_search(text: str) -> bool:
     return any(w in t for w in ["find", "search", "look for", "show me", "list "])
 
 
+# Query words never "corrected": the intent keywords above and common words of questions
+_NO_CORRECT = (
+    set(LOCATIONS) | set(FNB_CATEGORIES) | set(LEGAL_PRACTICE_AREAS) | set(LEGAL_MATTERS)
+    | set(FINANCE_DEPARTMENTS) | set(FINANCE_AREAS) | set(TIME_INDICATORS)
+    | {cue for cues in OPERATIONS.values() for cue in cues}
+    | {
+        "about", "which", "where", "there", "their", "these", "those", "should", "would", "could",
+        "files", "documents", "document", "show", "tell", "summarize", "summary", "compare", "please",
+    }
+)
+
+
+def spelling_for(records: Sequence[Record]) -> Optional[SpellIndex]:
+    """The term dictionary of the store behind ``records``, if they come from one."""
+    if isinstance(records, RecordStore):
+        return records.spelling
+    if isinstance(records, RecordSnapshot):
+        return records.store.spelling
+    if records and isinstance(records[0], RecordView):
+        return records[0].store.spelling
+    return None
+
+
+def find_corrections(query: str, spelling: Optional[SpellIndex]) -> Tuple[Dict[str, str], List[str]]:
+    """Misspelled query words mapped to their closest index terms, plus the words the index already knows."""
+    corrections: Dict[str, str] = {}
+    known: List[str] = []
+    if spelling is None:
+        return corrections, known
+    for word in dict.fromkeys(tokenize(query)):
+        if word in spelling:
+            known.append(word)
+            continue
+        if len(word) < MIN_WORD_LENGTH or not word.isalpha() or word in _NO_CORRECT:
+            continue
+        match = spelling.lookup(word, max_distance_for(word))
+        if match is not None:
+            corrections[word] = match[0]
+    return corrections, known
+
+
+def apply_corrections(query: str, corrections: Mapping[str, str]) -> str:
+    if not corrections:
+        return query
+    pattern = re.compile(r"(?<![^\W_])(" + "|".join(map(re.escape, corrections)) + r")(?![^\W_])", re.IGNORECASE)
+    return pattern.sub(lambda m: corrections[m.group(1).lower()], query)
+
+
+@perf.traced()
+def correct_query(query: str, records: Sequence[Record]) -> Tuple[str, Dict[str, str]]:
+    """Replace misspelled words with the closest terms in the index.
+
+    Returns the corrected query and the corrections applied (typed -> corrected),
+    so callers can tell the user what was searched for instead. Lookups go
+    through the store's deletion index built at index time.
+    """
+    corrections, _ = find_corrections(query, spelling_for(records))
+    return apply_corrections(query, corrections), corrections
+
+
+def make_snippets(record: Record, query: str, count: int = 2) -> List[Dict]:
+    """The best-matching windows of a record's text for ``query``.
+
+    Each snippet is ``{"text", "start", "end", "highlights"}``: ``start``/``end`` are
+    character offsets of the window in the document and ``highlights`` are
+    [start, end] character offsets of query terms within the snippet text. Records
+    from a RecordStore use the token positions stored at index time and decode only
+    the window's bytes; plain dict records are tokenized on the fly.
+    """
+    terms = query_terms(query)
+    if isinstance(record, RecordView):
+        store, doc = record.store, record.id
+        tokens = store.tokens
+        data = store.text_bytes(doc)
+        doc_ascii = store.texts.is_ascii(doc)
+    else:
+        text = record.get("text", "")
+        tokens = TokenIndex()
+        doc = tokens.add(text)
+        data = memoryview(text.encode("utf-8"))
+        doc_ascii = text.isascii()
+    snippets = []
+    for start, end, marks in tokens.snippet_spans(doc, list(tokens.lookup(terms)), count=count, data=data):
+        text = str(data[start:end], "utf-8")
+        # Byte offsets are character offsets in ASCII text; otherwise decode up to each offset
+        char_start = start if doc_ascii else len(str(data[:start], "utf-8"))
+        if text.isascii():
+            highlights = [[m_start - start, m_end - start] for m_start, m_end in marks]
+        else:
+            highlights = [
+                [len(str(data[start:m_start], "utf-8")), len(str(data[start:m_end], "utf-8"))]
+                for m_start, m_end in marks
+            ]
+        snippets.append({"text": text, "start": char_start, "end": char_start + len(text), "highlights": highlights})
+    return snippets
+
+
 def render_results(results: List[Record]) -> None:
+    # Streamlit is only needed here; the CLI, benchmarks and search server shards never import it
+    import streamlit as st
+
     if not results:
         st.info("No matching documents found.")
         return
@@ -370,6 +1092,7 @@ def render_results(results: List[Record]) -> None:
         st.caption(doc.get("path", ""))
 
 
+@perf.traced()
 def extract_node_ids_from_paths(paths: List[str], industry: str = "fnb") -> List[str]:
     """Extract board node IDs from document paths.
     
@@ -516,3 +1239,19 @@ def extract_node_ids_from_paths(paths: List[str], industry: str = "fnb") -> List
     return node_ids
 
 
+
+
+def facets_by_node(folder_counts: Mapping[str, int]) -> Dict[str, int]:
+    """Board node id -> hit count, from the per-folder counts of ``search_facets``.
+
+    Leaf folders map like ``extract_node_ids_from_paths``; group, practice-area
+    and department nodes, and the industry roots, are named after their folder
+    (``West_Group`` -> ``west_group``). Subfolders of a matter map to the matter's
+    node and are already included in its rolled-up count.
+    """
+    nodes: Dict[str, int] = {}
+    for folder, count in folder_counts.items():
+        leaf = extract_node_ids_from_paths([os.path.join(folder, "")])
+        node_id = leaf[0] if leaf else os.path.basename(folder).lower().replace("-", "_")
+        nodes[node_id] = max(count, nodes.get(node_id, 0))
+    return nodes
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+CACHE_DIR = os.environ.get("APOCRYPHA_CACHE_DIR", ".cache")
+# Point every app replica at the same directory (e.g. a shared volume) to parse each file once
+EXTRACT_CACHE_DIR = os.environ.get("APOCRYPHA_EXTRACT_CACHE_DIR", os.path.join(CACHE_DIR, "extracted"))
+DEFAULT_MAX_BYTES = int(os.environ.get("APOCRYPHA_EXTRACT_CACHE_MB", "512")) * 1024 * 1024
+# Bump when extraction output changes so stale entries are ignored
+EXTRACTOR_VERSION = "1"
+
+_CHUNK = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Content-addressed store of extracted text, keyed by file hash.
+
+    Entries are plain UTF-8 files laid out as ``v<version>/<ab>/<digest>.<ext>[.<limits>].txt``,
+    where ``limits`` names the extraction caps the text was produced under, so
+    text truncated by a lower cap is not served once the cap is raised.
+    Writes go to a temp file and are renamed into place, so several processes or
+    replicas can share one directory safely. Reads refresh the entry's mtime,
+    which eviction uses as the least-recently-used order.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = os.path.join(root or EXTRACT_CACHE_DIR, f"v{EXTRACTOR_VERSION}")
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest: str, ext: str, limits: str = "") -> str:
+        suffix = f".{limits}" if limits else ""
+        return os.path.join(self.root, digest[:2], f"{digest}.{ext or 'bin'}{suffix}.txt")
+
+    def get(self, digest: str, ext: str, limits: str = "") -> Optional[str]:
+        path = self._path(digest, ext, limits)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def put(self, digest: str, ext: str, text: str, limits: str = "") -> None:
+        path = self._path(digest, ext, limits)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def evict(self) -> int:
+        """Delete least-recently-used entries until the cache fits in max_bytes. Returns bytes freed."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for fname in filenames:
+                path = os.path.join(dirpath, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        freed = 0
+        if total <= self.max_bytes:
+            return freed
+        entries.sort()
+        for _, size, path in entries:
+            if total - freed <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                freed += size
+            except OSError:
+                pass
+        return freed
+
+
+_default_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Process-wide cache instance rooted at APOCRYPHA_EXTRACT_CACHE_DIR."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ExtractionCache()
+    return _default_cache
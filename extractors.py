@@ -0,0 +1,175 @@
+import csv
+import io
+import re
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+# An extractor is a generator fn(path, max_pages, max_bytes) yielding text pieces (pages, slides,
+# sheets). The Office formats below only need zipfile and xml.etree.
+Extractor = Callable[[str, int, int], Iterator[str]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+# Spreadsheet text is emitted as one CSV block per sheet, each introduced by this marker line
+SHEET_MARKER = "# Sheet: "
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PR = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def register_extractor(*exts: str) -> Callable[[Extractor], Extractor]:
+    """Decorator registering an extractor for one or more lowercase extensions."""
+    def wrap(fn: Extractor) -> Extractor:
+        for ext in exts:
+            EXTRACTORS[ext] = fn
+        return fn
+    return wrap
+
+
+def get_extractor(ext: str) -> Optional[Extractor]:
+    return EXTRACTORS.get(ext.lower())
+
+
+def _cap(pieces: Iterator[str], max_pages: int, max_bytes: int) -> Iterator[str]:
+    emitted = 0
+    for n, piece in enumerate(pieces):
+        if n >= max_pages:
+            break
+        size = len(piece.encode("utf-8"))
+        if emitted + size > max_bytes:
+            piece = piece.encode("utf-8")[: max_bytes - emitted].decode("utf-8", errors="ignore")
+            if piece:
+                yield piece
+            break
+        emitted += size
+        yield piece
+
+
+@register_extractor("docx")
+def extract_docx(path: str, max_pages: int, max_bytes: int) -> Iterator[str]:
+    """Yield each paragraph of a Word document, newline-terminated."""
+    def paragraphs() -> Iterator[str]:
+        with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag == f"{_W}p":
+                    text = "".join(t.text or "" for t in elem.iter(f"{_W}t"))
+                    if text:
+                        yield text + "\n"
+                    elem.clear()
+    # Paragraphs are not pages; only the byte cap applies
+    yield from _cap(paragraphs(), max_pages=2 ** 31, max_bytes=max_bytes)
+
+
+def _slide_number(name: str) -> int:
+    m = re.search(r"(\d+)\.xml$", name)
+    return int(m.group(1)) if m else 0
+
+
+@register_extractor("pptx")
+def extract_pptx(path: str, max_pages: int, max_bytes: int) -> Iterator[str]:
+    """Yield the text of each slide in order, one line per paragraph."""
+    def slides() -> Iterator[str]:
+        with zipfile.ZipFile(path) as zf:
+            names = sorted(
+                (n for n in zf.namelist() if re.match(r"ppt/slides/slide\d+\.xml$", n)),
+                key=_slide_number,
+            )
+            for name in names:
+                root = ET.fromstring(zf.read(name))
+                lines = ["".join(t.text or "" for t in p.iter(f"{_A}t")) for p in root.iter(f"{_A}p")]
+                yield "\n".join(line for line in lines if line) + "\n"
+    yield from _cap(slides(), max_pages=max_pages, max_bytes=max_bytes)
+
+
+def _column_index(ref: str) -> int:
+    idx = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        idx = idx * 26 + (ord(ch.upper()) - 64)
+    return idx - 1
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings = []
+    with f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f"{_S}si":
+                strings.append("".join(t.text or "" for t in elem.iter(f"{_S}t")))
+                elem.clear()
+    return strings
+
+
+def _sheet_paths(zf: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """(sheet name, part path) in workbook order."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {r.get("Id"): r.get("Target", "") for r in rels.iter(f"{_PR}Relationship")}
+    sheets = []
+    for sheet in workbook.iter(f"{_S}sheet"):
+        target = targets.get(sheet.get(f"{_R}id"), "")
+        target = target.lstrip("/")
+        if not target.startswith("xl/"):
+            target = f"xl/{target}"
+        sheets.append((sheet.get("name", ""), target))
+    return sheets
+
+
+def iter_xlsx_rows(zf: zipfile.ZipFile, part: str, shared: List[str]) -> Iterator[List[str]]:
+    """Yield the cell values of each row in a worksheet part, as strings."""
+    with zf.open(part) as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag != f"{_S}row":
+                continue
+            row: List[str] = []
+            for cell in elem.iter(f"{_S}c"):
+                kind = cell.get("t")
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in cell.iter(f"{_S}t"))
+                else:
+                    v = cell.find(f"{_S}v")
+                    value = v.text if v is not None and v.text else ""
+                    if kind == "s" and value:
+                        value = shared[int(value)]
+                    elif kind == "b":
+                        value = "TRUE" if value == "1" else "FALSE"
+                col = _column_index(cell.get("r", "")) if cell.get("r") else len(row)
+                if col >= len(row):
+                    row.extend([""] * (col - len(row) + 1))
+                row[col] = value
+            elem.clear()
+            if any(row):
+                yield row
+
+
+@register_extractor("xlsx")
+def extract_xlsx(path: str, max_pages: int, max_bytes: int) -> Iterator[str]:
+    """Yield each worksheet as a CSV block preceded by a ``# Sheet: <name>`` line."""
+    def sheets() -> Iterator[str]:
+        with zipfile.ZipFile(path) as zf:
+            shared = _shared_strings(zf)
+            for name, part in _sheet_paths(zf):
+                buf = io.StringIO()
+                buf.write(f"{SHEET_MARKER}{name}\n")
+                writer = csv.writer(buf, lineterminator="\n")
+                for row in iter_xlsx_rows(zf, part, shared):
+                    writer.writerow(row)
+                yield buf.getvalue()
+    yield from _cap(sheets(), max_pages=max_pages, max_bytes=max_bytes)
+
+
+def split_sheets(text: str) -> List[Tuple[str, str]]:
+    """Split extracted spreadsheet text back into (sheet name, CSV text) pairs."""
+    sheets: List[Tuple[str, str]] = []
+    for block in text.split(SHEET_MARKER)[1:]:
+        name, _, body = block.partition("\n")
+        sheets.append((name.strip(), body))
+    return sheets
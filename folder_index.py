@@ -0,0 +1,125 @@
+import os
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+
+class FolderStats(NamedTuple):
+    docs: int
+    bytes: int
+
+
+class FolderIndex:
+    """Per-folder aggregates of the document index, rolled up the folder tree.
+
+    Every document is filed under its folder, and every folder knows its
+    parent, so counts for any set of documents (all of them, or the hits of
+    one query) are a bincount over their folders followed by one pass adding
+    each folder's total into its parent. A folder's figures include
+    everything below it, so ``sample_data/Legal_Firm/Litigation`` counts the
+    files of every matter under Litigation.
+    """
+
+    def __init__(self) -> None:
+        self.folders: List[str] = []
+        self._ids: Dict[str, int] = {}
+        # Parent folder id per folder, -1 at the top; parents are always filed before children
+        self._parents = array("i")
+        self._doc_folder = array("I")
+        self._doc_bytes = array("Q")
+
+    def __len__(self) -> int:
+        return len(self._doc_folder)
+
+    def _folder_id(self, folder: str) -> int:
+        idx = self._ids.get(folder)
+        if idx is None:
+            parent = os.path.dirname(folder)
+            parent_id = self._folder_id(parent) if parent and parent != folder else -1
+            idx = len(self.folders)
+            # Parent first: readers size their arrays by ``folders`` and index ``_parents`` with it
+            self._parents.append(parent_id)
+            self.folders.append(folder)
+            self._ids[folder] = idx
+        return idx
+
+    def add(self, folder: str, nbytes: int) -> int:
+        """File one document of ``nbytes`` under ``folder``; returns its id."""
+        self._doc_bytes.append(nbytes)
+        self._doc_folder.append(self._folder_id(folder))
+        return len(self._doc_folder) - 1
+
+    def _roll_up(self, leaf: np.ndarray) -> np.ndarray:
+        totals = leaf.copy()
+        parents = self._parents[: len(totals)]
+        for idx in range(len(totals) - 1, -1, -1):
+            if parents[idx] >= 0:
+                totals[parents[idx]] += totals[idx]
+        return totals
+
+    def _doc_folders(self, limit: Optional[int]) -> np.ndarray:
+        # Copies: the indexing thread may be appending while a reader aggregates
+        n = len(self._doc_folder) if limit is None else min(limit, len(self._doc_folder))
+        return np.array(self._doc_folder[:n], dtype=np.int64)
+
+    def stats(self, limit: Optional[int] = None) -> Dict[str, FolderStats]:
+        """Documents and bytes under every folder, for the first ``limit`` documents (all by default)."""
+        folders = self._doc_folders(limit)
+        sizes = np.array(self._doc_bytes[: len(folders)], dtype=np.int64)
+        nfolders = len(self.folders)
+        docs = self._roll_up(np.bincount(folders, minlength=nfolders))
+        nbytes = self._roll_up(np.bincount(folders, weights=sizes, minlength=nfolders).astype(np.int64))
+        return {
+            self.folders[i]: FolderStats(int(docs[i]), int(nbytes[i]))
+            for i in range(nfolders) if docs[i]
+        }
+
+    def counts(self, docs: Iterable[int]) -> Dict[str, int]:
+        """How many of ``docs`` lie under each folder, for folders with at least one."""
+        docs = np.fromiter(docs, dtype=np.int64)
+        folders = self._doc_folders(int(docs.max()) + 1 if len(docs) else 0)
+        totals = self._roll_up(np.bincount(folders[docs], minlength=len(self.folders)))
+        return {self.folders[i]: int(c) for i, c in enumerate(totals.tolist()) if c}
+
+
+class DirectorySnapshot:
+    """The folder tree as the indexer walked it: file names per folder, held in memory.
+
+    Built once from the indexer's file list, so listing a folder (or everything
+    below it) is a dict lookup and never stats the filesystem again. Files
+    added to disk after the walk appear with the next index build.
+    """
+
+    def __init__(self, paths: Iterable[str] = ()) -> None:
+        self._files: Dict[str, List[str]] = {}
+        self._subfolders: Dict[str, List[str]] = {}
+        for path in paths:
+            folder, name = os.path.split(path)
+            if folder not in self._files:
+                self._add_folder(folder)
+            self._files[folder].append(name)
+
+    def _add_folder(self, folder: str) -> None:
+        self._files[folder] = []
+        self._subfolders.setdefault(folder, [])
+        parent = os.path.dirname(folder)
+        while parent and parent != folder:
+            if folder in self._subfolders.get(parent, ()):
+                break
+            self._subfolders.setdefault(parent, []).append(folder)
+            self._files.setdefault(parent, [])
+            folder, parent = parent, os.path.dirname(parent)
+
+    def __contains__(self, folder: str) -> bool:
+        return os.path.normpath(folder) in self._files
+
+    def files(self, folder: str, recursive: bool = False) -> List[str]:
+        """File paths under ``folder``, relative to it; with ``recursive``, nested folders' files too."""
+        folder = os.path.normpath(folder)
+        result = list(self._files.get(folder, ()))
+        if recursive:
+            for sub in self._subfolders.get(folder, ()):
+                prefix = os.path.basename(sub)
+                result += [os.path.join(prefix, f) for f in self.files(sub, recursive=True)]
+        return result
@@ -0,0 +1,241 @@
+"""Ahead-of-time index builds, written to a versioned artifact directory that the app loads at startup.
+
+    python cli.py build-index --root sample_data --out .index --vectors
+    python cli.py verify-index .index --full --source
+    APOCRYPHA_INDEX_DIR=.index streamlit run app.py
+
+Layout of ``--out``::
+
+    CURRENT                        name of the newest complete build
+    <build>/manifest.json
+    <build>/<shard>/text           sealed TextStore (plus text.lower, text.idx)
+    <build>/<shard>/store.pickle   RecordStore.save: columns, tables, token/spelling/folder indexes
+    <build>/<shard>/vectors.npz    VectorRanker matrix and idf, with --vectors
+
+A build is written under a hidden temporary name, renamed into place, and
+only then named in CURRENT (replaced atomically), so running apps keep reading
+the previous build while a new one is written. The manifest records the
+artifact format and extractor versions, the source root, a fingerprint of the
+source tree (relative path, size and mtime of every file) and the size and
+SHA-256 of every artifact file, plus a checksum over all of that. Loading
+checks the checksum, the versions and the file sizes without walking the
+source tree; ``verify_build(full=True)`` also re-hashes every file.
+
+These checks catch incomplete copies, corruption and version mismatches only.
+The checksum is stored in the same manifest it covers, so it is not an
+integrity or trust check, and ``store.pickle`` is loaded with ``pickle``.
+Only load artifacts you built or received from a trusted source.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from document_search import index_files, list_files
+from extraction_cache import EXTRACTOR_VERSION, ExtractionCache, file_digest, get_extraction_cache
+from index_worker import IndexShards, IndexWorker, list_shards
+from ranking import VectorRanker
+from record_store import RecordStore
+from text_store import TextStore
+
+# Bump when the layout or the pickled RecordStore state changes
+ARTIFACT_FORMAT = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+TEXT_FILE = "text"
+VECTORS_FILE = "vectors.npz"
+# Builds kept under --out, newest first; older ones are deleted after a successful build
+KEEP_BUILDS = 3
+
+# Prebuilt index for the app; unset means index in the background at startup
+INDEX_DIR = os.environ.get("APOCRYPHA_INDEX_DIR")
+# "full" re-hashes every artifact file at startup instead of only checking sizes
+VERIFY_FULL = os.environ.get("APOCRYPHA_INDEX_VERIFY") == "full"
+
+
+class ArtifactError(ValueError):
+    """The artifact is missing, incomplete, corrupted or from an incompatible version."""
+
+
+def source_fingerprint(paths: Sequence[str], root: str) -> str:
+    """SHA-256 over the relative path, size and mtime of every source file."""
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        h.update(f"{os.path.relpath(path, root)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _checksum(manifest: Dict) -> str:
+    body = {key: value for key, value in manifest.items() if key != "checksum"}
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _artifact_files(build_dir: str) -> Dict[str, Dict]:
+    files = {}
+    for path in sorted(list_files(build_dir)):
+        rel = os.path.relpath(path, build_dir)
+        if rel != MANIFEST:
+            files[rel.replace(os.sep, "/")] = {"bytes": os.path.getsize(path), "sha256": file_digest(path)}
+    return files
+
+
+def build(
+    root: str,
+    out: str,
+    workers: Optional[int] = None,
+    cache: Optional[ExtractionCache] = None,
+    vectors: bool = False,
+    keep: int = KEEP_BUILDS,
+) -> Dict:
+    """Index every shard under ``root`` into a new build in ``out``, make it CURRENT and return its manifest.
+
+    Files are extracted in ``workers`` processes (all CPUs by default).
+    """
+    shards = list_shards(root)
+    if not shards:
+        raise ArtifactError(f"no shard folders under {root}")
+    workers = workers or os.cpu_count() or 1
+    cache = cache or get_extraction_cache()
+    build_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    while os.path.exists(os.path.join(out, build_id)):
+        build_id += "_"
+    tmp = os.path.join(out, f".{build_id}.tmp")
+    os.makedirs(tmp)
+    started = time.perf_counter()
+    try:
+        shard_info: Dict[str, Dict] = {}
+        source: List[str] = []
+        for shard in shards:
+            shard_dir = os.path.join(tmp, shard)
+            os.makedirs(shard_dir)
+            records = RecordStore(TextStore(os.path.join(shard_dir, TEXT_FILE)))
+            paths = list_files(os.path.join(root, shard))
+            for _ in index_files(records, paths, cache, workers=workers):
+                pass
+            records.texts.seal()
+            records.save(shard_dir)
+            if vectors:
+                ranker = VectorRanker(records)
+                np.savez(os.path.join(shard_dir, VECTORS_FILE), matrix=ranker.matrix, idf=ranker.idf)
+            shard_info[shard] = {"docs": len(records), "text_bytes": records.texts.total_bytes(), "vectors": vectors}
+            source += paths
+        cache.evict()
+        manifest = {
+            "format": ARTIFACT_FORMAT,
+            "extractor_version": EXTRACTOR_VERSION,
+            "build": build_id,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "build_seconds": round(time.perf_counter() - started, 3),
+            "root": os.path.normpath(root),
+            "source": {"files": len(source), "fingerprint": source_fingerprint(source, root)},
+            "shards": shard_info,
+            "files": _artifact_files(tmp),
+        }
+        manifest["checksum"] = _checksum(manifest)
+        with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp, os.path.join(out, build_id))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(out, f".{CURRENT}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(build_id + "\n")
+    os.replace(pointer, os.path.join(out, CURRENT))
+    _prune(out, keep)
+    return manifest
+
+
+def _prune(out: str, keep: int) -> None:
+    builds = sorted((e.name for e in os.scandir(out) if e.is_dir() and not e.name.startswith(".")), reverse=True)
+    for name in builds[keep:]:
+        shutil.rmtree(os.path.join(out, name), ignore_errors=True)
+
+
+def resolve(path: str) -> str:
+    """The build directory for ``path``: the build named in its CURRENT file, or ``path`` itself."""
+    pointer = os.path.join(path, CURRENT)
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    return path
+
+
+def verify_build(build_dir: str, full: bool = False) -> Dict:
+    """Check a build against its manifest and return the manifest; raises ArtifactError on any mismatch."""
+    try:
+        with open(os.path.join(build_dir, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"cannot read manifest in {build_dir}: {e}") from e
+    if manifest.get("checksum") != _checksum(manifest):
+        raise ArtifactError(f"manifest checksum mismatch in {build_dir}")
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ArtifactError(f"artifact format {manifest.get('format')} is not {ARTIFACT_FORMAT}; rebuild the index")
+    if manifest.get("extractor_version") != EXTRACTOR_VERSION:
+        raise ArtifactError(f"artifact was extracted with version {manifest.get('extractor_version')}, not {EXTRACTOR_VERSION}")
+    for rel, expected in manifest["files"].items():
+        path = os.path.join(build_dir, rel.replace("/", os.sep))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            raise ArtifactError(f"missing artifact file {rel}") from None
+        if size != expected["bytes"]:
+            raise ArtifactError(f"{rel} is {size} bytes, manifest says {expected['bytes']}")
+        if full and file_digest(path) != expected["sha256"]:
+            raise ArtifactError(f"{rel} does not match its SHA-256")
+    return manifest
+
+
+def source_changed(manifest: Dict, root: Optional[str] = None) -> bool:
+    """Whether the files under the build's source root differ from when it was built (walks the tree)."""
+    root = root or manifest["root"]
+    paths = [p for shard in list_shards(root) for p in list_files(os.path.join(root, shard))]
+    return source_fingerprint(paths, root) != manifest["source"]["fingerprint"]
+
+
+def load_stores(path: str, full: bool = False) -> Tuple[Dict, Dict[str, RecordStore]]:
+    """(manifest, shard name -> read-only RecordStore) of the current build under ``path``.
+
+    Unpickles each shard's store: ``path`` must be trusted (see the module docstring).
+    """
+    build_dir = resolve(path)
+    manifest = verify_build(build_dir, full)
+    stores = {}
+    for shard in manifest["shards"]:
+        shard_dir = os.path.join(build_dir, shard)
+        stores[shard] = RecordStore.load(shard_dir, os.path.join(shard_dir, TEXT_FILE))
+    return manifest, stores
+
+
+def load_shards(path: str, root: str = "sample_data", full: bool = False) -> IndexShards:
+    """IndexShards serving the prebuilt stores, for an app that indexes ``root``.
+
+    Shards that appeared under ``root`` after the build are indexed in the
+    background as usual the first time they are used.
+    """
+    manifest, stores = load_stores(path, full)
+    if os.path.normpath(root) != manifest["root"]:
+        raise ArtifactError(f"artifact was built for {manifest['root']}, not {root}")
+    shards = IndexShards(root=root)
+    for name, records in stores.items():
+        shards.adopt(name, IndexWorker.from_store(records, os.path.join(root, name)))
+    return shards
+
+
+def load_vectors(path: str, shard: str, records: RecordStore) -> Optional[VectorRanker]:
+    """The prebuilt VectorRanker for ``shard``, or None if the build has no vectors."""
+    vectors = os.path.join(resolve(path), shard, VECTORS_FILE)
+    if not os.path.exists(vectors):
+        return None
+    with np.load(vectors) as data:
+        return VectorRanker.from_arrays(records, data["matrix"], data["idf"])
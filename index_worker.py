@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import perf
+from document_search import index_files, list_files
+from extraction_cache import ExtractionCache, get_extraction_cache
+from folder_index import DirectorySnapshot
+from record_store import RecordSnapshot, RecordStore
+from text_store import TextStore
+
+# How often the worker publishes a new snapshot while scanning, in seconds
+PUBLISH_INTERVAL = 0.5
+
+
+@dataclass(frozen=True)
+class IndexProgress:
+    files_done: int
+    files_total: int
+    bytes_done: int
+    elapsed: float
+    done: bool
+    error: Optional[str] = None
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> float:
+        return self.files_done / self.files_total if self.files_total else 1.0
+
+
+class IndexWorker:
+    """Builds the document index on a background thread.
+
+    The worker appends to a RecordStore and periodically publishes an immutable
+    RecordSnapshot of what it has indexed so far. Readers call ``snapshot()`` once
+    per request and search that, so they see partial results while the scan runs
+    but never a record that is only half written.
+    """
+
+    def __init__(
+        self,
+        root: str = "sample_data",
+        cache: Optional[ExtractionCache] = None,
+        text_path: Optional[str] = None,
+    ) -> None:
+        self.root = root
+        self._cache = cache
+        self._records = RecordStore(TextStore(text_path))
+        self._snapshot = self._records.snapshot()
+        self._directory = DirectorySnapshot()
+        self._progress = IndexProgress(0, 0, 0, 0.0, False)
+        self._thread = threading.Thread(target=self._run, name="index-worker", daemon=True)
+        self._done = threading.Event()
+
+    @classmethod
+    def from_store(cls, records: RecordStore, root: str) -> "IndexWorker":
+        """A finished worker serving an already built store (e.g. from ``index_artifact``); nothing is scanned."""
+        worker = cls.__new__(cls)
+        worker.root = root
+        worker._cache = None
+        worker._records = records
+        worker._snapshot = records.snapshot()
+        worker._directory = DirectorySnapshot(r["path"] for r in worker._snapshot)
+        worker._progress = IndexProgress(len(records), len(records), records.texts.total_bytes(), 0.0, True)
+        worker._thread = None
+        worker._done = threading.Event()
+        worker._done.set()
+        return worker
+
+    def start(self) -> "IndexWorker":
+        self._thread.start()
+        return self
+
+    def snapshot(self) -> RecordSnapshot:
+        """The latest published snapshot; safe to call from any thread."""
+        return self._snapshot
+
+    def directory(self) -> DirectorySnapshot:
+        """Files per folder as found by the scan; complete as soon as the walk finishes, before extraction."""
+        return self._directory
+
+    def progress(self) -> IndexProgress:
+        return self._progress
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _publish(self, files_done: int, files_total: int, bytes_done: int, started: float, done: bool = False, error: Optional[str] = None) -> None:
+        # Snapshot first, so progress never claims files a reader cannot see yet
+        self._snapshot = self._records.snapshot()
+        self._progress = IndexProgress(files_done, files_total, bytes_done, time.perf_counter() - started, done, error)
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        files_done = bytes_done = total = 0
+        cache = self._cache
+        try:
+            with perf.span("index_build", root=self.root):
+                paths = list_files(self.root)
+                self._directory = DirectorySnapshot(paths)
+                total = len(paths)
+                self._publish(0, total, 0, started)
+                if cache is None:
+                    cache = get_extraction_cache()
+                last = time.perf_counter()
+                for _, size in index_files(self._records, paths, cache):
+                    files_done += 1
+                    bytes_done += size
+                    if time.perf_counter() - last >= PUBLISH_INTERVAL:
+                        self._publish(files_done, total, bytes_done, started)
+                        last = time.perf_counter()
+                self._records.texts.seal()
+                cache.evict()
+                self._publish(files_done, total, bytes_done, started, done=True)
+        except Exception as e:
+            # Keep whatever was indexed before the failure searchable
+            self._publish(files_done, total, bytes_done, started, done=True, error=str(e))
+        finally:
+            self._done.set()
+
+
+def list_shards(root: str) -> List[str]:
+    """Tenant shard names: the immediate subdirectories of ``root``, sorted."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(e.name for e in os.scandir(root) if e.is_dir() and not e.name.startswith("."))
+
+
+class IndexShards:
+    """One independently built index per tenant root (e.g. ``sample_data/Legal_Firm``).
+
+    Every subdirectory of ``root`` is a shard with its own IndexWorker, RecordStore
+    and text file, so a tenant's index can be built, rebuilt or dropped without
+    touching the others, and searching one tenant never walks another's records.
+    Switching tenants is a dict lookup for that shard's latest snapshot.
+    """
+
+    def __init__(self, root: str = "sample_data", cache: Optional[ExtractionCache] = None) -> None:
+        self.root = root
+        self._cache = cache
+        self._workers: Dict[str, IndexWorker] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return list_shards(self.root)
+
+    def worker(self, name: str) -> IndexWorker:
+        """The shard's worker, started on first use."""
+        with self._lock:
+            worker = self._workers.get(name)
+            if worker is None:
+                worker = IndexWorker(root=os.path.join(self.root, name), cache=self._cache).start()
+                self._workers[name] = worker
+            return worker
+
+    def started(self, name: str) -> bool:
+        """Whether the shard has a worker yet (``worker`` creates and starts one on first use)."""
+        return name in self._workers
+
+    def adopt(self, name: str, worker: IndexWorker) -> None:
+        """Serve shard ``name`` from ``worker`` (typically a prebuilt ``IndexWorker.from_store``)."""
+        with self._lock:
+            self._workers[name] = worker
+
+    def start(self, first: Optional[str] = None) -> "IndexShards":
+        """Start indexing every shard, beginning with ``first`` (typically the active tenant)."""
+        names = self.names()
+        if first in names:
+            names.remove(first)
+            names.insert(0, first)
+        for name in names:
+            self.worker(name)
+        return self
+
+    def snapshot(self, name: str) -> RecordSnapshot:
+        return self.worker(name).snapshot()
+
+    def progress(self, name: str) -> IndexProgress:
+        return self.worker(name).progress()
+
+    def directory(self, name: str) -> DirectorySnapshot:
+        return self.worker(name).directory()
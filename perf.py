@@ -0,0 +1,180 @@
+"""Timing spans for the hot paths, kept in an in-process ring buffer.
+
+    with perf.span("resolve_context", files=120):
+        ...
+
+    @perf.traced("search_files")
+    def search_files(...): ...
+
+A span records its name, start, duration, thread and the chat turn it ran in.
+``run_chat_pipeline`` opens a turn with ``perf.turn``; spans started inside it,
+including those in ``asyncio.to_thread`` workers (which copy the context), are
+tagged with that turn's id. Only the last ``APOCRYPHA_PERF_SPANS`` spans are
+kept. ``chrome_trace`` exports them in the Chrome trace event format, which
+chrome://tracing and https://ui.perfetto.dev open directly. Set
+``APOCRYPHA_PERF=0`` to turn recording off.
+"""
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+ENABLED = os.environ.get("APOCRYPHA_PERF", "1") != "0"
+MAX_SPANS = int(os.environ.get("APOCRYPHA_PERF_SPANS", "5000"))
+# Turns whose labels are remembered for the panel
+MAX_TURNS = 100
+
+
+class Span(NamedTuple):
+    name: str
+    # time.perf_counter() seconds
+    start: float
+    duration: float
+    thread: int
+    turn: Optional[int]
+    args: Dict[str, Any]
+
+
+class Turn(NamedTuple):
+    id: int
+    label: str
+    start: float
+
+
+# deque.append is atomic, so spans can be recorded from any thread without a lock
+_spans: "deque[Span]" = deque(maxlen=MAX_SPANS)
+_turns: "deque[Turn]" = deque(maxlen=MAX_TURNS)
+_thread_names: Dict[int, str] = {}
+_turn_ids = itertools.count(1)
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("perf_turn", default=None)
+
+
+def current_turn() -> Optional[int]:
+    return _current_turn.get()
+
+
+@contextmanager
+def span(name: str, turn: Optional[int] = None, **args: Any) -> Iterator[None]:
+    """Time the ``with`` block; ``turn`` defaults to the turn open in this context."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, start, time.perf_counter() - start, turn, args)
+
+
+def mark(name: str, start: float) -> float:
+    """Record a span from ``start`` until now and return now, to time consecutive stages of one function:
+
+        t = time.perf_counter()
+        ...
+        t = perf.mark("search_files.parse", t)
+    """
+    now = time.perf_counter()
+    if ENABLED:
+        _record(name, start, now - start, None, {})
+    return now
+
+
+def _record(name: str, start: float, duration: float, turn: Optional[int], args: Dict[str, Any]) -> None:
+    thread = threading.get_ident()
+    if thread not in _thread_names:
+        _thread_names[thread] = threading.current_thread().name
+    _spans.append(Span(name, start, duration, thread, turn if turn is not None else _current_turn.get(), args))
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator form of ``span`` for synchronous functions."""
+    def decorate(fn: Callable) -> Callable:
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def turn(label: str) -> Iterator[int]:
+    """Open a chat turn: spans in this context (and tasks or threads started from it) carry its id."""
+    turn_id = next(_turn_ids)
+    _turns.append(Turn(turn_id, label, time.perf_counter()))
+    token = _current_turn.set(turn_id)
+    try:
+        with span("turn", turn=turn_id):
+            yield turn_id
+    finally:
+        _current_turn.reset(token)
+
+
+def spans(turn: Optional[int] = None) -> List[Span]:
+    """Recorded spans, oldest first; only those of ``turn`` when given."""
+    recorded = list(_spans)
+    if turn is None:
+        return recorded
+    return [s for s in recorded if s.turn == turn]
+
+
+def recent_turns(n: int = 10) -> List[Dict[str, Any]]:
+    """Turn id, label and milliseconds per span name (``stages``) for the last ``n`` turns, newest first.
+
+    Spans with the same name in one turn are summed; the ``turn`` stage is the
+    turn's wall time, so stages that overlapped add up to more than it.
+    """
+    by_turn: Dict[int, Dict[str, float]] = {}
+    for s in _spans:
+        if s.turn is not None:
+            stages = by_turn.setdefault(s.turn, {})
+            stages[s.name] = stages.get(s.name, 0.0) + s.duration * 1000
+    rows = []
+    for t in reversed(_turns):
+        if t.id in by_turn:
+            rows.append({"turn": t.id, "label": t.label, "stages": by_turn[t.id]})
+        if len(rows) == n:
+            break
+    return rows
+
+
+def chrome_trace(recorded: Optional[List[Span]] = None) -> Dict[str, Any]:
+    """Spans as a Chrome trace (complete "X" events, microseconds), with thread names as metadata."""
+    recorded = spans() if recorded is None else recorded
+    pid = os.getpid()
+    labels = {t.id: t.label for t in _turns}
+    events: List[Dict[str, Any]] = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+        for tid, name in list(_thread_names.items())
+    ]
+    for s in recorded:
+        args = dict(s.args)
+        if s.turn is not None:
+            args["turn"] = s.turn
+            args["prompt"] = labels.get(s.turn, "")
+        events.append({
+            "name": s.name, "cat": "apocrypha", "ph": "X", "pid": pid, "tid": s.thread,
+            "ts": round(s.start * 1e6, 1), "dur": round(s.duration * 1e6, 1), "args": args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(path: str, recorded: Optional[List[Span]] = None) -> int:
+    """Write ``chrome_trace`` to ``path``; returns the number of spans written."""
+    trace = chrome_trace(recorded)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f)
+    return sum(1 for e in trace["traceEvents"] if e["ph"] == "X")
+
+
+def clear() -> None:
+    _spans.clear()
+    _turns.clear()
@@ -0,0 +1,230 @@
+"""Opt-in profiling of index builds and query runs, to find the files and stages that are slow.
+
+    python cli.py profile --root sample_data/Legal_Firm --cold --cprofile --tracemalloc
+    python cli.py profile --file queries.txt --output profile.json
+
+``IndexProfile`` collects one ``FileCost`` per indexed file when passed to
+``scan_dummy_data(profile=...)``. ``query_stages`` reads the per-stage spans
+``search_files`` records in ``perf``. ``Profiler`` optionally wraps a run in
+cProfile and tracemalloc. ``report`` and ``format_report`` turn the results
+into JSON and a plain-text summary naming the slowest files, the heaviest
+functions and the biggest allocation sites.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import perf
+
+# Rows per section of the report
+TOP_N = 20
+
+
+class FileCost(NamedTuple):
+    path: str
+    ext: str
+    # File size on disk
+    bytes: int
+    # Pieces the extractor produced (PDF pages, Office slides/sheets/paragraphs, 64 KB text chunks);
+    # None when the text came from the extraction cache
+    pages: Optional[int]
+    text_chars: int
+    # Reading, text extraction and table parsing
+    extract_seconds: float
+    # Appending to the RecordStore (text, token and spelling indexes)
+    index_seconds: float
+    cached: bool
+
+    @property
+    def seconds(self) -> float:
+        return self.extract_seconds + self.index_seconds
+
+
+class IndexProfile:
+    """Per-file costs of one index build, in indexing order."""
+
+    def __init__(self) -> None:
+        self.files: List[FileCost] = []
+        self._lock = threading.Lock()
+
+    def add(
+        self, path: str, ext: str, nbytes: int, pages: Optional[int], text_chars: int,
+        extract_seconds: float, index_seconds: float, cached: bool,
+    ) -> None:
+        with self._lock:
+            self.files.append(FileCost(path, ext, nbytes, pages, text_chars, extract_seconds, index_seconds, cached))
+
+    def slowest(self, n: int = TOP_N) -> List[FileCost]:
+        return sorted(self.files, key=lambda f: f.seconds, reverse=True)[:n]
+
+    def by_ext(self) -> Dict[str, Dict[str, Any]]:
+        """Files, seconds, bytes and pages summed per extension, most expensive first."""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for f in self.files:
+            t = totals.setdefault(f.ext or "(none)", {"files": 0, "seconds": 0.0, "bytes": 0, "pages": 0, "cached": 0})
+            t["files"] += 1
+            t["seconds"] += f.seconds
+            t["bytes"] += f.bytes
+            t["pages"] += f.pages or 0
+            t["cached"] += f.cached
+        return dict(sorted(totals.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+
+def query_stages(spans: Sequence[perf.Span], prefix: str = "search_files") -> Dict[str, float]:
+    """Milliseconds per ``search_files`` stage, summed over ``spans`` (the whole call under ``prefix``)."""
+    stages: Dict[str, float] = {}
+    for s in spans:
+        if s.name == prefix or s.name.startswith(prefix + "."):
+            stage = s.name[len(prefix) + 1:] or "total"
+            stages[stage] = stages.get(stage, 0.0) + s.duration * 1000
+    return stages
+
+
+class Profiler:
+    """Context manager that runs its block under cProfile and/or tracemalloc, when enabled.
+
+    cProfile only sees the thread that enters the block; profile in-process
+    builds (``scan_dummy_data``), not the background IndexWorker.
+    """
+
+    def __init__(self, cpu: bool = False, memory: bool = False, frames: int = 1) -> None:
+        self.cpu = cpu
+        self.memory = memory
+        self.frames = frames
+        self.stats: Optional[pstats.Stats] = None
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.peak_bytes = 0
+        self.seconds = 0.0
+        self._profile: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> "Profiler":
+        if self.memory:
+            tracemalloc.start(self.frames)
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.seconds = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+            self.stats = pstats.Stats(self._profile, stream=io.StringIO())
+        if self.memory:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def dump(self, path: str) -> None:
+        """Write the raw cProfile data (for snakeviz, pstats or gprof2dot)."""
+        if self._profile is not None:
+            self._profile.dump_stats(path)
+
+    def top_functions(self, n: int = TOP_N) -> List[Dict[str, Any]]:
+        if self.stats is None:
+            return []
+        rows = []
+        # stats.stats: (file, line, function) -> (primitive calls, calls, own time, cumulative time, callers)
+        for (filename, line, func), (_, calls, own, cumulative, _) in self.stats.stats.items():
+            rows.append({
+                "function": f"{_short_path(filename)}:{line}({func})",
+                "calls": calls,
+                "own_s": round(own, 4),
+                "cumulative_s": round(cumulative, 4),
+            })
+        rows.sort(key=lambda r: r["own_s"], reverse=True)
+        return rows[:n]
+
+    def top_allocations(self, n: int = TOP_N) -> List[Dict[str, Any]]:
+        """Allocation sites still holding the most memory when the block ended."""
+        if self.snapshot is None:
+            return []
+        # Leave out the profilers' own bookkeeping
+        snapshot = self.snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__),
+        ])
+        rows = []
+        for stat in snapshot.statistics("lineno")[:n]:
+            frame = stat.traceback[0]
+            rows.append({"site": f"{_short_path(frame.filename)}:{frame.lineno}", "kb": round(stat.size / 1024, 1), "blocks": stat.count})
+        return rows
+
+
+def _short_path(filename: str) -> str:
+    """Repo files relative to the working directory; library and built-in locations unchanged."""
+    if not os.path.isabs(filename):
+        return filename
+    rel = os.path.relpath(filename)
+    return filename if rel.startswith("..") else rel
+
+
+def _file_row(f: FileCost) -> Dict[str, Any]:
+    return {
+        "path": f.path, "ext": f.ext, "bytes": f.bytes, "pages": f.pages, "text_chars": f.text_chars,
+        "extract_ms": round(f.extract_seconds * 1000, 2), "index_ms": round(f.index_seconds * 1000, 2), "cached": f.cached,
+    }
+
+
+def report(
+    index: Optional[IndexProfile] = None,
+    queries: Optional[Dict[str, Dict[str, float]]] = None,
+    profiler: Optional[Profiler] = None,
+    n: int = TOP_N,
+) -> Dict[str, Any]:
+    """JSON-ready profile report; every section is optional."""
+    result: Dict[str, Any] = {}
+    if index is not None:
+        result["index"] = {
+            "files": len(index.files),
+            "seconds": round(sum(f.seconds for f in index.files), 3),
+            "extract_seconds": round(sum(f.extract_seconds for f in index.files), 3),
+            "slowest_files": [_file_row(f) for f in index.slowest(n)],
+            "by_ext": {
+                ext: {**t, "seconds": round(t["seconds"], 3)} for ext, t in index.by_ext().items()
+            },
+        }
+    if queries is not None:
+        result["queries"] = {q: {stage: round(ms, 3) for stage, ms in stages.items()} for q, stages in queries.items()}
+    if profiler is not None:
+        if profiler.cpu:
+            result["cprofile"] = profiler.top_functions(n)
+        if profiler.memory:
+            result["tracemalloc"] = {"peak_mb": round(profiler.peak_bytes / 1e6, 2), "top": profiler.top_allocations(n)}
+    return result
+
+
+def format_report(result: Dict[str, Any], n: int = 10) -> str:
+    """Plain-text summary of ``report``'s output."""
+    lines: List[str] = []
+    index = result.get("index")
+    if index:
+        lines.append(f"Indexed {index['files']} files in {index['seconds']:.2f}s ({index['extract_seconds']:.2f}s extracting)")
+        lines.append("Slowest files:")
+        for f in index["slowest_files"][:n]:
+            pages = "cached" if f["cached"] else f"{f['pages']} pages"
+            lines.append(f"  {f['extract_ms'] + f['index_ms']:9.1f} ms  {f['bytes'] / 1024:9.1f} KB  {pages:>10}  {f['path']}")
+        lines.append("By type:")
+        for ext, t in index["by_ext"].items():
+            lines.append(f"  {ext:<6} {t['files']:6d} files  {t['seconds']:8.2f}s  {t['bytes'] / 1e6:8.2f} MB  {t['pages']:7d} pages")
+    queries = result.get("queries")
+    if queries:
+        lines.append("Query stages (ms):")
+        for query, stages in queries.items():
+            parts = " · ".join(f"{stage} {ms:.2f}" for stage, ms in stages.items() if stage != "total")
+            lines.append(f"  {stages.get('total', 0.0):8.2f}  {query}: {parts}")
+    if result.get("cprofile"):
+        lines.append("Functions by own time:")
+        for row in result["cprofile"][:n]:
+            lines.append(f"  {row['own_s']:8.3f}s own {row['cumulative_s']:8.3f}s cum {row['calls']:9d}  {row['function']}")
+    memory = result.get("tracemalloc")
+    if memory:
+        lines.append(f"Allocations (peak {memory['peak_mb']:.1f} MB traced):")
+        for row in memory["top"][:n]:
+            lines.append(f"  {row['kb']:10.1f} KB {row['blocks']:8d} blocks  {row['site']}")
+    return "\n".join(lines)
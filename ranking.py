@@ -0,0 +1,197 @@
+"""Alternative ranking functions over the document index, compared against ``search_files`` by
+``benchmarks/eval.py``.
+
+- ``BM25Ranker``: Okapi BM25 over the TokenIndex postings, with name and path tokens counted as extra occurrences.
+- ``VectorRanker``: cosine similarity of hashed word + character-trigram TF-IDF vectors, which tolerate
+  inflections and partial words ("invest" vs "investment") without an embedding model.
+- ``HybridRanker``: reciprocal rank fusion of the two.
+"""
+import math
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from record_store import RecordSnapshot, RecordStore, RecordView
+from token_index import TokenIndex, tokenize
+
+Record = Dict
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Each name/path token counts as this many text occurrences
+PATH_WEIGHT = 2.0
+VECTOR_DIM = 4096
+# Reciprocal rank fusion constant; larger values flatten the difference between top ranks
+RRF_K = 60
+# Candidates taken from each ranker before fusion
+FUSION_DEPTH = 100
+
+
+def _store_and_ids(records: Sequence[Record]) -> Tuple[TokenIndex, np.ndarray]:
+    """The token index behind ``records`` and each record's document id in it.
+
+    Records from one RecordStore use its index; anything else is tokenized here.
+    """
+    if isinstance(records, (RecordStore, RecordSnapshot)):
+        store = records if isinstance(records, RecordStore) else records.store
+        return store.tokens, np.arange(len(records), dtype=np.int64)
+    if records and all(isinstance(r, RecordView) for r in records) and len({r.store for r in records}) == 1:
+        return records[0].store.tokens, np.fromiter((r.id for r in records), dtype=np.int64, count=len(records))
+    tokens = TokenIndex()
+    for r in records:
+        tokens.add(r.get("text", ""))
+    return tokens, np.arange(len(records), dtype=np.int64)
+
+
+def _path_terms(record: Record) -> List[str]:
+    return tokenize(record.get("path", ""))
+
+
+def _top(records: Sequence[Record], scores: np.ndarray, k: int) -> List[Record]:
+    order = np.argsort(-scores, kind="stable")[:k]
+    hits = []
+    for i in order:
+        if scores[i] <= 0:
+            break
+        hit = records[int(i)].copy()
+        hit["score"] = float(scores[i])
+        hits.append(hit)
+    return hits
+
+
+class BM25Ranker:
+    """Okapi BM25 over a fixed set of records.
+
+    Term frequencies come from the positional postings built at index time, so
+    preparing the ranker only tokenizes paths; each query term is one postings
+    lookup plus vector arithmetic over the records.
+    """
+
+    def __init__(self, records: Sequence[Record]) -> None:
+        self.records = records
+        self.tokens, self.ids = _store_and_ids(records)
+        self.n = len(records)
+        # Store document id -> position in ``records`` (-1 when not part of this set)
+        self._pos = np.full(int(self.ids.max()) + 1 if self.n else 0, -1, dtype=np.int64)
+        self._pos[self.ids] = np.arange(self.n)
+        self._path_tf: Dict[str, np.ndarray] = {}
+        path_terms = [_path_terms(r) for r in records]
+        for i, terms in enumerate(path_terms):
+            for term in terms:
+                self._path_tf.setdefault(term, np.zeros(self.n, dtype=np.float64))[i] += 1
+        lengths = self.tokens.doc_lengths(len(self._pos))[self.ids].astype(np.float64)
+        self.lengths = lengths + PATH_WEIGHT * np.array([len(t) for t in path_terms], dtype=np.float64)
+        self.avg_length = float(self.lengths.mean()) if self.n else 0.0
+
+    def term_frequencies(self, term: str) -> np.ndarray:
+        tf = np.zeros(self.n, dtype=np.float64)
+        docs, counts = self.tokens.term_doc_counts(term)
+        docs, counts = docs[docs < len(self._pos)], counts[docs < len(self._pos)]
+        pos = self._pos[docs]
+        tf[pos[pos >= 0]] = counts[pos >= 0]
+        path_tf = self._path_tf.get(term)
+        if path_tf is not None:
+            tf += PATH_WEIGHT * path_tf
+        return tf
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n, dtype=np.float64)
+        if not self.n:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / self.avg_length)
+        for term in dict.fromkeys(tokenize(query)):
+            tf = self.term_frequencies(term)
+            df = int(np.count_nonzero(tf))
+            if not df:
+                continue
+            idf = math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+            scores += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 50) -> List[Record]:
+        return _top(self.records, self.scores(query), k)
+
+
+def _features(term: str) -> List[int]:
+    """Hashed buckets of a word and its character trigrams (with ``<`` ``>`` boundary marks)."""
+    padded = f"<{term}>"
+    grams = [term] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    # crc32 rather than hash(): buckets must not change between processes
+    return [zlib.crc32(g.encode("utf-8")) % VECTOR_DIM for g in grams]
+
+
+class VectorRanker:
+    """Cosine similarity between hashed subword TF-IDF vectors.
+
+    Every record (name, path and text) becomes one L2-normalised ``VECTOR_DIM``
+    vector; a query is scored against all of them with one matrix-vector
+    product. Memory is ``4 * VECTOR_DIM`` bytes per record.
+    """
+
+    def __init__(self, records: Sequence[Record]) -> None:
+        self.records = records
+        self.tokens, self.ids = _store_and_ids(records)
+        self._term_features: Dict[int, List[int]] = {}
+        matrix = np.zeros((len(records), VECTOR_DIM), dtype=np.float32)
+        for row, (doc, record) in enumerate(zip(self.ids.tolist(), records)):
+            term_ids, _, _ = self.tokens.doc_tokens(doc)
+            terms, counts = np.unique(term_ids, return_counts=True)
+            for term_id, count in zip(terms.tolist(), counts.tolist()):
+                features = self._term_features.get(term_id)
+                if features is None:
+                    features = self._term_features[term_id] = _features(self.tokens.terms[term_id])
+                np.add.at(matrix[row], features, 1 + math.log(count))
+            for term in _path_terms(record):
+                np.add.at(matrix[row], _features(term), PATH_WEIGHT)
+        df = np.count_nonzero(matrix, axis=0)
+        self.idf = np.log((1 + len(records)) / (1 + df)).astype(np.float32) + 1
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms > 0, norms, 1)
+
+    @classmethod
+    def from_arrays(cls, records: Sequence[Record], matrix: np.ndarray, idf: np.ndarray) -> "VectorRanker":
+        """A ranker over ``records`` from a previously built ``matrix`` and ``idf`` (see index_artifact)."""
+        if len(matrix) != len(records):
+            raise ValueError(f"{len(matrix)} vectors for {len(records)} records")
+        ranker = cls.__new__(cls)
+        ranker.records = records
+        ranker.tokens, ranker.ids = _store_and_ids(records)
+        ranker.matrix = matrix
+        ranker.idf = idf
+        return ranker
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+        for term in tokenize(text):
+            np.add.at(vector, _features(term), 1)
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def scores(self, query: str) -> np.ndarray:
+        return self.matrix @ self.embed(query)
+
+    def search(self, query: str, k: int = 50) -> List[Record]:
+        return _top(self.records, self.scores(query), k)
+
+
+class HybridRanker:
+    """Reciprocal rank fusion of BM25 and vector rankings."""
+
+    def __init__(self, records: Sequence[Record], bm25: Optional[BM25Ranker] = None, vectors: Optional[VectorRanker] = None) -> None:
+        self.records = records
+        self.bm25 = bm25 or BM25Ranker(records)
+        self.vectors = vectors or VectorRanker(records)
+
+    def scores(self, query: str) -> np.ndarray:
+        fused = np.zeros(len(self.records), dtype=np.float64)
+        for scores in (self.bm25.scores(query), self.vectors.scores(query)):
+            order = np.argsort(-scores, kind="stable")[:FUSION_DEPTH]
+            order = order[scores[order] > 0]
+            fused[order] += 1.0 / (RRF_K + 1 + np.arange(len(order)))
+        return fused
+
+    def search(self, query: str, k: int = 50) -> List[Record]:
+        return _top(self.records, self.scores(query), k)
@@ -0,0 +1,266 @@
+import os
+import pickle
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from folder_index import FolderIndex
+from text_store import TextStore
+from spelling import SpellIndex
+from token_index import TokenIndex, tokenize
+
+FIELDS = ("path", "name", "ext", "version", "text")
+# Everything but the text, written by RecordStore.save
+STORE_FILE = "store.pickle"
+
+
+class RecordStore(Sequence):
+    """Columnar, append-only storage for the document index.
+
+    Instead of one dict per file, each field is a column: directory and extension
+    strings are interned into small lookup tables and referenced by id, names and
+    versions are interned strings, and all document text lives in a memory-mapped
+    TextStore addressed by an offset table. Indexing the store returns a
+    RecordView, which behaves like the old record dict.
+    """
+
+    def __init__(self, texts: Optional[TextStore] = None) -> None:
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._exts: List[str] = []
+        self._ext_ids: Dict[str, int] = {}
+        self._dir_col = array("I")
+        self._ext_col = array("H")
+        self._names: List[str] = []
+        self._names_lower: List[str] = []
+        self._dirs_lower: List[str] = []
+        self._versions: List[str] = []
+        self.texts = texts if texts is not None else TextStore()
+        # Token positions per record, for snippets and phrase queries
+        self.tokens = TokenIndex()
+        # Dictionary of text, name and path terms, for correcting misspelled query words
+        self.spelling = SpellIndex()
+        # Document counts and text bytes per folder, rolled up the tree
+        self.folders = FolderIndex()
+        # Structured tables (e.g. parsed CSVs) by record id
+        self.tables: Dict[int, Any] = {}
+
+    @staticmethod
+    def _intern(value: str, table: List[str], ids: Dict[str, int]) -> int:
+        idx = ids.get(value)
+        if idx is None:
+            idx = len(table)
+            table.append(sys.intern(value))
+            ids[value] = idx
+        return idx
+
+    def append(self, path: str, name: str, ext: str, version: str, text: Union[str, Iterable[str]]) -> int:
+        """Add a record and return its id (its position in the store).
+
+        ``text`` may be an iterable of pieces (e.g. PDF pages), which are streamed
+        into the text store without being joined first.
+        """
+        directory = os.path.dirname(path)
+        dir_id = self._intern(directory, self._dirs, self._dir_ids)
+        if dir_id == len(self._dirs_lower):
+            self._dirs_lower.append(directory.lower())
+        self._dir_col.append(dir_id)
+        self._ext_col.append(self._intern(ext, self._exts, self._ext_ids))
+        self._names.append(sys.intern(name))
+        lower = name.lower()
+        self._names_lower.append(self._names[-1] if lower == name else lower)
+        self._versions.append(sys.intern(version))
+        idx = self.texts.append(text)
+        self.tokens.add(self.texts.text(idx))
+        self.spelling.add(set(self.tokens.doc_terms(idx)) | set(tokenize(path)))
+        self.folders.add(directory, self.texts.nbytes(idx))
+        return len(self._names) - 1
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [RecordView(self, i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("record index out of range")
+        return RecordView(self, idx)
+
+    def __iter__(self) -> Iterator["RecordView"]:
+        for i in range(len(self)):
+            yield RecordView(self, i)
+
+    # Column accessors (no per-record objects involved)
+    def path(self, idx: int) -> str:
+        return os.path.join(self._dirs[self._dir_col[idx]], self._names[idx])
+
+    def path_lower(self, idx: int) -> str:
+        return os.path.join(self._dirs_lower[self._dir_col[idx]], self._names_lower[idx])
+
+    def name_lower(self, idx: int) -> str:
+        return self._names_lower[idx]
+
+    def directory(self, idx: int) -> str:
+        return self._dirs[self._dir_col[idx]]
+
+    def name(self, idx: int) -> str:
+        return self._names[idx]
+
+    def ext(self, idx: int) -> str:
+        return self._exts[self._ext_col[idx]]
+
+    def version(self, idx: int) -> str:
+        return self._versions[idx]
+
+    def text_bytes(self, idx: int) -> memoryview:
+        return self.texts.view(idx)
+
+    def text(self, idx: int) -> str:
+        return self.texts.text(idx)
+
+    def text_contains(self, idx: int, needle: str) -> bool:
+        """Case-insensitive substring test against the mapped text, without decoding it."""
+        return self.texts.contains_lower(idx, needle)
+
+    def field(self, idx: int, key: str):
+        if key == "path":
+            return self.path(idx)
+        if key == "name":
+            return self._names[idx]
+        if key == "ext":
+            return self.ext(idx)
+        if key == "version":
+            return self._versions[idx]
+        if key == "text":
+            return self.text(idx)
+        raise KeyError(key)
+
+    def snapshot(self) -> "RecordSnapshot":
+        """Freeze the records appended so far; later appends are not visible through it."""
+        return RecordSnapshot(self, len(self), dict(self.tables))
+
+    def save(self, directory: str) -> str:
+        """Write the columns, tables and token, spelling and folder indexes to ``directory``; returns the file.
+
+        Text is not included: build the store on a named TextStore and ``seal`` it.
+        """
+        state = {key: value for key, value in self.__dict__.items() if key != "texts"}
+        path = os.path.join(directory, STORE_FILE)
+        with open(path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @classmethod
+    def load(cls, directory: str, text_path: str) -> "RecordStore":
+        """Open a store written by ``save``, mapping its sealed text at ``text_path`` read-only.
+
+        This unpickles the file, so only load directories you built or verified.
+        """
+        store = cls.__new__(cls)
+        with open(os.path.join(directory, STORE_FILE), "rb") as f:
+            store.__dict__.update(pickle.load(f))
+        store.texts = TextStore.open(text_path)
+        return store
+
+    def nbytes(self) -> int:
+        """Approximate heap memory held by the columns and token index; mapped text is not counted."""
+        tables = sum(sys.getsizeof(s) for s in self._dirs) + sum(sys.getsizeof(s) for s in self._exts)
+        tables += sum(sys.getsizeof(s) for s in self._dirs_lower)
+        strings = sum(sys.getsizeof(s) for s in self._names) + sum(sys.getsizeof(s) for s in set(self._versions))
+        strings += sum(sys.getsizeof(lo) for lo, n in zip(self._names_lower, self._names) if lo is not n)
+        columns = sum(a.itemsize * len(a) for a in (self._dir_col, self._ext_col))
+        offsets = 9 * len(self) + 8
+        lists = sys.getsizeof(self._names) + sys.getsizeof(self._names_lower) + sys.getsizeof(self._versions)
+        return tables + strings + columns + offsets + lists + self.tokens.nbytes()
+
+
+class RecordSnapshot(Sequence):
+    """Read-only prefix of a RecordStore that is still being appended to.
+
+    The store only grows, so the first ``count`` records never change; a
+    snapshot exposes exactly those, plus a copy of their tables taken at the same
+    moment. Snapshots must be created on the thread that appends to the store.
+    """
+
+    def __init__(self, store: RecordStore, count: int, tables: Dict[int, Any]) -> None:
+        self.store = store
+        self.count = count
+        self.tables = tables
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [RecordView(self.store, i) for i in range(*idx.indices(self.count))]
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError("record index out of range")
+        return RecordView(self.store, idx)
+
+    def __iter__(self) -> Iterator["RecordView"]:
+        for i in range(self.count):
+            yield RecordView(self.store, i)
+
+
+class RecordView(Mapping):
+    """Dict-style view of one record in a RecordStore.
+
+    Supports ``r["path"]``, ``r.get("text", "")`` and iteration over keys, so code
+    written against the old list-of-dicts index keeps working. Stored fields are
+    read from the columns on access; text is decoded only when asked for.
+    ``r.copy()`` returns a new view, and assigning keys on it (e.g. ``score``)
+    keeps them on that view without touching the store.
+    """
+
+    __slots__ = ("_store", "_idx", "_extra")
+
+    def __init__(self, store: RecordStore, idx: int, extra: Optional[Dict[str, Any]] = None) -> None:
+        self._store = store
+        self._idx = idx
+        self._extra = extra
+
+    @property
+    def id(self) -> int:
+        return self._idx
+
+    @property
+    def store(self) -> RecordStore:
+        return self._store
+
+    def __getitem__(self, key: str):
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        return self._store.field(self._idx, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __iter__(self) -> Iterator[str]:
+        yield from FIELDS
+        if self._extra:
+            yield from (k for k in self._extra if k not in FIELDS)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key) -> bool:
+        return key in FIELDS or bool(self._extra and key in self._extra)
+
+    def copy(self) -> "RecordView":
+        return RecordView(self._store, self._idx, dict(self._extra) if self._extra else None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
+
+    def text_contains(self, needle: str) -> bool:
+        return self._store.text_contains(self._idx, needle)
+
+    def __repr__(self) -> str:
+        return f"RecordView({self._idx}, path={self._store.path(self._idx)!r})"
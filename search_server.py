@@ -0,0 +1,403 @@
+"""Local search service: holds the index once and answers search requests over HTTP.
+
+Run ``python search_server.py --root sample_data --port 8790`` and point app
+replicas at it with ``APOCRYPHA_SEARCH_URL=http://127.0.0.1:8790``. With
+``--index-dir`` (or ``APOCRYPHA_INDEX_DIR``) the shard processes load a prebuilt
+index from ``python cli.py build-index`` instead of scanning.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from document_search import (
+    apply_corrections, extract_node_ids_from_paths, find_corrections, make_snippets, scan_dummy_data, search_facets,
+    spelling_for,
+)
+from folder_index import DirectorySnapshot
+import index_artifact
+from index_worker import list_shards
+from record_store import RecordStore
+
+DEFAULT_PORT = 8790
+SEARCH_URL = os.environ.get("APOCRYPHA_SEARCH_URL", "")
+
+# Fields returned for each hit; text is only included when asked for
+HIT_FIELDS = ("path", "name", "ext", "version", "score", "snippets")
+
+
+def _hit(record, with_text: bool) -> Dict[str, Any]:
+    hit = {key: record[key] for key in HIT_FIELDS if key in record}
+    if with_text:
+        hit["text"] = record.get("text", "")
+    return hit
+
+
+def _resolve_context(records, context: Sequence[Tuple[Optional[str], List[str]]]) -> list:
+    # Imported here: chat_pipeline pulls in the answer cache, which shard processes don't need otherwise
+    from chat_pipeline import resolve_context_docs
+    return resolve_context_docs(records, [(segment, files) for segment, files in context])
+
+
+def _shard_main(conn, root: str, store_dir: Optional[str] = None) -> None:
+    """Shard process: index one tenant root (or load its prebuilt store), then answer batched requests from the pipe."""
+    if store_dir:
+        records = RecordStore.load(store_dir, os.path.join(store_dir, index_artifact.TEXT_FILE))
+    else:
+        records = scan_dummy_data(root=root)
+    by_path = {r["path"]: r for r in records}
+    # Every walked file becomes a record, so their paths are the directory snapshot
+    directory = DirectorySnapshot(by_path)
+    spelling = spelling_for(records)
+    conn.send(("ready", len(records)))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        op, payload = message
+        try:
+            if op == "search":
+                result = [
+                    ([_hit(r, payload["with_text"]) for r in hits], folders)
+                    for hits, folders in search_facets(
+                        payload["queries"], records, k=payload["k"], snippets=payload["snippets"],
+                        min_score=payload["min_score"],
+                    )
+                ]
+            elif op == "resolve":
+                result = [_hit(r, payload["with_text"]) for r in _resolve_context(records, payload["context"])]
+            elif op == "files":
+                result = directory.files(payload["folder"], recursive=payload["recursive"])
+            elif op == "correct":
+                corrections, known = find_corrections(payload["query"], spelling)
+                result = {"corrections": corrections, "known": known}
+            elif op == "snippets":
+                result = {
+                    p: make_snippets(by_path[p], payload["query"], count=payload["count"])
+                    for p in payload["paths"] if p in by_path
+                }
+            else:
+                raise ValueError(f"unknown operation: {op}")
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ShardUnavailable(RuntimeError):
+    """A shard process died; it is being restarted and the request should be retried."""
+
+    def __init__(self, shard: str) -> None:
+        super().__init__(f"shard {shard} is unavailable (its process exited); restarting it")
+        self.shard = shard
+
+
+class ShardProcess:
+    """One tenant shard indexed and searched in its own process, so shards use separate cores.
+
+    If the process dies, the call that notices raises ``ShardUnavailable`` and a
+    replacement process is started, which re-indexes (or reloads) the shard.
+    """
+
+    def __init__(self, name: str, root: str, store_dir: Optional[str] = None) -> None:
+        self.name = name
+        self.root = root
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self._spawn()
+
+    def _spawn(self) -> None:
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_shard_main, args=(child, self.root, self.store_dir), name=f"shard-{self.name}", daemon=True,
+        )
+        self._process.start()
+        child.close()
+        self.size: Optional[int] = None
+
+    def _restart(self) -> ShardUnavailable:
+        """Replace the dead process (called with the lock held) and return the error for the caller to raise."""
+        self._conn.close()
+        self._process.join(timeout=1)
+        self.restarts += 1
+        self._spawn()
+        return ShardUnavailable(self.name)
+
+    def _wait_ready_locked(self) -> int:
+        if self.size is None:
+            try:
+                _, self.size = self._conn.recv()
+            except (EOFError, OSError):
+                raise self._restart() from None
+        return self.size
+
+    def wait_ready(self) -> int:
+        with self._lock:
+            return self._wait_ready_locked()
+
+    def call(self, op: str, payload: Dict[str, Any]):
+        with self._lock:
+            self._wait_ready_locked()
+            try:
+                self._conn.send((op, payload))
+                status, result = self._conn.recv()
+            except (EOFError, OSError):
+                # BrokenPipeError and ConnectionResetError are OSErrors
+                raise self._restart() from None
+        if status != "ok":
+            raise RuntimeError(f"shard {self.name}: {result}")
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self._process.join(timeout=5)
+
+
+class SearchService:
+    """Fans batched requests out to one process per shard and merges the results."""
+
+    def __init__(self, root: str = "sample_data", index_dir: Optional[str] = None) -> None:
+        """``index_dir`` is a ``build-index`` artifact; it is verified once here, and its shards are loaded, not scanned."""
+        self.root = root
+        prebuilt: Dict[str, str] = {}
+        if index_dir:
+            build_dir = index_artifact.resolve(index_dir)
+            manifest = index_artifact.verify_build(build_dir, full=index_artifact.VERIFY_FULL)
+            prebuilt = {name: os.path.join(build_dir, name) for name in manifest["shards"]}
+        names = sorted(set(list_shards(root)) | set(prebuilt))
+        self.shards = {name: ShardProcess(name, os.path.join(root, name), prebuilt.get(name)) for name in names}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.shards)))
+
+    def _targets(self, shard: Optional[str]) -> List[ShardProcess]:
+        if shard is None:
+            return list(self.shards.values())
+        if shard not in self.shards:
+            raise KeyError(f"unknown shard: {shard}")
+        return [self.shards[shard]]
+
+    def _fan_out(self, shard: Optional[str], op: str, payload: Dict[str, Any]) -> list:
+        targets = self._targets(shard)
+        return list(self._pool.map(lambda s: s.call(op, payload), targets))
+
+    def search_facets(
+        self, queries: List[str], shard: Optional[str] = None, k: int = 50, with_text: bool = False, snippets: int = 0,
+        min_score: float = 0.0,
+    ) -> List[Tuple[List[Dict[str, Any]], Dict[str, int]]]:
+        """(hits, per-folder hit counts) per query, in input order; hits from several shards are merged by score."""
+        payload = {"queries": queries, "k": k, "with_text": with_text, "snippets": snippets, "min_score": min_score}
+        per_shard = self._fan_out(shard, "search", payload)
+        merged = []
+        for i in range(len(queries)):
+            hits = [hit for shard_results in per_shard for hit in shard_results[i][0]]
+            hits.sort(key=lambda h: h["score"], reverse=True)
+            # Shards hold disjoint documents, so counts of shared ancestor folders add up
+            folders: Dict[str, int] = {}
+            for shard_results in per_shard:
+                for folder, count in shard_results[i][1].items():
+                    folders[folder] = folders.get(folder, 0) + count
+            merged.append((hits[:k], folders))
+        return merged
+
+    def search_many(
+        self, queries: List[str], shard: Optional[str] = None, k: int = 50, with_text: bool = False, snippets: int = 0,
+    ) -> List[List[Dict[str, Any]]]:
+        """Results per query, in input order; hits from several shards are merged by score."""
+        return [hits for hits, _ in self.search_facets(queries, shard=shard, k=k, with_text=with_text, snippets=snippets)]
+
+    def resolve(self, context, shard: Optional[str] = None, with_text: bool = True) -> List[Dict[str, Any]]:
+        """Records for the files of selected board nodes (see ``chat_pipeline.resolve_context_docs``)."""
+        per_shard = self._fan_out(shard, "resolve", {"context": context, "with_text": with_text})
+        return [hit for hits in per_shard for hit in hits]
+
+    def correct(self, query: str, shard: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+        """Spell-correct ``query`` (see ``document_search.correct_query``).
+
+        A word is only corrected if no shard knows it as typed.
+        """
+        per_shard = self._fan_out(shard, "correct", {"query": query})
+        known = {word for part in per_shard for word in part["known"]}
+        corrections: Dict[str, str] = {}
+        for part in per_shard:
+            for typed, fixed in part["corrections"].items():
+                if typed not in known:
+                    corrections.setdefault(typed, fixed)
+        return apply_corrections(query, corrections), corrections
+
+    def files(self, folder: str, shard: Optional[str] = None, recursive: bool = False) -> List[str]:
+        """Files under ``folder`` relative to it, from the shards' directory snapshots (no filesystem access)."""
+        payload = {"folder": folder, "recursive": recursive}
+        return [f for part in self._fan_out(shard, "files", payload) for f in part]
+
+    def snippets(self, query: str, paths: List[str], shard: Optional[str] = None, count: int = 2) -> Dict[str, List[Dict[str, Any]]]:
+        """Best-matching snippets per path (see ``document_search.make_snippets``)."""
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for part in self._fan_out(shard, "snippets", {"query": query, "paths": paths, "count": count}):
+            result.update(part)
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        """Documents per shard ("restarting" for a shard whose process just died) and restart counts."""
+        shards: Dict[str, Any] = {}
+        for name, s in self.shards.items():
+            try:
+                shards[name] = s.wait_ready()
+            except ShardUnavailable:
+                shards[name] = "restarting"
+        return {"shards": shards, "restarts": {name: s.restarts for name, s in self.shards.items() if s.restarts}}
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            shard.close()
+        self._pool.shutdown()
+
+
+def _make_handler(service: SearchService):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: Any) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                self._reply(200, service.health())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                req = json.loads(self.rfile.read(length) or b"{}")
+                shard = req.get("shard")
+                if self.path == "/search":
+                    results = service.search_facets(
+                        req["queries"], shard=shard, k=int(req.get("k", 50)), with_text=bool(req.get("with_text")),
+                        snippets=int(req.get("snippets", 0)), min_score=float(req.get("min_score", 0.0)),
+                    )
+                    body = {"results": [hits for hits, _ in results]}
+                    if req.get("facets"):
+                        body["facets"] = [folders for _, folders in results]
+                elif self.path == "/resolve":
+                    body = {"docs": service.resolve(req["context"], shard=shard, with_text=req.get("with_text", True))}
+                elif self.path == "/files":
+                    body = {"files": service.files(req["folder"], shard=shard, recursive=bool(req.get("recursive")))}
+                elif self.path == "/correct":
+                    query, corrections = service.correct(req["query"], shard=shard)
+                    body = {"query": query, "corrections": corrections}
+                elif self.path == "/snippets":
+                    body = {"snippets": service.snippets(req["query"], req["paths"], shard=shard, count=int(req.get("count", 2)))}
+                elif self.path == "/nodes":
+                    body = {"node_ids": extract_node_ids_from_paths(req["paths"], industry=req.get("industry", "fnb"))}
+                else:
+                    self._reply(404, {"error": "not found"})
+                    return
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+                return
+            except ShardUnavailable as e:
+                self._reply(503, {"error": str(e), "shard": e.shard})
+                return
+            except RuntimeError as e:
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return Handler
+
+
+class SearchClient:
+    """Thin client for a running search server; mirrors ``SearchService``'s methods."""
+
+    def __init__(self, url: str = SEARCH_URL, timeout: float = 30.0) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, route: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        req = urllib.request.Request(
+            f"{self.url}{route}",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read())
+
+    def search_many(
+        self, queries: List[str], shard: Optional[str] = None, k: int = 50, with_text: bool = False, snippets: int = 0,
+    ) -> List[List[Dict[str, Any]]]:
+        body = {"queries": queries, "shard": shard, "k": k, "with_text": with_text, "snippets": snippets}
+        return self._post("/search", body)["results"]
+
+    def search(
+        self, query: str, shard: Optional[str] = None, k: int = 50, with_text: bool = False, snippets: int = 0,
+    ) -> List[Dict[str, Any]]:
+        return self.search_many([query], shard=shard, k=k, with_text=with_text, snippets=snippets)[0]
+
+    def search_facets(
+        self, query: str, shard: Optional[str] = None, k: int = 50, with_text: bool = False, snippets: int = 0,
+        min_score: float = 0.0,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """One query's hits plus its per-folder hit counts (see ``document_search.search_facets``)."""
+        body = {
+            "queries": [query], "shard": shard, "k": k, "with_text": with_text, "snippets": snippets,
+            "min_score": min_score, "facets": True,
+        }
+        reply = self._post("/search", body)
+        return reply["results"][0], reply["facets"][0]
+
+    def resolve(self, context, shard: Optional[str] = None, with_text: bool = True) -> List[Dict[str, Any]]:
+        return self._post("/resolve", {"context": context, "shard": shard, "with_text": with_text})["docs"]
+
+    def files(self, folder: str, shard: Optional[str] = None, recursive: bool = False) -> List[str]:
+        return self._post("/files", {"folder": folder, "shard": shard, "recursive": recursive})["files"]
+
+    def correct(self, query: str, shard: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+        body = self._post("/correct", {"query": query, "shard": shard})
+        return body["query"], body["corrections"]
+
+    def snippets(self, query: str, paths: List[str], shard: Optional[str] = None, count: int = 2) -> Dict[str, List[Dict[str, Any]]]:
+        return self._post("/snippets", {"query": query, "paths": paths, "shard": shard, "count": count})["snippets"]
+
+    def node_ids(self, paths: List[str], industry: str = "fnb") -> List[str]:
+        return self._post("/nodes", {"paths": paths, "industry": industry})["node_ids"]
+
+
+def serve(root: str = "sample_data", host: str = "127.0.0.1", port: int = DEFAULT_PORT, index_dir: Optional[str] = None) -> None:
+    service = SearchService(root, index_dir)
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"Indexed shards: {service.health()['shards']}")
+    print(f"Serving search on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve document search over local HTTP.")
+    parser.add_argument("--root", default="sample_data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--index-dir", default=index_artifact.INDEX_DIR, help="prebuilt index from cli.py build-index")
+    args = parser.parse_args()
+    serve(args.root, args.host, args.port, args.index_dir)
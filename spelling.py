@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Only words this long are corrected; shorter ones have too many neighbours to guess safely
+MIN_WORD_LENGTH = 5
+# Deletes are generated from this many leading characters (SymSpell's prefix trick keeps the index small)
+PREFIX_LENGTH = 7
+
+
+def max_distance_for(word: str) -> int:
+    return 1 if len(word) < 8 else 2
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    """Every string reachable from ``word`` by deleting up to ``distance`` characters."""
+    result = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count once); ``limit + 1`` if above ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class SpellIndex:
+    """Term dictionary with a SymSpell-style deletion index, built while documents are indexed.
+
+    Every term is stored under each string obtained by deleting up to two
+    characters from its prefix. A misspelled word is looked up by generating its
+    own deletes and checking only the terms filed under them, so a correction
+    costs a few dict lookups and edit-distance checks on a handful of
+    candidates, independent of corpus size.
+    """
+
+    def __init__(self, max_distance: int = 2) -> None:
+        self.max_distance = max_distance
+        # term -> number of documents containing it, used to break ties between candidates
+        self.counts: Dict[str, int] = {}
+        self._deletes: Dict[str, List[str]] = {}
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.counts
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, terms: Iterable[str]) -> None:
+        """Count one document's distinct terms, filing new ones in the deletion index."""
+        for term in terms:
+            if len(term) < MIN_WORD_LENGTH - self.max_distance or not term.isalpha():
+                continue
+            count = self.counts.get(term)
+            # Counted before it is filed: a lookup on another thread may find it under any of its deletes
+            self.counts[term] = (count or 0) + 1
+            if count is None:
+                for key in _deletes(term[:PREFIX_LENGTH], self.max_distance):
+                    self._deletes.setdefault(key, []).append(term)
+
+    def lookup(self, word: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """The closest known term to ``word`` as (term, distance), preferring common terms; None if nothing is close."""
+        limit = min(self.max_distance, max_distance if max_distance is not None else self.max_distance)
+        if word in self.counts:
+            return word, 0
+        best: Optional[Tuple[int, int, str]] = None
+        seen: Set[str] = set()
+        for key in _deletes(word[:PREFIX_LENGTH], limit):
+            for term in self._deletes.get(key, ()):
+                if term in seen:
+                    continue
+                seen.add(term)
+                distance = edit_distance(word, term, limit)
+                if distance <= limit:
+                    candidate = (distance, -self.counts[term], term)
+                    if best is None or candidate < best:
+                        best = candidate
+        if best is None:
+            return None
+        return best[2], best[0]
+
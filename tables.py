@@ -0,0 +1,217 @@
+import csv
+import io
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Unquoted thousands separators ("$450,000,000") split one value across several CSV fields
+_LEADING_GROUP = re.compile(r"^[+-]?\$?\d{1,3}(,\d{3})*$")
+_TRAILING_GROUP = re.compile(r"^\d{3}(\.\d+)?%?$")
+_NUMBER = re.compile(r"^[+-]?\$?[+-]?\d[\d,]*(\.\d+)?%?$|^[+-]?\$?\.\d+%?$")
+
+OPERATIONS = {
+    "sum": ("total", "sum", "how much", "combined", "altogether", "spend", "spent"),
+    "avg": ("average", "avg", "mean", "typical"),
+    "max": ("highest", "largest", "maximum", "max", "most", "biggest", "top"),
+    "min": ("lowest", "smallest", "minimum", "min", "least", "cheapest"),
+    "count": ("how many", "count", "number of"),
+}
+
+
+def parse_number(value: str) -> Optional[float]:
+    """Parse values like ``1,200``, ``$45.00``, ``8.5%`` or ``+98%``; None if not numeric."""
+    v = value.strip()
+    if not v or not _NUMBER.match(v):
+        return None
+    try:
+        return float(v.replace("$", "").replace(",", "").replace("%", "").replace("+", ""))
+    except ValueError:
+        return None
+
+
+def _repair_row(row: List[str], width: int) -> List[str]:
+    """Re-join numbers that were split on their thousands separators."""
+    row = list(row)
+    i = 0
+    while len(row) > width and i < len(row) - 1:
+        if _LEADING_GROUP.match(row[i].strip()) and _TRAILING_GROUP.match(row[i + 1].strip()):
+            row[i:i + 2] = [f"{row[i]},{row[i + 1]}"]
+            continue
+        i += 1
+    if len(row) > width:
+        row[width - 1:] = [",".join(row[width - 1:])]
+    return row + [""] * (width - len(row))
+
+
+class Table:
+    """A CSV parsed into typed columns.
+
+    Numeric columns are float64 arrays (NaN for blanks); other columns are
+    string arrays, with a lowercased copy in ``text_lower`` for filtering. Aggregations run as
+    vectorized NumPy operations over boolean row masks.
+    """
+
+    def __init__(self, columns: List[str], rows: Sequence[Sequence[str]], name: str = "") -> None:
+        self.name = name
+        self.columns = columns
+        self.n_rows = len(rows)
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.text: Dict[str, np.ndarray] = {}
+        self.text_lower: Dict[str, np.ndarray] = {}
+        for j, col in enumerate(columns):
+            raw = [r[j] for r in rows]
+            parsed = [parse_number(v) for v in raw]
+            filled = [p for p, v in zip(parsed, raw) if v.strip()]
+            if filled and all(p is not None for p in filled):
+                self.numeric[col] = np.array([np.nan if p is None else p for p in parsed], dtype=np.float64)
+            else:
+                values = np.array([v.strip() for v in raw], dtype=str)
+                self.text[col] = values
+                self.text_lower[col] = np.char.lower(values)
+
+    @classmethod
+    def from_csv(cls, text: str, name: str = "") -> Optional["Table"]:
+        rows = [r for r in csv.reader(io.StringIO(text)) if any(c.strip() for c in r)]
+        if len(rows) < 2:
+            return None
+        header = [h.strip() for h in rows[0]]
+        width = len(header)
+        return cls(header, [_repair_row(r, width) for r in rows[1:]], name=name)
+
+    def mask(self, filters: Optional[Dict[str, str]] = None) -> np.ndarray:
+        """Rows whose text columns equal the given values (case-insensitive)."""
+        m = np.ones(self.n_rows, dtype=bool)
+        for col, value in (filters or {}).items():
+            if col in self.text_lower:
+                m &= self.text_lower[col] == value.lower()
+        return m
+
+    def aggregate(
+        self,
+        column: Optional[str],
+        op: str,
+        filters: Optional[Dict[str, str]] = None,
+        group_by: Optional[str] = None,
+    ):
+        """Apply sum/avg/min/max/count to a numeric column, optionally filtered and grouped.
+
+        Returns a float, or a dict of group value -> float when grouping.
+        """
+        m = self.mask(filters)
+        if group_by and group_by in self.text:
+            keys = self.text[group_by]
+            return {
+                str(key): self._reduce(column, op, m & (keys == key))
+                for key in np.unique(keys[m])
+            }
+        return self._reduce(column, op, m)
+
+    def _reduce(self, column: Optional[str], op: str, m: np.ndarray) -> float:
+        if op == "count" or column is None:
+            return float(np.count_nonzero(m))
+        values = self.numeric[column][m]
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return float("nan")
+        if op == "sum":
+            return float(values.sum())
+        if op == "avg":
+            return float(values.mean())
+        if op == "max":
+            return float(values.max())
+        if op == "min":
+            return float(values.min())
+        raise ValueError(f"unknown aggregation: {op}")
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.numeric.values()) + sum(
+            a.nbytes + self.text_lower[c].nbytes for c, a in self.text.items()
+        )
+
+
+def describe_tables(tables: Sequence[Table]) -> str:
+    """Searchable description of tables: name, columns, row count and the distinct text values."""
+    lines = []
+    for table in tables:
+        lines.append(f"{table.name}: {', '.join(table.columns)} ({table.n_rows} rows)")
+        values = {str(v) for col in table.text.values() for v in col if str(v)}
+        if values:
+            lines.append(" | ".join(sorted(values)))
+    return "\n".join(lines)
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def detect_operation(question: str) -> Optional[str]:
+    q = f" {question.lower()} "
+    for op, cues in OPERATIONS.items():
+        if any(f" {cue} " in q or f" {cue}s " in q for cue in cues):
+            return op
+    return None
+
+
+def is_numeric_question(question: str) -> bool:
+    return detect_operation(question) is not None
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+def plan_query(table: Table, question: str) -> Tuple[str, List[str], Dict[str, str], Optional[str]]:
+    """Work out (operation, numeric columns, filters, group-by column) for a question over one table."""
+    op = detect_operation(question) or "sum"
+    q_words = {_stem(w) for w in _words(question)}
+    q_lower = f" {' '.join(_words(question))} "
+
+    # Prefer the numeric columns sharing the most words with the question; fall back to all of them
+    overlap = {c: len(q_words & {_stem(w) for w in _words(c.replace("_", " "))}) for c in table.numeric}
+    best = max(overlap.values(), default=0)
+    columns = [c for c, n in overlap.items() if n == best] if best else list(table.numeric)
+
+    group_by = None
+    m = re.search(r"\b(?:by|per|for each)\s+([a-z_ ]+)", question.lower())
+    if m:
+        target = {_stem(w) for w in _words(m.group(1))[:2]}
+        for col in table.text:
+            if target & {_stem(w) for w in _words(col.replace("_", " "))}:
+                group_by = col
+                break
+
+    filters: Dict[str, str] = {}
+    for col in table.text:
+        if col == group_by:
+            continue
+        for value in np.unique(table.text_lower[col]):
+            if len(value) > 1 and f" {' '.join(_words(value))} " in q_lower:
+                filters[col] = str(value)
+                break
+    return op, columns, filters, group_by
+
+
+def _fmt(value: float) -> str:
+    if value != value:  # NaN
+        return "n/a"
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+
+def summarize_for_question(table: Table, question: str) -> str:
+    """Compute the aggregates a question asks for and describe them in a few lines of text."""
+    op, columns, filters, group_by = plan_query(table, question)
+    rows = int(np.count_nonzero(table.mask(filters)))
+    where = f" where {', '.join(f'{c} = {v}' for c, v in filters.items())}" if filters else ""
+    lines = [f"Columns: {', '.join(table.columns)} ({table.n_rows} rows; {rows} matching{where})"]
+    if op == "count" and not group_by:
+        lines.append(f"count = {rows}")
+        return "\n".join(lines)
+    for col in columns:
+        result = table.aggregate(col, op, filters=filters, group_by=group_by)
+        if isinstance(result, dict):
+            parts = ", ".join(f"{k}: {_fmt(v)}" for k, v in result.items())
+            lines.append(f"{op}({col}) by {group_by}: {parts}")
+        else:
+            lines.append(f"{op}({col}) = {_fmt(result)}")
+    return "\n".join(lines)
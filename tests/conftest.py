@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from record_store import RecordStore  # noqa: E402
+
+# (path, text) of a small corpus laid out like sample_data
+DOCS = [
+    ("sample_data/Legal_Firm/Litigation/smith_v_megacorp.txt",
+     "Smith v MegaCorp: the court ruled on the patent dispute. Damages were set at 2,500,000 dollars."),
+    ("sample_data/Legal_Firm/Contracts/supply_contract.txt",
+     "Supply contract between Acme and MegaCorp. Payment is due within 30 days of the invoice."),
+    ("sample_data/Finance_Firm/Accounting/west_expenses.txt",
+     "West group travel expenses for Q1. The travel report lists hotel and flight costs."),
+    ("sample_data/Finance_Firm/Accounting/east_payroll.txt",
+     "East accounting payroll summary. Salaries and travel allowances for March."),
+    ("sample_data/Restaurant_Franchise/Operations/central_permits.txt",
+     "Central region permits for new restaurants. Health inspection report attached."),
+]
+
+
+def build_store(docs=DOCS, texts=None) -> RecordStore:
+    store = RecordStore(texts)
+    for path, text in docs:
+        name = os.path.basename(path)
+        store.append(path, name, name.rsplit(".", 1)[-1], "1-0", text)
+    store.texts.seal()
+    return store
+
+
+@pytest.fixture
+def store() -> RecordStore:
+    return build_store()
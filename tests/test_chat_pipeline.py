@@ -0,0 +1,128 @@
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+from answer_cache import AnswerCache
+from chat_pipeline import ChatRequest, PipelineRunner, StubChatClient, run_chat_pipeline
+
+
+class RecordingClient(StubChatClient):
+    """Stub that notes when a model request starts and whether it or an embedding request was cancelled."""
+
+    def __init__(self, delay: float, embed_delay: float = 0) -> None:
+        super().__init__(delay)
+        self.embed_delay = embed_delay
+        self.started = concurrent.futures.Future()
+        self.cancelled = concurrent.futures.Future()
+        self.embed_cancelled = concurrent.futures.Future()
+
+    async def _embed(self, model, input, **kwargs):
+        try:
+            await asyncio.sleep(self.embed_delay)
+            return await super()._embed(model, input, **kwargs)
+        except asyncio.CancelledError:
+            self.embed_cancelled.set_result(True)
+            raise
+
+    async def _complete(self, model, messages, **kwargs):
+        self.started.set_result(True)
+        try:
+            return await super()._complete(model, messages, **kwargs)
+        except asyncio.CancelledError:
+            self.cancelled.set_result(True)
+            raise
+
+
+def make_request(store, prompt="smith megacorp patent dispute", history=None) -> ChatRequest:
+    history = history if history is not None else [{"role": "user", "content": prompt}]
+    return ChatRequest(prompt=prompt, model="gpt-test", records=store, history=history, industry="Legal_Firm")
+
+
+@pytest.fixture(scope="module")
+def runner() -> PipelineRunner:
+    return PipelineRunner()
+
+
+def test_new_prompt_cancels_in_flight_turn(store, runner):
+    slow = RecordingClient(delay=30)
+    first = runner.submit(run_chat_pipeline(make_request(store), slow))
+    assert slow.started.result(timeout=10)
+
+    # What the app does when a new prompt arrives while a turn is running
+    first.cancel()
+    second = runner.submit(run_chat_pipeline(make_request(store, "west travel expenses"), StubChatClient(delay=0)))
+
+    assert slow.cancelled.result(timeout=5)
+    assert first.cancelled()
+    assert "west travel expenses" in second.result(timeout=10).answer
+
+
+def test_reports_per_stage_timings(store, runner, tmp_path):
+    started = time.perf_counter()
+    result = runner.submit(run_chat_pipeline(
+        make_request(store), StubChatClient(delay=0.05), AnswerCache(str(tmp_path / "answers.sqlite3")),
+    )).result(timeout=10)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    assert {"retrieve", "highlights", "cache", "prompt", "llm", "total"} <= set(result.timings)
+    assert all(ms >= 0 for ms in result.timings.values())
+    assert result.timings["llm"] >= 50
+    assert result.timings["total"] >= result.timings["llm"]
+    assert result.timings["total"] <= elapsed
+
+
+def test_cached_answer_skips_the_model(store, runner, tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    client = StubChatClient(delay=0.01)
+    first = runner.submit(run_chat_pipeline(make_request(store), client, cache)).result(timeout=10)
+    second = runner.submit(run_chat_pipeline(make_request(store), client, cache)).result(timeout=10)
+
+    assert not first.cached and "llm" in first.timings
+    assert second.cached and "llm" not in second.timings
+    assert second.answer == first.answer
+
+    # The same prompt after different earlier messages is a new question
+    history = [{"role": "user", "content": "who is the plaintiff?"}, {"role": "assistant", "content": "Smith."}]
+    third = runner.submit(run_chat_pipeline(
+        make_request(store, history=history + [{"role": "user", "content": "smith megacorp patent dispute"}]), client, cache,
+    )).result(timeout=10)
+    assert not third.cached
+
+
+def test_reworded_prompt_hits_the_cache(store, runner, tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    client = StubChatClient(delay=0)
+    first = runner.submit(run_chat_pipeline(make_request(store), client, cache)).result(timeout=10)
+    again = runner.submit(run_chat_pipeline(
+        make_request(store, "Smith  MegaCorp patent dispute?"), client, cache,
+    )).result(timeout=10)
+    assert again.cached and again.answer == first.answer
+
+
+def test_semantic_near_duplicate_hits_the_cache(store, runner, tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    client = StubChatClient(delay=0)
+    first = runner.submit(run_chat_pipeline(make_request(store), client, cache, semantic=True)).result(timeout=10)
+    near = runner.submit(run_chat_pipeline(
+        make_request(store, "smith megacorp patent disputes"), client, cache, semantic=True,
+    )).result(timeout=10)
+    assert [d["path"] for d in near.relevant_docs] == [d["path"] for d in first.relevant_docs]
+    assert near.cached and near.answer == first.answer
+    # Without the embedding lookup the same prompt is a miss
+    other = AnswerCache(str(tmp_path / "other.sqlite3"))
+    runner.submit(run_chat_pipeline(make_request(store), client, other)).result(timeout=10)
+    assert not runner.submit(run_chat_pipeline(
+        make_request(store, "smith megacorp patent disputes"), client, other,
+    )).result(timeout=10).cached
+
+
+def test_cache_hit_cancels_the_embedding(store, runner, tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    runner.submit(run_chat_pipeline(make_request(store), StubChatClient(delay=0), cache)).result(timeout=10)
+
+    client = RecordingClient(delay=0, embed_delay=30)
+    result = runner.submit(run_chat_pipeline(make_request(store), client, cache, semantic=True)).result(timeout=10)
+    assert result.cached
+    assert client.embed_cancelled.result(timeout=5)
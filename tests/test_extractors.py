@@ -0,0 +1,124 @@
+import zipfile
+
+from document_search import scan_dummy_data
+from extraction_cache import ExtractionCache
+from extractors import SHEET_MARKER, get_extractor, split_sheets
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+S = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PR = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+NO_LIMIT = 2 ** 31
+
+
+def write_zip(path, parts):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, xml in parts.items():
+            zf.writestr(name, xml)
+    return str(path)
+
+
+def make_docx(path, paragraphs):
+    # A paragraph may be split into several runs, as Word does around formatting changes
+    body = "".join(
+        f"<w:p>{''.join(f'<w:r><w:t>{run}</w:t></w:r>' for run in runs)}</w:p>" for runs in paragraphs
+    )
+    return write_zip(path, {"word/document.xml": f'<w:document xmlns:w="{W}"><w:body>{body}</w:body></w:document>'})
+
+
+def make_pptx(path, slides):
+    parts = {}
+    for n, lines in slides.items():
+        paras = "".join(f"<a:p><a:r><a:t>{line}</a:t></a:r></a:p>" for line in lines)
+        parts[f"ppt/slides/slide{n}.xml"] = (
+            f'<p:sld xmlns:p="{P}" xmlns:a="{A}"><p:cSld><p:spTree><p:sp><p:txBody>{paras}'
+            "</p:txBody></p:sp></p:spTree></p:cSld></p:sld>"
+        )
+    return write_zip(path, parts)
+
+
+def make_xlsx(path, sheets):
+    """``sheets`` maps sheet names to rows; strings go to the shared string table, numbers inline."""
+    shared, parts, entries, rels = [], {}, [], []
+    for n, (name, rows) in enumerate(sheets.items(), 1):
+        xml_rows = []
+        for r, row in enumerate(rows, 1):
+            cells = []
+            for c, value in enumerate(row):
+                ref = f"{chr(65 + c)}{r}"
+                if isinstance(value, str):
+                    shared.append(value)
+                    cells.append(f'<c r="{ref}" t="s"><v>{len(shared) - 1}</v></c>')
+                else:
+                    cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            xml_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+        parts[f"xl/worksheets/sheet{n}.xml"] = f'<worksheet xmlns="{S}"><sheetData>{"".join(xml_rows)}</sheetData></worksheet>'
+        entries.append(f'<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>')
+        rels.append(f'<Relationship Id="rId{n}" Target="worksheets/sheet{n}.xml" Type="{R}/worksheet"/>')
+    parts["xl/workbook.xml"] = f'<workbook xmlns="{S}" xmlns:r="{R}"><sheets>{"".join(entries)}</sheets></workbook>'
+    parts["xl/_rels/workbook.xml.rels"] = f'<Relationships xmlns="{PR}">{"".join(rels)}</Relationships>'
+    strings = "".join(f"<si><t>{s}</t></si>" for s in shared)
+    parts["xl/sharedStrings.xml"] = f'<sst xmlns="{S}">{strings}</sst>'
+    return write_zip(path, parts)
+
+
+def extract(path, ext, max_pages=NO_LIMIT, max_bytes=NO_LIMIT):
+    return list(get_extractor(ext)(path, max_pages, max_bytes))
+
+
+def test_docx_paragraphs(tmp_path):
+    path = make_docx(tmp_path / "memo.docx", [["Quarterly ", "legal review"], [], ["Second paragraph"]])
+    assert extract(path, "docx") == ["Quarterly legal review\n", "Second paragraph\n"]
+    assert get_extractor("DOCX") is get_extractor("docx")
+
+
+def test_docx_byte_cap(tmp_path):
+    path = make_docx(tmp_path / "long.docx", [["a" * 10]] * 5)
+    assert "".join(extract(path, "docx", max_bytes=25)) == "a" * 10 + "\n" + "a" * 10 + "\n" + "aaa"
+
+
+def test_pptx_slides_in_numeric_order(tmp_path):
+    slides = {n: [f"Slide {n} title", f"point {n}"] for n in (1, 2, 10)}
+    path = make_pptx(tmp_path / "deck.pptx", slides)
+    assert extract(path, "pptx") == ["Slide 1 title\npoint 1\n", "Slide 2 title\npoint 2\n", "Slide 10 title\npoint 10\n"]
+    assert len(extract(path, "pptx", max_pages=2)) == 2
+
+
+def test_xlsx_sheets_as_csv(tmp_path):
+    path = make_xlsx(tmp_path / "budget.xlsx", {
+        "Q1": [["Region", "Revenue"], ["West", 1200], ["East, North", 950.5]],
+        "Notes": [["Checked by finance"]],
+    })
+    pieces = extract(path, "xlsx")
+    assert pieces[0] == f'{SHEET_MARKER}Q1\nRegion,Revenue\nWest,1200\n"East, North",950.5\n'
+    assert split_sheets("".join(pieces)) == [
+        ("Q1", 'Region,Revenue\nWest,1200\n"East, North",950.5\n'),
+        ("Notes", "Checked by finance\n"),
+    ]
+
+
+def test_unknown_extension_has_no_extractor():
+    assert get_extractor("bin") is None
+
+
+def test_office_files_are_indexed(tmp_path):
+    root = tmp_path / "data" / "Finance_Firm"
+    root.mkdir(parents=True)
+    make_docx(root / "memo.docx", [["Audit of the payroll ledger"]])
+    make_pptx(root / "deck.pptx", {1: ["Expansion roadmap"]})
+    make_xlsx(root / "budget.xlsx", {"Q1": [["Region", "Revenue"], ["West", 1200], ["East", 950]]})
+
+    records = scan_dummy_data(str(tmp_path / "data"), cache=ExtractionCache(str(tmp_path / "cache")))
+    texts = {r["name"]: r["text"] for r in records}
+    assert "payroll ledger" in texts["memo.docx"]
+    assert "Expansion roadmap" in texts["deck.pptx"]
+    # Spreadsheets are parsed into tables and indexed by their summary
+    assert "Region, Revenue" in texts["budget.xlsx"]
+
+    [budget] = [i for i, r in enumerate(records) if r["name"] == "budget.xlsx"]
+    [table] = records.tables[budget]
+    assert table.name == "budget.xlsx:Q1"
+    assert table.numeric["Revenue"].tolist() == [1200.0, 950.0]
@@ -0,0 +1,47 @@
+import os
+
+from folder_index import DirectorySnapshot, FolderIndex, FolderStats
+
+PATHS = [
+    "sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp/complaint.pdf",
+    "sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp/Exhibits/exhibit_a.pdf",
+    "sample_data/Legal_Firm/Litigation/Doe_v_Acme/brief.txt",
+    "sample_data/Legal_Firm/Contracts/supply.txt",
+    "sample_data/Finance_Firm/ledger.csv",
+]
+
+
+def test_snapshot_lists_folders_recursively():
+    snapshot = DirectorySnapshot(PATHS)
+    assert snapshot.files("sample_data/Legal_Firm/Litigation") == []
+    assert sorted(snapshot.files("sample_data/Legal_Firm/Litigation/", recursive=True)) == sorted([
+        os.path.join("Smith_v_MegaCorp", "complaint.pdf"),
+        os.path.join("Smith_v_MegaCorp", "Exhibits", "exhibit_a.pdf"),
+        os.path.join("Doe_v_Acme", "brief.txt"),
+    ])
+    assert len(snapshot.files("sample_data", recursive=True)) == len(PATHS)
+    assert snapshot.files("sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp") == ["complaint.pdf"]
+    assert "sample_data/Legal_Firm" in snapshot and "sample_data/Nowhere" not in snapshot
+    assert snapshot.files("sample_data/Nowhere", recursive=True) == []
+
+
+def test_folder_totals_roll_up_the_tree():
+    index = FolderIndex()
+    for n, path in enumerate(PATHS):
+        index.add(os.path.dirname(path), 100 * (n + 1))
+    stats = index.stats()
+    assert stats["sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp/Exhibits"] == FolderStats(1, 200)
+    assert stats["sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp"] == FolderStats(2, 300)
+    assert stats["sample_data/Legal_Firm/Litigation"] == FolderStats(3, 600)
+    assert stats["sample_data/Legal_Firm"] == FolderStats(4, 1000)
+    assert stats["sample_data"] == FolderStats(5, 1500)
+    # The first three documents only
+    assert index.stats(limit=3)["sample_data"] == FolderStats(3, 600)
+    assert "sample_data/Finance_Firm" not in index.stats(limit=3)
+
+    assert index.counts([1, 4]) == {
+        "sample_data": 2, "sample_data/Legal_Firm": 1, "sample_data/Legal_Firm/Litigation": 1,
+        "sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp": 1,
+        "sample_data/Legal_Firm/Litigation/Smith_v_MegaCorp/Exhibits": 1, "sample_data/Finance_Firm": 1,
+    }
+    assert index.counts([]) == {}
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import index_artifact
+from conftest import DOCS, build_store
+from document_search import correct_query, search_files
+from extraction_cache import ExtractionCache
+from text_store import TextStore
+
+
+def test_views_read_like_records(store):
+    path, text = DOCS[2]
+    record = store[2]
+    assert record["path"] == path and record["text"] == text
+    assert record["name"] == "west_expenses.txt" and record["ext"] == "txt"
+    assert record.get("missing", "x") == "x"
+    assert record.to_dict()["text"] == text
+    assert [r["path"] for r in store] == [p for p, _ in DOCS]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    text_path = str(tmp_path / "text")
+    store = build_store(texts=TextStore(text_path))
+    store.tables[0] = ["placeholder table"]
+    store.save(str(tmp_path))
+
+    loaded = type(store).load(str(tmp_path), text_path)
+    assert [r.to_dict() for r in loaded] == [r.to_dict() for r in store]
+    assert loaded.tables == {0: ["placeholder table"]}
+    assert loaded.tokens.phrase_docs(["travel", "report"]).tolist() == [2]
+    assert correct_query("megcorp patent", loaded) == ("megacorp patent", {"megcorp": "megacorp"})
+    # Search and snippets work off the loaded indexes
+    for query in ('"travel report"', "megacorp patent", "path:finance_firm travel"):
+        expected = [(d["path"], d["score"], d["snippets"]) for d in search_files(query, store, snippets=1)]
+        assert [(d["path"], d["score"], d["snippets"]) for d in search_files(query, loaded, snippets=1)] == expected
+
+
+def make_corpus(root):
+    for path, text in DOCS:
+        full = os.path.join(root, os.path.relpath(path, "sample_data"))
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def test_artifact_build_and_load(tmp_path):
+    root, out = str(tmp_path / "data"), str(tmp_path / "index")
+    make_corpus(root)
+    manifest = index_artifact.build(root, out, workers=1, cache=ExtractionCache(str(tmp_path / "cache")))
+    assert manifest["shards"]["Finance_Firm"]["docs"] == 2
+
+    loaded_manifest, stores = index_artifact.load_stores(out, full=True)
+    assert loaded_manifest == manifest
+    assert sorted(r["name"] for r in stores["Legal_Firm"]) == ["smith_v_megacorp.txt", "supply_contract.txt"]
+    [hit] = search_files('"travel report"', stores["Finance_Firm"])
+    assert hit["name"] == "west_expenses.txt"
+    assert not index_artifact.source_changed(manifest)
+
+
+def test_artifact_rejects_changed_files(tmp_path):
+    root, out = str(tmp_path / "data"), str(tmp_path / "index")
+    make_corpus(root)
+    index_artifact.build(root, out, workers=1, cache=ExtractionCache(str(tmp_path / "cache")))
+    text = os.path.join(index_artifact.resolve(out), "Legal_Firm", index_artifact.TEXT_FILE)
+    with open(text, "r+b") as f:
+        f.write(b"X")
+
+    index_artifact.load_stores(out)  # same size: only the full check hashes the files
+    with pytest.raises(index_artifact.ArtifactError, match="SHA-256"):
+        index_artifact.load_stores(out, full=True)
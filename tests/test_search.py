@@ -0,0 +1,106 @@
+import pytest
+
+from document_search import facets_by_node, search_facets, search_files, search_many
+
+QUERIES = [
+    "travel", "megacorp", "smith v megacorp", "west expenses q1", "payroll march", "permits report",
+    "legal contract", "no such words", "", '"travel report"', "travel NEAR/2 report", "name:payroll travel",
+]
+
+
+def hits(results):
+    return [(d["path"], d["score"]) for d in results]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"k": 1},
+    {"industry_filter": "Finance_Firm"},
+    {"context_folders": ["Litigation"]},
+])
+def test_search_many_matches_search_files(store, kwargs):
+    single = [hits(search_files(q, store, **kwargs)) for q in QUERIES]
+    batch = [hits(r) for r in search_many(QUERIES, store, **kwargs)]
+    assert batch == single
+    assert any(single)
+
+
+def test_search_many_matches_search_files_on_dicts(store):
+    dicts = [r.to_dict() for r in store]
+    assert [hits(r) for r in search_many(QUERIES, dicts)] == [hits(search_files(q, store)) for q in QUERIES]
+
+
+def test_search_many_snippets(store):
+    [batch] = search_many(["travel report"], store, snippets=1)
+    single = search_files("travel report", store, snippets=1)
+    assert [d["snippets"] for d in batch] == [d["snippets"] for d in single]
+    assert "travel" in batch[0]["snippets"][0]["text"].lower()
+
+
+def names(query, records):
+    return {d["name"] for d in search_files(query, records)}
+
+
+@pytest.fixture(params=["store", "dicts"])
+def records(request, store):
+    # Stores answer operators from their token index, dicts by scanning each text
+    return store if request.param == "store" else [r.to_dict() for r in store]
+
+
+def test_phrase_query(records):
+    assert names('"travel report"', records) == {"west_expenses.txt"}
+    assert names('"report travel"', records) == set()
+    # Punctuation between the words does not break a phrase
+    assert names('"smith v megacorp"', records) == {"smith_v_megacorp.txt"}
+
+
+def test_phrase_scores_above_its_words(store):
+    [plain] = search_files("travel report", store, k=1)
+    [phrase] = search_files('"travel report"', store, k=1)
+    assert phrase["score"] > plain["score"]
+
+
+def test_near_query(records):
+    assert names("travel NEAR/2 report", records) == {"west_expenses.txt"}
+    assert names("travel NEAR/1 hotel", records) == set()
+    assert names("travel NEAR/3 hotel", records) == {"west_expenses.txt"}
+    assert names('"west group" NEAR/2 expenses', records) == {"west_expenses.txt"}
+
+
+def test_field_queries(records):
+    assert names("name:payroll travel", records) == {"east_payroll.txt"}
+    assert names("path:finance_firm travel", records) == {"west_expenses.txt", "east_payroll.txt"}
+    assert names("name:contract megacorp", records) == {"supply_contract.txt"}
+    assert names('path:"legal firm" megacorp', records) == {"smith_v_megacorp.txt", "supply_contract.txt"}
+    assert names("name:zzzz megacorp", records) == set()
+
+
+def test_operators_combine(records):
+    assert names('path:accounting "travel report"', records) == {"west_expenses.txt"}
+    assert names('path:legal_firm "travel report"', records) == set()
+
+
+def test_facet_counts_roll_up_to_board_nodes(store):
+    [(hits, folders)] = search_facets(["megacorp"], store, min_score=0)
+    assert [d["name"] for d in hits] == ["smith_v_megacorp.txt", "supply_contract.txt"]
+    assert folders == {
+        "sample_data": 2, "sample_data/Legal_Firm": 2,
+        "sample_data/Legal_Firm/Litigation": 1, "sample_data/Legal_Firm/Contracts": 1,
+    }
+    assert facets_by_node(folders) == {"sample_data": 2, "legal_firm": 2, "litigation": 1, "contracts": 1}
+
+    # Only hits above min_score are counted, though weaker ones are still returned
+    [(hits, folders)] = search_facets(["megacorp"], store, min_score=20)
+    assert len(hits) == 2
+    assert facets_by_node(folders) == {"sample_data": 1, "legal_firm": 1, "litigation": 1}
+    assert search_facets(["zzzz"], store) == [([], {})]
+
+
+def test_facets_map_matter_folders_to_board_nodes():
+    folders = {
+        "sample_data/Restaurant_Franchise": 3,
+        "sample_data/Restaurant_Franchise/East_Group": 3,
+        "sample_data/Restaurant_Franchise/East_Group/Accounting": 2,
+        "sample_data/Restaurant_Franchise/East_Group/Expenses": 1,
+    }
+    assert facets_by_node(folders) == {"restaurant_franchise": 3, "east_group": 3, "east_accounting": 2, "east_expenses": 1}
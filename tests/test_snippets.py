@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from conftest import build_store
+from document_search import make_snippets
+
+FILLER = " ".join(f"word{i}" for i in range(60))
+LONG = f"The hotel opened in 1999. {FILLER} Hotel costs rose to 2,500,000 dollars. {FILLER} Nothing else."
+NUMBERS = "hotel " + " ".join(f"{n},{n:03d},500" for n in range(1, 80)) + " hotel"
+CSV_ROW = "hotel," + ",".join(str(1000 + n) for n in range(120)) + ",hotel"
+NON_ASCII = f"Café «Über» naïve résumé — hôtel costs 1,250 €. {FILLER} 東京 hôtel again, costs été."
+
+
+def records_for(text):
+    store = build_store([("sample_data/Finance_Firm/notes.txt", text)])
+    return [store[0], store[0].to_dict()]
+
+
+# Whole numbers as a reader sees them: thousands groups, decimals, dates and times
+NUMBER = re.compile(r"\d{1,3}(?:,\d{3})+(?!\d)|\d+(?:[.\-/:]\d+)*")
+
+
+def splits_number(text, i):
+    """Whether offset ``i`` falls inside a number like ``12,500`` or ``2024-03-15``."""
+    return any(m.start() < i < m.end() for m in NUMBER.finditer(text))
+
+
+def check(snippets, text, terms):
+    """Every snippet is the source slice at its offsets, cut between numbers, with highlights on query terms."""
+    for s in snippets:
+        assert text[s["start"]:s["end"]] == s["text"]
+        assert not splits_number(text, s["start"]) and not splits_number(text, s["end"])
+        assert s["highlights"]
+        for start, end in s["highlights"]:
+            assert s["text"][start:end].lower() in terms
+    spans = sorted((s["start"], s["end"]) for s in snippets)
+    assert all(a_end < b_start for (_, a_end), (b_start, _) in zip(spans, spans[1:]))
+
+
+@pytest.mark.parametrize("index", [0, 1], ids=["store", "dict"])
+def test_windows_and_highlights_match_the_source(index):
+    record = records_for(LONG)[index]
+    snippets = make_snippets(record, "hotel costs", count=2)
+    check(snippets, LONG, {"hotel", "costs"})
+    # The window with both terms ranks first; the second is the earlier single hit
+    assert [s["text"][a:b] for s in snippets for a, b in s["highlights"]] == ["Hotel", "costs", "hotel"]
+    assert snippets[0]["start"] > LONG.index(FILLER) and snippets[1]["start"] == 0
+    assert "2,500,000 dollars" in snippets[0]["text"]
+
+
+@pytest.mark.parametrize("text", [NUMBERS, CSV_ROW], ids=["numbers", "csv"])
+@pytest.mark.parametrize("index", [0, 1], ids=["store", "dict"])
+def test_windows_do_not_split_numbers(text, index):
+    # Edges snap to whole numbers but do not run on through neighbouring numbers or CSV fields
+    snippets = make_snippets(records_for(text)[index], "hotel", count=2)
+    assert len(snippets) == 2
+    check(snippets, text, {"hotel"})
+    assert all(len(s["text"]) < len(text) / 2 for s in snippets)
+
+
+@pytest.mark.parametrize("index", [0, 1], ids=["store", "dict"])
+def test_non_ascii_offsets_are_characters(index):
+    record = records_for(NON_ASCII)[index]
+    snippets = make_snippets(record, "hôtel costs", count=3)
+    check(snippets, NON_ASCII, {"hôtel", "costs"})
+    assert [(s["start"], s["text"][:11]) for s in snippets] == [(0, "Café «Über»"), (332, "word42 word")]
+    assert [snippets[1]["text"][a:b] for a, b in snippets[1]["highlights"]] == ["hôtel", "costs"]
+
+
+def test_store_and_dict_records_agree():
+    store_record, dict_record = records_for(NON_ASCII)
+    assert make_snippets(store_record, "hôtel costs", 3) == make_snippets(dict_record, "hôtel costs", 3)
+
+
+def test_adjacent_hits_share_one_window():
+    text = "alpha hotel beta costs gamma hotel delta"
+    [snippet] = make_snippets(records_for(text)[0], "hotel costs", count=3)
+    assert snippet["start"] == 0 and snippet["end"] == len(text)
+    assert [snippet["text"][a:b] for a, b in snippet["highlights"]] == ["hotel", "costs", "hotel"]
+
+
+def test_no_matching_terms_no_snippets():
+    assert make_snippets(records_for(LONG)[0], "zebra") == []
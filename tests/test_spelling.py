@@ -0,0 +1,31 @@
+from spelling import SpellIndex, edit_distance
+
+
+def test_lookup_corrects_to_the_closest_common_term():
+    index = SpellIndex()
+    index.add(["megacorp", "contract"])
+    index.add(["megacorp", "contact"])
+    assert index.lookup("megcorp") == ("megacorp", 1)
+    assert index.lookup("contrcat") == ("contract", 1)
+    assert index.lookup("contract") == ("contract", 0)
+    assert index.lookup("zzzzzz") is None
+    assert edit_distance("contrcat", "contract", 2) == 1
+
+
+def test_lookup_while_terms_are_added():
+    """A lookup that runs between two steps of ``add`` (the background indexer) sees a consistent index."""
+    index = SpellIndex()
+    found = []
+
+    class Interleaved(dict):
+        def setdefault(self, key, default):
+            result = super().setdefault(key, default)
+            found.append(index.lookup("megacorq"))
+            return result
+
+    index._deletes = Interleaved()
+    index.add(["megacorp"])
+    # Before the term is filed under a delete the word shares it is not found; after, it is
+    assert ("megacorp", 1) in found
+    assert set(found) <= {None, ("megacorp", 1)}
+    assert index.lookup("megacorq") == ("megacorp", 1)
@@ -0,0 +1,102 @@
+import math
+import os
+
+from chat_pipeline import ChatRequest, build_system_prompt, doc_prompt_block, retrieve
+from conftest import build_store
+from document_search import scan_dummy_data
+from extraction_cache import ExtractionCache
+from tables import Table, detect_operation, is_numeric_question, parse_number, plan_query, summarize_for_question
+
+CSV = """Vendor,Department,Region,Annual_Cost,Seats
+Acme,Legal,West,"1,200",10
+Globex,Legal,East,800,5
+Initech,Finance,West,"$2,000",
+Umbrella,Finance,West,450.50,3
+"""
+
+
+def table():
+    return Table.from_csv(CSV, name="subscriptions.csv")
+
+
+def test_parse_number_and_typed_columns():
+    assert parse_number("$1,200") == 1200.0 and parse_number("8.5%") == 8.5 and parse_number("+98%") == 98.0
+    assert parse_number("West") is None and parse_number("") is None
+    t = table()
+    assert set(t.numeric) == {"Annual_Cost", "Seats"} and set(t.text) == {"Vendor", "Department", "Region"}
+    assert t.numeric["Annual_Cost"].tolist() == [1200.0, 800.0, 2000.0, 450.5]
+    assert math.isnan(t.numeric["Seats"][2])
+
+
+def test_unquoted_thousands_are_rejoined():
+    t = Table.from_csv("Item,Cost\nServer,$450,000,000\nDesk,300\n")
+    assert t.numeric["Cost"].tolist() == [450000000.0, 300.0]
+
+
+def test_aggregate_filters_and_groups():
+    t = table()
+    assert t.aggregate("Annual_Cost", "sum") == 4450.5
+    assert t.aggregate("Annual_Cost", "sum", filters={"Region": "west"}) == 3650.5
+    assert t.aggregate("Seats", "avg", filters={"Region": "West"}) == 6.5  # the blank seat count is skipped
+    assert t.aggregate("Annual_Cost", "max", group_by="Department") == {"Finance": 2000.0, "Legal": 1200.0}
+    assert t.aggregate(None, "count", filters={"Department": "legal"}) == 2.0
+    assert math.isnan(t.aggregate("Seats", "min", filters={"Vendor": "nobody"}))
+
+
+def test_detect_operation():
+    assert detect_operation("What is the total expense for the West group?") == "sum"
+    assert detect_operation("average seats per vendor") == "avg"
+    assert detect_operation("How many vendors are there") == "count"
+    assert not is_numeric_question("who is the plaintiff")
+
+
+def test_plan_query_picks_columns_filters_and_grouping():
+    t = table()
+    assert plan_query(t, "total annual cost for the West region") == ("sum", ["Annual_Cost"], {"Region": "west"}, None)
+    assert plan_query(t, "highest cost by department") == ("max", ["Annual_Cost"], {}, "Department")
+    # No column named in the question: every numeric column
+    assert plan_query(t, "sum for Legal")[1:3] == (["Annual_Cost", "Seats"], {"Department": "legal"})
+
+
+def test_summarize_for_question():
+    t = table()
+    assert summarize_for_question(t, "total annual cost for the West region") == (
+        "Columns: Vendor, Department, Region, Annual_Cost, Seats (4 rows; 3 matching where Region = west)\n"
+        "sum(Annual_Cost) = 3,650.5"
+    )
+    assert summarize_for_question(t, "average seats by department").splitlines()[1] == (
+        "avg(Seats) by Department: Finance: 3, Legal: 7.5"
+    )
+    assert summarize_for_question(t, "how many vendors in Legal").splitlines()[1] == "count = 2"
+
+
+def test_prompt_block_sends_computed_aggregates_for_numeric_questions():
+    store = build_store([("sample_data/Finance_Firm/IT/subscriptions.csv", CSV)])
+    store.tables[0] = [table()]
+    record = store[0]
+    block = doc_prompt_block(record, "total annual cost for the West region", store.tables, numeric=True)
+    assert block == (
+        "File: sample_data/Finance_Firm/IT/subscriptions.csv\nComputed from table:\n"
+        + summarize_for_question(table(), "total annual cost for the West region") + "\n---"
+    )
+    assert "sum(Annual_Cost) = 3,650.5" in block
+    # Other questions get the document text, not the aggregates
+    block = doc_prompt_block(record, "who supplies legal", store.tables, numeric=False)
+    assert block.startswith("File: sample_data/Finance_Firm/IT/subscriptions.csv\nContent:\nVendor,Department")
+
+
+def test_numeric_question_over_sample_expenses(tmp_path):
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_data", "Restaurant_Franchise")
+    records = scan_dummy_data(root, cache=ExtractionCache(str(tmp_path)))
+    request = ChatRequest(
+        prompt="total expense for the West Group", model="gpt-test", records=records, history=[],
+        industry="Restaurant_Franchise", tables=records.tables,
+    )
+    prompt = build_system_prompt(request, retrieve(request).docs)
+    block = prompt[prompt.index("West_Group/Expenses/Software_Subscriptions_2025.csv"):]
+    assert block.split("---")[0].splitlines()[1:] == [
+        "Computed from table:",
+        "Columns: Service, Monthly_Cost, Annual_Cost, Owner, Renewal_Date (4 rows; 4 matching)",
+        "sum(Monthly_Cost) = 1,830",
+        "sum(Annual_Cost) = 21,960",
+    ]
@@ -0,0 +1,107 @@
+import pytest
+
+import working_set
+from conftest import build_store
+from document_search import search_files
+from working_set import WorkingSet, informative_terms
+
+
+def doc(path, *texts, score=30.0):
+    """A search hit with one snippet per text, laid out one after another in the document."""
+    snippets, start = [], 0
+    for text in texts:
+        snippets.append({"text": text, "start": start, "end": start + len(text), "highlights": [[0, 4]]})
+        start += len(text) + 1
+    return {"path": path, "name": path.rsplit("/", 1)[-1], "version": "1-0", "score": score, "snippets": snippets}
+
+
+def assert_consistent(ws):
+    assert ws._keys == {(p.path, p.start): pid for pid, p in ws.passages.items()}
+    assert set(ws._used) == set(ws.passages)
+    assert all(pid in ws.passages for pid in ws.last)
+    for pid, p in ws.passages.items():
+        assert len(ws.index.doc_tokens(pid)[0]) == len(p.text.split())
+    assert ws.tokens() <= ws.max_tokens
+
+
+@pytest.fixture
+def ws(store):
+    ws = WorkingSet()
+    docs = [d for d in search_files("travel report", store, snippets=3) if d["score"] > 10]
+    ws.add(docs, {"node": 1}, "Finance_Firm", len(store))
+    return ws
+
+
+def test_informative_terms_drop_stopwords_and_common_terms():
+    store = build_store([
+        (f"sample_data/Finance_Firm/Reports/r{i}.txt", f"quarterly report for region {i}" + (" audit" if i == 0 else ""))
+        for i in range(4)
+    ])
+    # "report" and "quarterly" are in every document, "audit" in one; "zebra" is in none but still counts
+    assert informative_terms("what did the quarterly report say about the audit and zebra", store) == ["audit", "zebra"]
+    assert informative_terms("tell me more about it", store) == []
+    # Without an index behind the records only stopwords are dropped
+    assert informative_terms("the quarterly report", [r.to_dict() for r in store]) == ["quarterly", "report"]
+
+
+def test_covered_follow_up_skips_search(ws, store):
+    docs = ws.match("and the hotel costs?", store, "Finance_Firm", 3)
+    assert [d["path"] for d in docs] == ["sample_data/Finance_Firm/Accounting/west_expenses.txt"]
+    [snippet] = docs[0]["snippets"]
+    assert [snippet["text"][s:e] for s, e in snippet["highlights"]] == ["hotel", "costs"]
+    assert ws.reused == 1 and ws.searched == 1
+
+
+def test_uncovered_follow_up_searches(ws, store):
+    assert ws.match("hotel costs for the payroll team", store, "Finance_Firm", 3) is None
+    assert ws.match("zebra migration patterns", store, "Finance_Firm", 3) is None
+    assert ws.reused == 0
+
+
+def test_term_less_follow_up_reuses_the_last_turn(ws, store):
+    docs = ws.match("tell me more", store, "Finance_Firm", 3)
+    assert [d["path"] for d in docs] == ["sample_data/Finance_Firm/Accounting/west_expenses.txt"]
+    assert docs[0]["snippets"][0]["highlights"] == ws.passages[ws.last[0]].highlights
+
+
+def test_shard_or_record_count_change_starts_over(ws, store):
+    assert ws.match("hotel", store, "Legal_Firm", 3) is None
+    assert len(ws) == 0 and ws.facets == {}
+    ws.add([doc("a/b.txt", "hotel booking")], {}, "Finance_Firm", len(store))
+    assert ws.match("hotel", store[:3], "Finance_Firm", 3) is None
+    assert len(ws) == 0
+
+
+def test_reuse_keeps_the_best_passages_within_the_prompt_budget(monkeypatch):
+    monkeypatch.setattr(working_set, "PROMPT_TOKENS", 12)
+    ws = WorkingSet()
+    ws.add([
+        doc("a/one.txt", "hotel costs report", "hotel costs later", score=40),
+        doc("a/two.txt", "hotel costs summary", score=30),
+        doc("a/three.txt", "hotel only", score=50),
+        doc("a/four.txt", "hotel costs " + "filler " * 20, score=20),
+    ], {}, None, 0)
+    # Passages with both terms, best document first, one per document; the long one exceeds the budget
+    docs = ws.match("hotel costs", [], None, 1)
+    assert [(d["path"], [s["text"] for s in d["snippets"]]) for d in docs] == [
+        ("a/one.txt", ["hotel costs report"]), ("a/two.txt", ["hotel costs summary"]),
+    ]
+    assert ws.match("hotel costs", [], None, 0) is None
+
+
+def test_eviction_and_compaction_keep_passages_consistent():
+    ws = WorkingSet(max_tokens=60)
+    for turn in range(60):
+        ws.add([doc(f"a/{turn}.txt", f"topic{turn} alpha beta gamma", f"topic{turn} delta epsilon")], {}, None, 0)
+        assert_consistent(ws)
+        assert len(ws.last) == 2
+    # Compaction re-encoded the live passages; older ones are gone, the latest still match
+    assert len(ws.index) < 2 * 60 and len(ws.index) <= 2 * len(ws.passages) + 64
+    assert ws.match("topic0", [], None, 3) is None
+    docs = ws.match("topic59 delta", [], None, 3)
+    assert docs[0]["snippets"][0]["text"] == "topic59 delta epsilon"
+    # Re-adding a passage that is still held does not duplicate it
+    held = len(ws)
+    ws.add([doc("a/59.txt", "topic59 alpha beta gamma", "topic59 delta epsilon")], {}, None, 0)
+    assert len(ws) == held
+    assert_consistent(ws)
@@ -0,0 +1,179 @@
+import bisect
+import mmap
+import os
+import tempfile
+import threading
+from array import array
+from typing import Iterable, List, Optional, Set, Union
+
+
+class TextStore:
+    """Append-only UTF-8 text file with an offset table, read through mmap.
+
+    Document ``i`` occupies bytes ``offsets[i]:offsets[i + 1]`` of the data file.
+    Readers get ``memoryview`` slices of the mapping, so text is not copied onto
+    the Python heap until it is decoded, and every process that opens the same
+    file shares one copy in the OS page cache.
+
+    Alongside the raw text the store keeps an ASCII-lowercased mirror with
+    identical offsets, so case-insensitive substring checks run as ``mmap.find``
+    over a byte range. The mirror is only exact for ASCII documents, which are
+    flagged; callers fall back to ``str.lower`` for the rest.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Create a new store at ``path`` (truncating it), or in an anonymous temp file."""
+        self.path = path
+        if path:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._data = open(path, "w+b")
+            self._folded = open(path + ".lower", "w+b")
+        else:
+            self._data = tempfile.TemporaryFile()
+            self._folded = tempfile.TemporaryFile()
+        self._offsets = array("Q", [0])
+        self._ascii = array("B")
+        self._non_ascii: List[int] = []
+        self._readonly = False
+        self._mapped = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._mm_folded: Optional[mmap.mmap] = None
+        self._map_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> "TextStore":
+        """Open a sealed store read-only; the mapping is shared with other processes."""
+        store = cls.__new__(cls)
+        store.path = path
+        store._data = open(path, "rb")
+        store._folded = open(path + ".lower", "rb")
+        with open(path + ".idx", "rb") as f:
+            raw = f.read()
+        count = (len(raw) - 8) // 9
+        store._offsets = array("Q")
+        store._offsets.frombytes(raw[: 8 * (count + 1)])
+        store._ascii = array("B")
+        store._ascii.frombytes(raw[8 * (count + 1):])
+        store._non_ascii = [i for i, flag in enumerate(store._ascii) if not flag]
+        store._readonly = True
+        store._mapped = 0
+        store._mm = None
+        store._mm_folded = None
+        store._map_lock = threading.Lock()
+        return store
+
+    def append(self, text: Union[str, Iterable[str]]) -> int:
+        """Append one document, given whole or as an iterable of pieces; returns its id."""
+        if self._readonly:
+            raise ValueError("text store is read-only")
+        pieces = (text,) if isinstance(text, str) else text
+        is_ascii = True
+        size = 0
+        for piece in pieces:
+            data = piece.encode("utf-8")
+            is_ascii = is_ascii and data.isascii()
+            self._data.write(data)
+            self._folded.write(data.lower())
+            size += len(data)
+        self._offsets.append(self._offsets[-1] + size)
+        if not is_ascii:
+            self._non_ascii.append(len(self._ascii))
+        self._ascii.append(1 if is_ascii else 0)
+        return len(self._ascii) - 1
+
+    def seal(self) -> None:
+        """Flush data and write the offset table next to a named store so it can be opened elsewhere."""
+        self._data.flush()
+        self._folded.flush()
+        if self.path and not self._readonly:
+            with open(self.path + ".idx", "wb") as f:
+                self._offsets.tofile(f)
+                self._ascii.tofile(f)
+
+    def _ensure_mapped(self, end: int) -> None:
+        if end <= self._mapped:
+            return
+        # A writer thread may keep appending while readers map; read the total before
+        # flushing so the mapping never extends past data that is already on disk.
+        with self._map_lock:
+            if end <= self._mapped:
+                return
+            total = self._offsets[-1]
+            self._data.flush()
+            self._folded.flush()
+            # Old mappings stay alive for as long as earlier memoryviews reference them
+            mm = mmap.mmap(self._data.fileno(), total, access=mmap.ACCESS_READ)
+            mm_folded = mmap.mmap(self._folded.fileno(), total, access=mmap.ACCESS_READ)
+            self._mm, self._mm_folded = mm, mm_folded
+            self._mapped = total
+
+    def __len__(self) -> int:
+        return len(self._ascii)
+
+    def nbytes(self, idx: int) -> int:
+        return self._offsets[idx + 1] - self._offsets[idx]
+
+    def is_ascii(self, idx: int) -> bool:
+        return bool(self._ascii[idx])
+
+    def view(self, idx: int) -> memoryview:
+        """Zero-copy view of a document's UTF-8 bytes."""
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        if start == end:
+            return memoryview(b"")
+        self._ensure_mapped(end)
+        return memoryview(self._mm)[start:end]
+
+    def text(self, idx: int) -> str:
+        return str(self.view(idx), "utf-8")
+
+    def contains_lower(self, idx: int, needle: str) -> bool:
+        """Whether lowercased ``needle`` occurs in the lowercased document, searched in place."""
+        if not needle:
+            return True
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        if not self._ascii[idx]:
+            return needle in self.text(idx).lower()
+        if start == end:
+            return False
+        self._ensure_mapped(end)
+        return self._mm_folded.find(needle.encode("utf-8"), start, end) != -1
+
+    def docs_containing_lower(self, needle: str) -> Set[int]:
+        """Ids of all documents whose lowercased text contains lowercased ``needle``.
+
+        One ``mmap.find`` pass over the whole mirror file: after a hit the scan
+        jumps to the next document, so the cost is one find per matching document
+        rather than one per document.
+        """
+        count = len(self._ascii)
+        if not needle:
+            return set(range(count))
+        found: Set[int] = set()
+        total = self._offsets[count]
+        if total:
+            self._ensure_mapped(total)
+            data = needle.encode("utf-8")
+            pos = self._mm_folded.find(data, 0, total)
+            while pos != -1:
+                doc = bisect.bisect_right(self._offsets, pos, 0, count + 1) - 1
+                end = self._offsets[doc + 1]
+                if pos + len(data) <= end:
+                    found.add(doc)
+                    pos = self._mm_folded.find(data, end, total)
+                else:
+                    # Match straddles a document boundary
+                    pos = self._mm_folded.find(data, pos + 1, total)
+        # The mirror is only exact for ASCII documents; check the rest directly
+        for doc in self._non_ascii:
+            if doc >= count:
+                break
+            found.discard(doc)
+            if needle in self.text(doc).lower():
+                found.add(doc)
+        return found
+
+    def total_bytes(self) -> int:
+        return self._offsets[-1]
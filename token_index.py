@@ -0,0 +1,261 @@
+import re
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Letters and digits; underscores split tokens so "West_Group" reads as two words
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Tokens of context kept around the best-matching run of query terms
+SNIPPET_TOKENS = 40
+# Characters that join digit tokens into one number (1,850  3.5  2024-03-15  1/2  12:30)
+NUMBER_SEPARATORS = frozenset(b",.-/:")
+# A snippet edge moves at most this many tokens to keep a number whole
+NUMBER_TOKENS = 6
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, as stored in the index."""
+    return [m.group().lower() for m in TOKEN_RE.finditer(text)]
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct query tokens worth highlighting (longer than two letters, like search_files' words)."""
+    seen: Dict[str, None] = {}
+    for term in tokenize(query):
+        if len(term) > 2:
+            seen.setdefault(term, None)
+    return list(seen)
+
+
+class TokenIndex:
+    """Per-document token positions, built once at index time.
+
+    For every token the index stores its term id and its byte span in the
+    document's UTF-8 text, in three flat arrays shared by all documents and
+    addressed through a per-document offset table. Snippets are cut by looking
+    up a hit's term ids and slicing the stored text at those byte offsets, so
+    no document is re-read or re-tokenized at query time.
+
+    The same pass fills a positional inverted index: per term, the documents
+    and token positions where it occurs, in (document, position) order. Phrase
+    and proximity queries are answered by merging those lists; since positions
+    count tokens, a phrase broken across lines or pages still matches.
+    """
+
+    def __init__(self) -> None:
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self._doc_offsets = array("Q", [0])
+        self._tokens = array("I")
+        self._starts = array("I")
+        self._ends = array("I")
+        # term id -> (document ids, token positions), parallel arrays
+        self._postings: Dict[int, Tuple[array, array]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_offsets) - 1
+
+    def nbytes(self) -> int:
+        arrays = sum(a.itemsize * len(a) for a in (self._doc_offsets, self._tokens, self._starts, self._ends))
+        postings = sum(sys.getsizeof(docs) + sys.getsizeof(positions) for docs, positions in self._postings.values())
+        return arrays + postings + sum(sys.getsizeof(t) for t in self.terms)
+
+    def add(self, text: str) -> int:
+        """Tokenize one document and append its positions; returns its id."""
+        doc = len(self)
+        ascii_only = text.isascii()
+        byte_pos = 0
+        char_pos = 0
+        for position, m in enumerate(TOKEN_RE.finditer(text)):
+            term = m.group().lower()
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                term_id = len(self.terms)
+                self.terms.append(term)
+                self.term_ids[term] = term_id
+            if ascii_only:
+                start, end = m.start(), m.end()
+            else:
+                # Advance a running byte offset instead of re-encoding the prefix for every token
+                byte_pos += len(text[char_pos:m.start()].encode("utf-8"))
+                start = byte_pos
+                end = start + len(m.group().encode("utf-8"))
+                byte_pos, char_pos = end, m.end()
+            self._tokens.append(term_id)
+            self._starts.append(start)
+            self._ends.append(end)
+            postings = self._postings.get(term_id)
+            if postings is None:
+                postings = self._postings[term_id] = (array("I"), array("I"))
+            postings[0].append(doc)
+            postings[1].append(position)
+        self._doc_offsets.append(len(self._tokens))
+        return doc
+
+    def doc_tokens(self, doc: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(term ids, byte starts, byte ends) for one document."""
+        lo, hi = self._doc_offsets[doc], self._doc_offsets[doc + 1]
+        # Slices are copies: a buffer export would stop the indexing thread from growing the arrays
+        return (
+            np.array(self._tokens[lo:hi], dtype=np.uint32),
+            np.array(self._starts[lo:hi], dtype=np.uint32),
+            np.array(self._ends[lo:hi], dtype=np.uint32),
+        )
+
+    def doc_terms(self, doc: int) -> List[str]:
+        """Distinct terms of one document."""
+        lo, hi = self._doc_offsets[doc], self._doc_offsets[doc + 1]
+        return [self.terms[t] for t in set(self._tokens[lo:hi])]
+
+    def doc_lengths(self, limit: Optional[int] = None) -> np.ndarray:
+        """Token count of each of the first ``limit`` documents (all by default)."""
+        n = len(self) if limit is None else min(limit, len(self))
+        return np.diff(np.array(self._doc_offsets[:n + 1], dtype=np.int64))
+
+    def term_doc_counts(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(document ids, occurrences in each) for ``term``, ascending by document."""
+        keys = self._keys(term)
+        docs, counts = np.unique((keys >> np.uint64(32)).astype(np.int64), return_counts=True)
+        return docs, counts
+
+    def lookup(self, terms: Sequence[str]) -> Dict[int, str]:
+        """Term id -> term for the given terms that occur anywhere in the index."""
+        return {self.term_ids[t]: t for t in terms if t in self.term_ids}
+
+    def snippet_spans(
+        self, doc: int, term_ids: Sequence[int], count: int = 2, span: int = SNIPPET_TOKENS,
+        data: Optional[Sequence[int]] = None,
+    ) -> List[Tuple[int, int, List[Tuple[int, int]]]]:
+        """Byte spans of up to ``count`` snippets covering the most distinct query terms, best first.
+
+        Each snippet is (start, end, matched term spans), all byte offsets into the
+        document's UTF-8 text. Later snippets are cut from tokens no earlier one
+        covers, and snippets that end up adjacent are merged, so no text repeats.
+        Edges are moved outwards (by at most ``NUMBER_TOKENS``) so a number such as
+        1,850 or 2024-03-15 is not split. ``data`` is the document's UTF-8 text, used
+        to check the character between two digit tokens; without it any single
+        character joins them.
+        """
+        tokens, starts, ends = self.doc_tokens(doc)
+        if not len(tokens) or not term_ids:
+            return []
+        all_hits = np.flatnonzero(np.isin(tokens, np.fromiter(term_ids, dtype=np.uint32)))
+
+        def joined_number(left: int) -> bool:
+            # Tokens ``left`` and ``left + 1`` are digits separated by one number separator;
+            # after a comma only a thousands group counts, so CSV fields stay apart
+            if starts[left + 1] - ends[left] != 1:
+                return False
+            digits = self.terms[int(tokens[left + 1])]
+            if not (self.terms[int(tokens[left])].isdigit() and digits.isdigit()):
+                return False
+            if data is None:
+                return True
+            sep = data[int(ends[left])]
+            return sep in NUMBER_SEPARATORS and (sep != ord(",") or len(digits) == 3)
+
+        # Token ranges (first, last), inclusive, already in a snippet; kept sorted
+        covered: List[Tuple[int, int]] = []
+        windows: List[Tuple[int, int, np.ndarray]] = []
+        while len(windows) < count:
+            free = np.ones(len(all_hits), dtype=bool)
+            for first, last in covered:
+                free &= (all_hits < first) | (all_hits > last)
+            hits = all_hits[free]
+            if not len(hits):
+                break
+            # Hits [i, stop[i]) fall inside a window of ``span`` tokens starting at hit i, short of the next covered range
+            stop = np.searchsorted(hits, hits + span, side="left")
+            cover_starts = np.array([first for first, _ in covered] + [len(tokens)], dtype=np.int64)
+            cover_ends = np.array([-1] + [last for _, last in covered], dtype=np.int64)
+            after = np.searchsorted(cover_starts, hits, side="right")
+            stop = np.minimum(stop, np.searchsorted(hits, cover_starts[after], side="left"))
+            best: Optional[Tuple[int, int, int, int]] = None
+            for i in range(len(hits)):
+                j = int(stop[i])
+                distinct = len(set(tokens[hits[i:j]].tolist()))
+                if best is None or (distinct, j - i) > best[:2]:
+                    best = (distinct, j - i, i, j)
+            _, _, i, j = best
+            # Free tokens around the run of hits: between the neighbouring covered ranges
+            lo, hi = int(cover_ends[after[i]]) + 1, int(cover_starts[after[i]]) - 1
+            # Centre the window on the run of hits
+            first = max(lo, int(hits[i]) - (span - int(hits[j - 1] - hits[i])) // 2)
+            last = min(hi, first + span - 1)
+            edge = first
+            while first > max(lo, edge - NUMBER_TOKENS) and joined_number(first - 1):
+                first -= 1
+            edge = last
+            while last < min(hi, edge + NUMBER_TOKENS) and joined_number(last):
+                last += 1
+            covered.append((first, last))
+            covered.sort()
+            windows.append((first, last, hits[i:j]))
+
+        # Merge windows that touch, keeping the rank of the better one
+        ranked = sorted(range(len(windows)), key=lambda rank: windows[rank][0])
+        merged: List[List] = []
+        for rank in ranked:
+            first, last, marks = windows[rank]
+            if merged and merged[-1][1] + 1 == first:
+                merged[-1][1] = last
+                merged[-1][2] = np.concatenate([merged[-1][2], marks])
+                merged[-1][3] = min(merged[-1][3], rank)
+            else:
+                merged.append([first, last, marks, rank])
+        merged.sort(key=lambda w: w[3])
+        return [
+            (int(starts[first]), int(ends[last]), [(int(starts[h]), int(ends[h])) for h in marks])
+            for first, last, marks, _ in merged
+        ]
+
+    def _keys(self, term: str) -> np.ndarray:
+        """Occurrences of ``term`` as sorted ``document << 32 | position`` keys."""
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return np.empty(0, dtype=np.uint64)
+        docs, positions = self._postings[term_id]
+        # Copy both under one length: the indexing thread may append between the two reads
+        n = min(len(docs), len(positions))
+        return (np.array(docs[:n], dtype=np.uint64) << np.uint64(32)) | np.array(positions[:n], dtype=np.uint64)
+
+    def phrase_keys(self, terms: Sequence[str]) -> np.ndarray:
+        """Start keys (``document << 32 | position``) of every occurrence of the phrase ``terms``."""
+        if not terms:
+            return np.empty(0, dtype=np.uint64)
+        keys = self._keys(terms[0])
+        for offset, term in enumerate(terms[1:], start=1):
+            if not len(keys):
+                break
+            # Shift each later term's positions back by its offset; phrase starts are the common keys
+            nxt = self._keys(term)
+            nxt = nxt[(nxt & np.uint64(0xFFFFFFFF)) >= offset] - np.uint64(offset)
+            keys = np.intersect1d(keys, nxt, assume_unique=True)
+        return keys
+
+    def phrase_docs(self, terms: Sequence[str]) -> np.ndarray:
+        """Sorted ids of documents containing the phrase."""
+        return np.unique(self.phrase_keys(terms) >> np.uint64(32)).astype(np.int64)
+
+    def near_docs(self, left: Sequence[str], right: Sequence[str], k: int) -> np.ndarray:
+        """Sorted ids of documents where phrases ``left`` and ``right`` occur within ``k`` tokens of each other."""
+        a, b = self.phrase_keys(left), self.phrase_keys(right)
+        if not len(a) or not len(b):
+            return np.empty(0, dtype=np.int64)
+        la, lb = len(left), len(right)
+        found = np.zeros(len(a), dtype=bool)
+        # Compare each left occurrence with the nearest right occurrences on either side
+        idx = np.searchsorted(b, a)
+        for cand in (idx - 1, idx):
+            ok = (cand >= 0) & (cand < len(b))
+            bk = b[np.clip(cand, 0, len(b) - 1)]
+            same_doc = (bk >> np.uint64(32)) == (a >> np.uint64(32))
+            ap = (a & np.uint64(0xFFFFFFFF)).astype(np.int64)
+            bp = (bk & np.uint64(0xFFFFFFFF)).astype(np.int64)
+            # Words between the end of the earlier phrase and the start of the later one
+            gap = np.where(bp >= ap, bp - (ap + la - 1), ap - (bp + lb - 1))
+            found |= ok & same_doc & (gap <= k)
+        return np.unique(a[found] >> np.uint64(32)).astype(np.int64)
@@ -0,0 +1,238 @@
+"""Per-conversation working set of retrieved passages, so follow-up questions can skip the index.
+
+Every search turn adds the snippets it sent to the model (``PROMPT_SNIPPETS``
+per hit) as passages. Each passage is tokenized once, into the set's own
+``TokenIndex``, and its prompt cost is estimated from its length. A follow-up is
+scored against those cached encodings first. If every informative term of the
+question occurs in some passage, the matching passages are the turn's documents
+and the shard's index is not searched. A term is informative if it is not a
+stopword and occurs in at most ``COMMON_TERM_RATIO`` of the shard's
+documents (possibly none). Only a question with no informative terms ("tell me more")
+reuses the previous turn's passages. Reused turns send only the best passages,
+within ``APOCRYPHA_WORKING_SET_PROMPT_TOKENS``. Otherwise the turn searches as
+usual, and its hits (possibly none) become the latest passages. The set keeps at most
+``APOCRYPHA_WORKING_SET_TOKENS`` estimated tokens, evicting the least recently
+used passages, and starts over when the shard or its record count changes.
+"""
+import math
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from token_index import TokenIndex, query_terms
+
+MAX_TOKENS = int(os.environ.get("APOCRYPHA_WORKING_SET_TOKENS", "4000"))
+# Rough tokens-per-character ratio for English text with the OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+# Query terms found in more than this share of the shard's documents do not count towards coverage
+COMMON_TERM_RATIO = 0.5
+# Question and function words that say nothing about which documents answer a follow-up.
+# On small shards they are as rare as real keywords, so document frequency alone cannot drop them.
+STOPWORDS = frozenset("""
+    about after again all also and any are been before being but can could did does doing for from
+    give had has have her his how into its just more most much not now off only other our out over
+    please say said she should show some such tell than that the their them then there these they
+    this those too very was were what when where which while who whom whose why will with would you your
+""".split())
+# Estimated tokens of passages a reused follow-up sends to the model
+PROMPT_TOKENS = int(os.environ.get("APOCRYPHA_WORKING_SET_PROMPT_TOKENS", "800"))
+
+
+class Passage(NamedTuple):
+    path: str
+    name: str
+    version: str
+    # Character offsets of the passage in its document
+    start: int
+    end: int
+    text: str
+    # Term spans of the query that retrieved it, [start, end] characters into ``text``
+    highlights: List[List[int]]
+    # Search score of its document when it was retrieved
+    score: float
+    # Estimated prompt tokens
+    tokens: int
+
+
+def informative_terms(query: str, records: Sequence[Mapping[str, Any]]) -> List[str]:
+    """Query terms that decide which documents answer it: not stopwords, and not too common in ``records``' index.
+
+    Without a RecordStore behind ``records`` (plain dicts, or a remote search
+    server) every term but the stopwords counts.
+    """
+    terms = [t for t in query_terms(query) if t not in STOPWORDS]
+    # A RecordStore, or a snapshot or view list of one
+    store = records if hasattr(records, "tokens") else getattr(records, "store", None)
+    tokens = getattr(store, "tokens", None)
+    if tokens is None or not len(tokens):
+        return terms
+    limit = COMMON_TERM_RATIO * len(tokens)
+    # Words the shard lacks still count: the question is about something else, not about nothing
+    return [t for t in terms if t not in tokens.term_ids or len(tokens.term_doc_counts(t)[0]) <= limit]
+
+
+class WorkingSet:
+    """Passages retrieved earlier in one conversation, tokenized once and kept within a token budget."""
+
+    def __init__(self, max_tokens: int = MAX_TOKENS) -> None:
+        self.max_tokens = max_tokens
+        self.reused = 0
+        self.searched = 0
+        # A follow-up may still be running on the pipeline thread when the next one starts
+        self._lock = threading.Lock()
+        self._reset(None, 0)
+
+    def _reset(self, shard: Optional[str], generation: int) -> None:
+        self.shard = shard
+        # Record count of the index the passages came from
+        self.generation = generation
+        self.index = TokenIndex()
+        # TokenIndex document id -> passage; evicted passages stay in the index until it is compacted
+        self.passages: Dict[int, Passage] = {}
+        self._keys: Dict[Tuple[str, int], int] = {}
+        self._used: Dict[int, int] = {}
+        self._clock = 0
+        # Passages of the last turn, best first
+        self.last: List[int] = []
+        # Board badges of the last search
+        self.facets: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def tokens(self) -> int:
+        return sum(p.tokens for p in self.passages.values())
+
+    def nbytes(self) -> int:
+        return self.index.nbytes() + sum(sys.getsizeof(p.text) for p in self.passages.values())
+
+    def _check(self, shard: Optional[str], generation: int) -> None:
+        if shard != self.shard or generation != self.generation:
+            self._reset(shard, generation)
+
+    def add(
+        self, docs: Sequence[Mapping[str, Any]], facets: Mapping[str, int], shard: Optional[str], generation: int,
+    ) -> None:
+        """Remember the snippets of a search turn's ``docs`` as the latest passages."""
+        with self._lock:
+            self._check(shard, generation)
+            self._clock += 1
+            self.searched += 1
+            used = []
+            for doc in docs:
+                for s in doc.get("snippets") or []:
+                    key = (doc["path"], s["start"])
+                    pid = self._keys.get(key)
+                    if pid is None:
+                        pid = self.index.add(s["text"])
+                        self.passages[pid] = Passage(
+                            doc["path"], doc.get("name", ""), str(doc.get("version", "")), s["start"], s["end"],
+                            s["text"], s["highlights"], float(doc.get("score", 0.0)), len(s["text"]) // CHARS_PER_TOKEN + 1,
+                        )
+                        self._keys[key] = pid
+                    self._used[pid] = self._clock
+                    used.append(pid)
+            self.last = used
+            self.facets = dict(facets)
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self.tokens()
+        for pid in sorted(self.passages, key=self._used.__getitem__):
+            if total <= self.max_tokens:
+                break
+            p = self.passages.pop(pid)
+            del self._keys[(p.path, p.start)], self._used[pid]
+            total -= p.tokens
+        self.last = [pid for pid in self.last if pid in self.passages]
+        if len(self.index) > 2 * len(self.passages) + 64:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Re-encode the live passages into a fresh TokenIndex, dropping evicted ones."""
+        index, passages, used, remap = TokenIndex(), {}, {}, {}
+        for pid, p in self.passages.items():
+            new = remap[pid] = index.add(p.text)
+            passages[new], used[new] = p, self._used[pid]
+        self.index, self.passages, self._used = index, passages, used
+        self._keys = {(p.path, p.start): pid for pid, p in passages.items()}
+        self.last = [remap[pid] for pid in self.last]
+
+    def match(
+        self, query: str, records: Sequence[Mapping[str, Any]], shard: Optional[str], per_doc: int,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Documents answering ``query`` from the working set alone, or None if the index must be searched.
+
+        Each document is a dict with ``path``, ``name``, ``version``, ``score``
+        and up to ``per_doc`` passages as ``snippets``, highlighted for ``query``.
+        The best passages are kept, within ``PROMPT_TOKENS``.
+        """
+        terms = informative_terms(query, records)
+        with self._lock:
+            self._check(shard, len(records))
+            if not terms:
+                return self._reuse(list(self.last), {}, per_doc)
+            term_ids = self.index.lookup(terms)
+            # Passage -> (distinct query terms in it, summed log term frequency)
+            scores: Dict[int, Tuple[int, float]] = {}
+            covered = set()
+            for term in term_ids.values():
+                docs, counts = self.index.term_doc_counts(term)
+                for pid, count in zip(docs.tolist(), counts.tolist()):
+                    if pid in self.passages:
+                        distinct, weight = scores.get(pid, (0, 0.0))
+                        scores[pid] = (distinct + 1, weight + 1.0 + math.log(count))
+                        covered.add(term)
+            if len(covered) < len(terms):
+                return None
+            # Only passages with as many of the terms as the best one
+            most = max(distinct for distinct, _ in scores.values())
+            pids = sorted(
+                (pid for pid, (distinct, _) in scores.items() if distinct == most),
+                key=lambda pid: (scores[pid], self.passages[pid].score), reverse=True,
+            )
+            return self._reuse(pids, term_ids, per_doc)
+
+    def _reuse(self, pids: List[int], term_ids: Mapping[int, str], per_doc: int) -> Optional[List[Dict[str, Any]]]:
+        """The best of ``pids``, at most ``per_doc`` per document and within ``PROMPT_TOKENS``, as documents."""
+        budget, kept, per_path = PROMPT_TOKENS, [], {}
+        for pid in pids:
+            p = self.passages[pid]
+            if per_path.get(p.path, 0) == per_doc:
+                continue
+            if kept and p.tokens > budget:
+                break
+            budget -= p.tokens
+            per_path[p.path] = per_path.get(p.path, 0) + 1
+            kept.append(pid)
+        if not kept:
+            return None
+        self._clock += 1
+        self.reused += 1
+        for pid in kept:
+            self._used[pid] = self._clock
+        self.last = kept
+        return self._as_docs(kept, term_ids)
+
+    def _as_docs(self, pids: Sequence[int], term_ids: Mapping[int, str]) -> List[Dict[str, Any]]:
+        docs: Dict[str, Dict[str, Any]] = {}
+        for pid in pids:
+            p = self.passages[pid]
+            doc = docs.setdefault(p.path, {"path": p.path, "name": p.name, "version": p.version, "score": p.score, "snippets": []})
+            # Highlight the follow-up's terms; keep the original ones if none of them occur
+            highlights = (self._highlights(pid, term_ids) if term_ids else None) or p.highlights
+            doc["snippets"].append({"text": p.text, "start": p.start, "end": p.end, "highlights": highlights})
+        return list(docs.values())
+
+    def _highlights(self, pid: int, term_ids: Mapping[int, str]) -> List[List[int]]:
+        """Character spans of ``term_ids`` in a passage, from its stored token positions."""
+        tokens, starts, ends = self.index.doc_tokens(pid)
+        hits = np.flatnonzero(np.isin(tokens, np.fromiter(term_ids, dtype=np.uint32)))
+        text = self.passages[pid].text
+        if text.isascii():
+            return [[int(starts[h]), int(ends[h])] for h in hits]
+        data = text.encode("utf-8")
+        return [[len(data[:starts[h]].decode("utf-8")), len(data[:ends[h]].decode("utf-8"))] for h in hits]